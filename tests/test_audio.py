@@ -0,0 +1,104 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+import valarpy.audio
+from valarpy.audio import *
+from valarpy.audio import _decode, _parse_wav_header
+
+
+def _wav(samples: np.ndarray, rate: int = 8000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(samples.shape[1])
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+class TestAudio:
+    def test_decode_wav(self):
+        samples = np.array([[0, 16384], [-32768, 8192], [16384, 0]], dtype=np.int16)
+        data = _wav(samples)
+        fmt = _parse_wav_header(data)
+        assert (fmt.sample_rate, fmt.n_channels, fmt.bits) == (8000, 2, 16)
+        assert fmt.data_length == 12
+        # header truncated before the data chunk
+        assert _parse_wav_header(data[:20]) is None
+        wave_ = _decode(data)
+        assert wave_.samples.shape == (3, 2)
+        assert wave_.samples[:, 0].tolist() == [0, -1, 0.5]
+        assert wave_.n_seconds == 3 / 8000
+        with pytest.raises(ValueError):
+            _parse_wav_header(b"RIFF\x00\x00\x00\x00WAVX")
+
+    def test_window(self):
+        wave_ = Waveform(np.arange(10, dtype=np.float32).reshape(10, 1), 10)
+        assert wave_.window(0.2, 0.5).samples[:, 0].tolist() == [2, 3, 4]
+        assert len(wave_.window(0.5, 100).samples) == 5
+        assert len(wave_.window(0.5, 0.1).samples) == 0
+
+    def test_load_window(self, monkeypatch):
+        left = np.arange(100, dtype=np.int16) * 256
+        samples = np.stack([left, -left], axis=1)
+        data = _wav(samples, rate=100)
+        fetches = []
+
+        def fetch(field, row_id, start, length):
+            fetches.append((row_id, start, length))
+            return data[start : start + length]
+
+        monkeypatch.setattr(valarpy.audio, "fetch_blob_range", fetch)
+        monkeypatch.setattr(valarpy.audio, "_fetch_key", lambda f: (f, b"wav"))
+        clear_audio_cache()
+        window = load_window(3, 0.25, 0.5)
+        # the header, then only the frames of the window (4 bytes each, after a 44-byte header)
+        assert fetches == [(3, 0, 64 * 1024), (3, 44 + 25 * 4, 25 * 4)]
+        assert window.sample_rate == 100
+        assert window.samples.shape == (25, 2)
+        assert window.samples[:, 0].tolist() == (left[25:50] / 32768).tolist()
+        assert window.samples[:, 1].tolist() == (-left[25:50] / 32768).tolist()
+        # other formats are decoded whole
+        monkeypatch.setattr(valarpy.audio, "fetch_blob_range", lambda *args: b"fLaC" + bytes(60))
+        whole, loaded = Waveform(np.zeros((10, 1), dtype=np.float32), 10), []
+        monkeypatch.setattr(valarpy.audio, "load_waveform", lambda f: loaded.append(f) or whole)
+        assert load_window(4, 0.2, 0.5).samples.shape == (3, 1)
+        assert loaded == [4]
+        clear_audio_cache()
+
+    def test_envelope(self):
+        samples = np.array([0.0, 1.0, -1.0, 0.5, 0.5], dtype=np.float32).reshape(5, 1)
+        env = compute_envelope(Waveform(samples, 5), block_size=2)
+        assert env.minima[:, 0].tolist() == [0, -1, 0.5]
+        assert env.maxima[:, 0].tolist() == [1, 0.5, 0.5]
+        assert env.rms[:, 0] == pytest.approx([np.sqrt(0.5), np.sqrt(0.625), 0.5])
+
+    def test_envelope_cache(self, monkeypatch):
+        samples = np.array([0.0, 1.0, -1.0, 0.5], dtype=np.float32).reshape(4, 1)
+        decoded = []
+
+        def load(audio_file):
+            decoded.append(audio_file)
+            return Waveform(samples, 4)
+
+        monkeypatch.setattr(valarpy.audio, "_fetch_key", lambda f: (f, bytes([f])))
+        monkeypatch.setattr(valarpy.audio, "load_waveform", load)
+        monkeypatch.setattr(valarpy.audio, "_envelope_cache_size", 2)
+        clear_audio_cache()
+        load_envelope(1)
+        load_envelope(2)
+        load_envelope(1)
+        assert decoded == [1, 2]
+        # 2 is the least recently used
+        load_envelope(3)
+        load_envelope(1)
+        load_envelope(2)
+        assert decoded == [1, 2, 3, 2]
+        clear_audio_cache()
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,112 @@
+import io
+
+import numpy as np
+import pytest
+
+import valarpy.blobs
+from valarpy.blobs import *
+from valarpy.definitions import BlobType
+
+
+class TestBlobs:
+    def test_decode(self):
+        data = np.array([1.5, -2.0, 3.25], dtype=">f4").tobytes()
+        array = decode_blob(data, BlobType.float_sfloat)
+        assert array.tolist() == [1.5, -2.0, 3.25]
+        # no copy
+        assert not array.flags.owndata
+        assert get_blob_dtype(BlobType.int_ubyte) == np.dtype("u1")
+        with pytest.raises(ValueError):
+            decode_blob(b"abc", BlobType.float_sfloat)
+        with pytest.raises(ValueError):
+            decode_blob(b"abcd", BlobType.img_png)
+
+    def test_blob_types(self):
+        assert BlobType.int_sshort.is_signed
+        assert not BlobType.int_ulong.is_signed
+        assert BlobType.float_sdouble.byte_width == 8
+        assert BlobType.int_ubyte.byte_order == "|"
+        assert BlobType.float_sfloat.dtype == np.dtype(">f4")
+        assert BlobType.img_png.byte_width is None
+        with pytest.raises(ValueError):
+            BlobType.img_png.is_signed
+        with pytest.raises(ValueError):
+            BlobType.int_slonglong.dtype
+
+    def test_round_trip(self):
+        for blob_type in BlobType:
+            if blob_type.has_dtype:
+                values = np.array([0, 1, 100, 127])
+                data = encode_blob(values, blob_type)
+                assert len(data) == 4 * blob_type.byte_width
+                assert decode_blob(data, blob_type).tolist() == values.tolist()
+        with pytest.raises(ValueError):
+            encode_blob([300], BlobType.int_ubyte)
+        with pytest.raises(ValueError):
+            encode_blob([-1], BlobType.int_uint)
+        # floats are only encoded as integers if they are whole and fit
+        assert encode_blob([1.0, 255.0], BlobType.int_ubyte) == bytes([1, 255])
+        for values, blob_type in [
+            ([1.7], BlobType.int_ubyte),
+            ([256.0], BlobType.int_ubyte),
+            ([-1.0], BlobType.int_ubyte),
+            ([np.nan], BlobType.int_ubyte),
+            ([2.0**63], BlobType.int_slong),
+        ]:
+            with pytest.raises(ValueError):
+                encode_blob(values, blob_type)
+        # non-numeric types with a registered dtype are not benchmarked
+        register_blob_dtype(BlobType.blob, "u1")
+        try:
+            df = benchmark_codecs(n_items=100, repeats=1)
+        finally:
+            valarpy.blobs._BLOB_DTYPES.pop(BlobType.blob)
+        assert len(df) == 12
+
+    def test_pad(self):
+        arrays = [np.array([1, 2, 3], dtype=">i2"), np.array([4], dtype=">i2")]
+        matrix = pad_arrays(arrays)
+        assert matrix.shape == (2, 3)
+        assert matrix[1, 0] == 4
+        assert np.isnan(matrix[1, 2])
+        assert pad_arrays(arrays, fill_value=0)[1].tolist() == [4, 0, 0]
+
+    def test_reader(self, monkeypatch):
+        blob = bytes(range(256)) * 40
+        fetches = []
+
+        def fetch(field, row_id, start, length):
+            fetches.append((start, length))
+            return blob[start : start + length]
+
+        monkeypatch.setattr(valarpy.blobs, "fetch_blob_length", lambda field, row_id: len(blob))
+        monkeypatch.setattr(valarpy.blobs, "fetch_blob_range", fetch)
+        reader = BlobReader(None, 1, chunk_size=100, read_ahead=2, max_chunks=4)
+        assert reader.seek(-10, io.SEEK_END) == len(blob) - 10
+        assert reader.read(100) == blob[-10:]
+        assert reader.read(5) == b""
+        reader.seek(250)
+        assert reader.read(100) == blob[250:350]
+        # random access only fetches the chunks touched
+        assert fetches[-1] == (200, 200)
+        assert reader.read(20) == blob[350:370]
+        # sequential, but already fetched
+        assert len(fetches) == 2
+        assert reader.read(100) == blob[370:470]
+        # sequential read fetches chunk 4 and reads 2 ahead
+        assert fetches[-1] == (400, 300)
+        reader.seek(0)
+        assert reader.read() == blob
+        assert reader.n_fetches == len(fetches)
+        # read-ahead is capped so that it is not evicted by the chunks read
+        reader = BlobReader(None, 1, chunk_size=100, read_ahead=2, max_chunks=4)
+        assert reader.read(100) == blob[:100]
+        assert reader.read(300) == blob[100:400]
+        assert fetches[-1] == (100, 400)
+        n_fetches = len(fetches)
+        assert reader.read(100) == blob[400:500]
+        assert len(fetches) == n_fetches
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
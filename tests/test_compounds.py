@@ -0,0 +1,34 @@
+import pytest
+
+from valarpy.compounds import *
+from valarpy.metamodel import ValarLookupError
+
+
+class TestCompounds:
+    def test_resolve(self):
+        index = CompoundIndex()
+        index.add(
+            compounds=[
+                (1, "RYYVLZVUVIJVGH-UHFFFAOYSA-N", "CHEMBL113"),
+                (2, "BSYNRYMUTXBXSQ-UHFFFAOYSA-N", None),
+                (3, "BSYNRYMUTXBXSQ-UHFFFAOYSA-M", None),
+            ],
+            labels=[(1, "Caffeine"), (2, "aspirin"), (3, "aspirin"), (2, "acetylsalicylic acid")],
+            batches=[(10, "b_caff", 1), (11, "b_blind", None)],
+        )
+        assert len(index) == 3
+        assert index.resolve(
+            ["RYYVLZVUVIJVGH-UHFFFAOYSA-N", "CHEMBL113", "caffeine", "b_caff", 2, "RYYVLZVUVIJVGH"]
+        ) == [1, 1, 1, 1, 2, 1]
+        # ambiguous, unknown, or without a compound
+        assert index.resolve(["aspirin", "BSYNRYMUTXBXSQ", 99, "b_blind", "nope"]) == [None] * 5
+        assert index.connectivity_group("BSYNRYMUTXBXSQ-UHFFFAOYSA-N") == {2, 3}
+        assert index.labeled("ASPIRIN") == {2, 3}
+        assert index.batch_of("b_blind") == 11
+        assert index.resolve_all(["Acetylsalicylic Acid"]) == [2]
+        with pytest.raises(ValarLookupError):
+            index.resolve_all(["caffeine", "aspirin"])
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from valarpy.designs import *
+
+
+class TestDesigns:
+    def test_parse(self):
+        assert parse_param_value("[b_1, 'b_2']") == ["b_1", "b_2"]
+        assert parse_param_value(" 0.5 ") == ["0.5"]
+        assert parse_param_value("[]") == []
+        assert parse_param_value('"a"') == ["a"]
+
+    def test_design(self):
+        rows = [
+            (1, "$...drug", "compound", "[b_a, 12]"),
+            (1, "$...dose", "dose", "0.5"),
+            (1, "$...n", "n_fish", "8"),
+            (1, "$...line", "variant", "wt"),
+            (2, "$...drug", "compound", "b_a"),
+            (2, "$...group", "group", "treated"),
+            (2, "$...line", "variant", "unknown"),
+        ]
+        params = decode_params(rows, {"b_a": (100, 7), "12": (12, None)}, {"wt": 3})
+        assert params.columns.tolist() == list(PARAM_COLUMNS)
+        assert len(params) == 8
+        assert params["position"].tolist()[:2] == [0, 1]
+        assert params["batch_id"].tolist()[:2] == [100, 12]
+        assert params["compound_id"].isna().tolist()[:2] == [False, True]
+        assert params["number"].tolist()[2] == 0.5
+        assert params["variant_id"].isna().tolist()[-1]
+        assert params["param_type"].dtype == "category"
+        wells = pd.DataFrame(
+            dict(well_id=[10, 11, 12, 13], submission_id=pd.array([1, 1, 2, None], dtype="Int64"))
+        )
+        design = design_table(params, wells)
+        assert design["well_id"].tolist() == [10, 11, 12, 13]
+        assert design["$...drug"].tolist()[:3] == [(100, 12), (100, 12), 100]
+        assert design["$...dose"].tolist()[:2] == [0.5, 0.5]
+        assert str(design["$...n"].dtype) == "Int64"
+        assert design["$...n"].isna().tolist() == [False, False, True, True]
+        assert design["$...line"].tolist()[0] == 3 and pd.isna(design["$...line"].tolist()[2])
+        assert design["$...group"].tolist()[2] == "treated"
+
+    def test_empty(self):
+        wells = pd.DataFrame(dict(well_id=[10], submission_id=pd.array([None], dtype="Int64")))
+        design = design_table(decode_params([]), wells)
+        assert design.columns.tolist() == ["well_id", "submission_id"]
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
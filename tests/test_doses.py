@@ -0,0 +1,87 @@
+from unittest import mock
+
+import pandas as pd
+import peewee
+import pytest
+
+from valarpy.doses import *
+from valarpy.model import IBatches, ICompounds, IExperiments, IRuns, IWells, IWellTreatments
+
+_TABLES = [IBatches, ICompounds, IExperiments, IRuns, IWells, IWellTreatments]
+
+
+def _load(rows, **kwargs):
+    queries = []
+
+    def tuples(query):
+        queries.append(query.sql())
+        return rows
+
+    with peewee.MySQLDatabase("valar").bind_ctx(_TABLES):
+        with mock.patch.object(
+            IExperiments, "fetch_all", return_value=[IExperiments(id=9)]
+        ), mock.patch.object(IRuns, "fetch_all", return_value=[IRuns(id=6)]), mock.patch.object(
+            peewee.Select, "tuples", autospec=True, side_effect=tuples
+        ):
+            df = load_dose_responses(experiments=[9], runs=[6], **kwargs)
+    return df, queries
+
+
+class TestDoses:
+    def test_load_sql(self):
+        _, [(sql, params)] = _load([])
+        assert sql.startswith("SELECT `t1`.`id`, `t1`.`run_id`, `t1`.`well_index`")
+        assert "FROM `well_treatments` AS `t4` INNER JOIN `wells` AS `t1`" in sql
+        assert "LEFT OUTER JOIN `compounds` AS `t3` ON (`t2`.`compound_id` = `t3`.`id`)" in sql
+        assert "WHERE ((`t5`.`experiment_id` IN (%s)) OR (`t5`.`id` IN (%s)))" in sql
+        assert sql.endswith("ORDER BY `t1`.`run_id`, `t1`.`well_index`, `t2`.`id`")
+        assert params == [9, 6]
+        _, [(sql, params)] = _load([], include_controls=False)
+        assert "AND (`t1`.`control_type_id` IS NULL)" in sql
+
+    def test_load_frame(self):
+        rows = [
+            (1, 5, 1, None, 30, 40, "AAA", 1.5),
+            (2, 5, 2, 3, 31, None, None, None),
+            (300, 6, 1, None, 30, 40, "AAA", 10.0),
+        ]
+        df, _ = _load(rows)
+        assert df.columns.tolist() == list(DOSE_COLUMNS)
+        assert len(df) == 3
+        assert str(df["well_id"].dtype) == "int16"
+        assert str(df["well_index"].dtype) == "int8"
+        # foreign keys are nullable integers
+        assert str(df["run_id"].dtype) == "Int8"
+        assert str(df["control_type_id"].dtype) == "Int8"
+        assert str(df["compound_id"].dtype) == "Int8"
+        assert df["control_type_id"].isna().tolist() == [True, False, True]
+        assert df["compound_id"].isna().tolist() == [False, True, False]
+        assert df["inchikey"].isna().tolist() == [False, True, False]
+        assert df["micromolar_dose"].dtype == "float64"
+        assert pivot_dose_responses(df).counts.tolist() == [[1, 1]]
+
+    def test_pivot(self):
+        df = pd.DataFrame(
+            dict(
+                well_id=[1, 2, 3, 4, 5, 6, 7],
+                inchikey=["B", "A", "B", "B", None, "A", "A"],
+                micromolar_dose=[1.0, 1.0, 1.0 + 1e-9, 10.0, 1.0, 10.0, None],
+            )
+        )
+        matrix = pivot_dose_responses(df)
+        assert matrix.inchikeys.tolist() == ["A", "B"]
+        assert matrix.doses.tolist() == [1.0, 10.0]
+        assert matrix.counts.tolist() == [[1, 1], [2, 1]]
+        assert matrix.well_ids.shape == (2, 2, 2)
+        assert matrix.for_compound("B").tolist() == [[1, 3], [4, -1]]
+        assert matrix.for_compound("A").tolist() == [[2, -1], [6, -1]]
+        with pytest.raises(KeyError):
+            matrix.for_compound("C")
+        # without rounding, nearly equal doses are distinct
+        assert len(pivot_dose_responses(df, decimals=None).doses) == 3
+        empty = pivot_dose_responses(df.iloc[:0])
+        assert empty.well_ids.shape == (0, 0, 0)
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,99 @@
+from unittest import mock
+
+import numpy as np
+import peewee
+import pytest
+
+from valarpy.definitions import FeatureDimensions
+from valarpy.features import *
+from valarpy.model import IFeatures, IRuns, IWellFeatures, IWells
+
+
+class TestFeatures:
+    def test_parse(self):
+        assert FeatureDimensions.parse("[t-1]").shape(100) == (99,)
+        assert FeatureDimensions.parse("[t]").shape(100) == (100,)
+        assert FeatureDimensions.parse("[t, 2]").shape(100) == (100, 2)
+        assert FeatureDimensions.parse("[2t+1]").shape(10) == (21,)
+        assert FeatureDimensions.parse("[3, 4]").shape(10) == (3, 4)
+        assert not FeatureDimensions.parse("[3, 4]").is_time_dependent
+        assert str(FeatureDimensions.parse("[ t - 1 ,2]")) == "[t-1, 2]"
+        with pytest.raises(ValueError):
+            FeatureDimensions.parse("[t, t]")
+        with pytest.raises(ValueError):
+            FeatureDimensions.parse("[frames]")
+
+    def test_shape_for_items(self):
+        assert FeatureDimensions.parse("[t-1]").shape_for_items(99) == (99,)
+        assert FeatureDimensions.parse("[2, t]").shape_for_items(10) == (2, 5)
+        assert FeatureDimensions.parse("[3, 4]").shape_for_items(12) == (3, 4)
+        with pytest.raises(ValueError):
+            FeatureDimensions.parse("[t, 2]").shape_for_items(9)
+        with pytest.raises(ValueError):
+            FeatureDimensions.parse("[3, 4]").shape_for_items(13)
+
+    def test_reshape(self):
+        array = np.arange(10, dtype=">f4")
+        shaped = reshape_feature(array, "[t, 2]")
+        assert shaped.shape == (5, 2)
+        assert shaped.base is array
+        assert reshape_feature(array, FeatureDimensions.parse("[t-1]")).shape == (10,)
+
+    def test_load_well_matrix(self, tmp_path):
+        feature = IFeatures(id=1, name="MI", data_type="float", dimensions="[t-1]")
+        runs = [IRuns(id=8), IRuns(id=7)]
+        # well, run, well_index, blob length; well 13 has no feature
+        wells = [(10, 7, 2, 12), (11, 7, 1, 8), (12, 8, 1, 12), (13, 8, 2, None)]
+        blobs = [
+            (10, np.array([1, 2, 3], dtype=">f4").tobytes(), None),
+            (11, np.array([4, 5], dtype=">f4").tobytes(), None),
+            (12, np.array([6, 7, 8], dtype=">f4").tobytes(), None),
+        ]
+        with peewee.MySQLDatabase("valar").bind_ctx([IFeatures, IRuns, IWellFeatures, IWells]):
+            with mock.patch.object(IFeatures, "fetch", return_value=feature), mock.patch.object(
+                IRuns, "fetch_all", return_value=runs
+            ), mock.patch.object(peewee.Select, "tuples", return_value=wells), mock.patch(
+                "valarpy.features.stream_tuples", return_value=iter(blobs)
+            ), mock.patch(
+                "valarpy.features.Sha1Verifier"
+            ) as verifier:
+                mx = load_well_matrix([8, 7], "MI", mmap_path=tmp_path / "mi.npy")
+        # no hashing threads unless verifying
+        assert verifier.call_count == 0
+        # ordered by the runs as passed, then by well index
+        assert mx.well_ids.tolist() == [12, 13, 11, 10]
+        assert mx.run_ids.tolist() == [8, 8, 7, 7]
+        assert mx.well_indices.tolist() == [1, 2, 1, 2]
+        assert mx.values.shape == (4, 3)
+        assert mx.values.dtype == np.float32
+        np.testing.assert_array_equal(mx.values[0], [6, 7, 8])
+        assert np.isnan(mx.values[1]).all()
+        np.testing.assert_array_equal(mx.values[2, :2], [4, 5])
+        assert np.isnan(mx.values[2, 2])
+        np.testing.assert_array_equal(mx.for_run(7)[1], [1, 2, 3])
+        np.testing.assert_array_equal(np.load(tmp_path / "mi.npy"), mx.values)
+
+    def test_load_well_matrix_without_data(self):
+        feature = IFeatures(id=2, name="grid", data_type="float", dimensions="[3, 4]")
+        wells = [(10, 7, 1, None), (11, 7, 2, 0)]
+        blobs = [(11, b"", None)]
+        with peewee.MySQLDatabase("valar").bind_ctx([IFeatures, IRuns, IWellFeatures, IWells]):
+            with mock.patch.object(IFeatures, "fetch", return_value=feature), mock.patch.object(
+                IRuns, "fetch_all", return_value=[IRuns(id=7)]
+            ), mock.patch.object(peewee.Select, "tuples", return_value=wells), mock.patch(
+                "valarpy.features.stream_tuples", return_value=iter(blobs)
+            ):
+                mx = load_well_matrix([7], "grid")
+            # fixed dimensions are kept, filled with NaN
+            assert mx.values.shape == (2, 3, 4)
+            assert np.isnan(mx.values).all()
+            with mock.patch.object(IFeatures, "fetch", return_value=feature), mock.patch.object(
+                IRuns, "fetch_all", return_value=[]
+            ), mock.patch.object(peewee.Select, "tuples", return_value=[]), mock.patch(
+                "valarpy.features.stream_tuples", return_value=iter([])
+            ):
+                assert load_well_matrix([], "grid").values.shape == (0, 3, 4)
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
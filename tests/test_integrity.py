@@ -0,0 +1,47 @@
+import hashlib
+
+import pytest
+
+from valarpy.integrity import *
+from valarpy.metamodel import BlobIntegrityError, ValarTableTypeError
+from valarpy.model import IConfigFiles, ISensorData, IWells
+
+
+class TestIntegrity:
+    def test_sha1_matches(self):
+        data = b"\x00\x01" * 2000
+        digest = hashlib.sha1(data)
+        assert sha1_matches(data, digest.digest())
+        assert sha1_matches(data, digest.hexdigest())
+        assert sha1_matches(data, digest.hexdigest().upper().encode("ascii"))
+        assert not sha1_matches(data[1:], digest.digest())
+        assert sha1_matches("[sauron]", hashlib.sha1(b"[sauron]").digest())
+        assert sha1_matches(None, None)
+        assert not sha1_matches(data, None)
+
+    def test_sha1_field(self):
+        assert get_sha1_field(ISensorData.floats) is ISensorData.floats_sha1
+        assert get_sha1_field(IConfigFiles.text) is IConfigFiles.text_sha1
+        with pytest.raises(ValarTableTypeError):
+            get_sha1_field(IWells.well_index)
+
+    def test_verifier(self):
+        blobs = {i: bytes([i]) * 5000 for i in range(20)}
+        with Sha1Verifier(n_threads=3) as verifier:
+            for i, data in blobs.items():
+                verifier.submit(i, data, hashlib.sha1(blobs[i // 2 * 2]).digest())
+            assert verifier.n_bytes == 20 * 5000
+            assert verifier.mismatches() == list(range(1, 20, 2))
+            with pytest.raises(BlobIntegrityError) as e:
+                verifier.check()
+            assert e.value.keys == list(range(1, 20, 2))
+
+    def test_report(self):
+        report = AuditReport("sensor_data", 10, 2_000_000, 2.0, (4,))
+        assert report.mb_per_second == 1.0
+        assert report.rows_per_second == 5.0
+        assert "1 mismatches in 10 rows" in str(report)
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
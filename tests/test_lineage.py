@@ -0,0 +1,82 @@
+from unittest import mock
+
+import peewee
+import pytest
+
+from valarpy.lineage import *
+from valarpy.model import IBatches, IGeneticVariants
+
+
+class TestLineage:
+    def test_lineage(self):
+        # 1 <- 2 <- 3, and 1 <- 4
+        lineage = Lineage(
+            seeds=(1,),
+            parents={1: (), 2: (1,), 3: (2,), 4: (1,)},
+            reached={1: {1, 2, 3, 4}},
+            ancestors=False,
+        )
+        assert lineage.nodes == {1, 2, 3, 4}
+        assert sorted(lineage.edges) == [(1, 2), (1, 4), (2, 3)]
+        assert lineage.children == {1: [2, 4], 2: [3], 3: [], 4: []}
+        assert lineage.of(1) == {2, 3, 4}
+        assert lineage.of(1, include_seed=True) == {1, 2, 3, 4}
+        assert lineage.depths(1) == {1: 0, 2: 1, 4: 1, 3: 2}
+        with pytest.raises(KeyError):
+            lineage.of(2)
+
+    def test_traverse(self):
+        rows = [(3, 3, 2), (3, 2, 1), (3, 1, None), (5, 5, None)]
+        with peewee.MySQLDatabase("valar").bind_ctx([IBatches]):
+            with mock.patch.object(peewee.Select, "tuples", return_value=rows):
+                lineage = traverse(IBatches, [IBatches.made_from], [3, 5, 3], ancestors=True)
+            sql, params = traverse_sql()
+        assert lineage.seeds == (3, 5)
+        assert lineage.of(3) == {1, 2}
+        assert lineage.of(5) == set()
+        assert lineage.depths(3) == {3: 0, 2: 1, 1: 2}
+        assert sql.startswith("WITH RECURSIVE `lineage`")
+        assert " UNION " in sql and "UNION ALL" not in sql
+        assert params == [3]
+        assert traverse(IBatches, [IBatches.made_from], [], ancestors=True).nodes == set()
+
+    def test_pedigree(self):
+        # 10 and 11 are the parents of 12; 12 and 13 are the parents of 14
+        rows = [
+            (14, 14, 12, 13),
+            (14, 12, 10, 11),
+            (14, 13, None, None),
+            (14, 10, None, None),
+            (14, 11, None, None),
+            (15, 15, 12, None),
+            (15, 12, 10, 11),
+            (15, 10, None, None),
+            (15, 11, None, None),
+        ]
+        fields = [IGeneticVariants.mother, IGeneticVariants.father]
+        with peewee.MySQLDatabase("valar").bind_ctx([IGeneticVariants]):
+            with mock.patch.object(peewee.Select, "tuples", return_value=rows):
+                pedigree = traverse(IGeneticVariants, fields, [14, 15], ancestors=True)
+        assert pedigree.parents[14] == (12, 13)
+        assert pedigree.of(14) == {10, 11, 12, 13}
+        assert pedigree.common() == {10, 11, 12}
+        assert pedigree.depths(14) == {14: 0, 12: 1, 13: 1, 10: 2, 11: 2}
+        alone = Lineage((12, 10), {12: (10,), 10: ()}, {12: {12, 10}, 10: {10}})
+        assert alone.common() == set()
+        assert alone.common(include_seeds=True) == {10}
+
+
+def traverse_sql():
+    captured = []
+
+    def tuples(query):
+        captured.append(query.sql())
+        return []
+
+    with mock.patch.object(peewee.Select, "tuples", tuples):
+        traverse(IBatches, [IBatches.made_from], [3], ancestors=False)
+    return captured[0]
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
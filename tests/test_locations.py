@@ -0,0 +1,46 @@
+import peewee
+import pytest
+
+from valarpy.locations import *
+from valarpy.metamodel import ValarLookupError
+from valarpy.model import IBatches
+
+
+class TestLocations:
+    def test_tree(self):
+        tree = LocationTree(
+            [
+                (1, "room", None),
+                (2, "freezer A", 1),
+                (3, "freezer B", 1),
+                (4, "rack", 2),
+                (5, "box", 4),
+                (6, "bench", None),
+                (7, "orphan", 99),
+            ]
+        )
+        assert len(tree) == 7
+        assert tree.path_names("box") == ["room", "freezer A", "rack", "box"]
+        assert tree.path(7) == [7]
+        assert tree.subtree("freezer A") == [2, 4, 5]
+        assert tree.subtree(1) == [1, 2, 4, 5, 3]
+        assert tree.depths[5] == 3
+        assert tree.is_under(5, "room")
+        assert tree.is_under(2, 2)
+        assert not tree.is_under(3, "freezer A")
+        assert not tree.is_under(1, 5)
+        assert "rack" in tree and 6 in tree and "nope" not in tree
+        with pytest.raises(ValarLookupError):
+            tree.resolve("nope")
+        with peewee.MySQLDatabase("valar").bind_ctx([IBatches]):
+            sql, params = tree.batches_under("freezer A").sql()
+        assert "`location_id` IN (%s, %s, %s)" in sql
+        assert params == [2, 4, 5]
+
+    def test_cycle(self):
+        with pytest.raises(ValueError):
+            LocationTree([(1, "root", None), (2, "a", 3), (3, "b", 2)])
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
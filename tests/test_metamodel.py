@@ -150,6 +150,107 @@ class TestMetamodel:
         refs = Refs.list_where(name="ref_four")
         assert [getattr(ref, "id", None) for ref in refs] == [4]
 
+    def test_lean_frame(self):
+        import pandas as pd
+
+        from valarpy.metamodel import lean_frame, memory_report
+        from valarpy.model import IAnnotations
+
+        df = pd.DataFrame(
+            dict(
+                id=[1, 2, 300],
+                level=["0:good", "4:danger", "0:good"],
+                run_id=[5.0, None, 70000.0],
+                name=["a", "b", "c"],
+                n=[-1, 0, 1],
+            )
+        )
+        lean = lean_frame(df, IAnnotations)
+        assert lean["level"].dtype == "category"
+        assert list(lean["level"].cat.categories) == list(IAnnotations.level.choices)
+        assert str(lean["run_id"].dtype) == "Int32"
+        assert lean["run_id"].isna().tolist() == [False, True, False]
+        assert str(lean["id"].dtype) == "int16"
+        assert str(lean["n"].dtype) == "int8"
+        assert lean["name"].tolist() == ["a", "b", "c"]
+        # without a model, only integer columns change
+        assert lean_frame(df)["level"].dtype == df["level"].dtype
+        # values missing from the choices are kept as extra categories
+        from valarpy.model import IFeatures, ISensors
+
+        types = ["float", "long", "string:utf8", None, "other", "long"]
+        lean = lean_frame(pd.DataFrame(dict(data_type=types)), IFeatures)
+        assert lean["data_type"].tolist()[:3] == types[:3]
+        assert lean["data_type"].isna().tolist() == [False, False, False, True, False, False]
+        assert list(lean["data_type"].cat.categories)[-3:] == ["long", "other", "string:utf8"]
+        sensor_types = ["image:png", "audio:wav", "byte", "video:mkv:hevc"]
+        lean = lean_frame(pd.DataFrame(dict(data_type=sensor_types)), ISensors)
+        assert lean["data_type"].astype(str).tolist() == sensor_types
+        report = memory_report(df, IAnnotations)
+        assert report["column"].tolist()[-1] == "total"
+        assert report["lean_bytes"].iloc[0] == 6
+
+    def test_lean_frame_unsigned(self):
+        import numpy as np
+        import pandas as pd
+
+        from valarpy.metamodel import lean_frame
+        from valarpy.model import IAnnotations
+
+        big = 2**63 + 5
+        df = pd.DataFrame(
+            dict(
+                hash=np.array([1, big], dtype=np.uint64),
+                run_id=pd.Series([big, None], dtype=object),
+                id=pd.Series([-1, big], dtype=object),
+            )
+        )
+        lean = lean_frame(df, IAnnotations)
+        # values above the int64 maximum fall back to unsigned 64-bit integers
+        assert lean["hash"].dtype == np.uint64
+        assert lean["hash"].tolist() == [1, big]
+        assert str(lean["run_id"].dtype) == "UInt64"
+        assert lean["run_id"].tolist()[0] == big
+        assert lean["run_id"].isna().tolist() == [False, True]
+        # nothing fits both, so the column is unchanged
+        assert lean["id"].dtype == object
+
+    def test_stream_tuples(self):
+        from unittest import mock
+
+        import peewee
+
+        from valarpy.connection import GlobalConnection
+        from valarpy.metamodel import stream_tuples
+        from valarpy.model import IRuns
+
+        cursor = mock.MagicMock()
+        cursor.fetchmany.side_effect = [[(1,), (2,)], [(3,)], []]
+        database = mock.MagicMock()
+        database.connection.return_value.cursor.return_value = cursor
+        with peewee.MySQLDatabase("valar").bind_ctx([IRuns]):
+            query = IRuns.select(IRuns.id).where(IRuns.id > 0)
+            with mock.patch.object(GlobalConnection, "peewee_database", database):
+                assert list(stream_tuples(query, batch_size=2)) == [(1,), (2,), (3,)]
+        sql, params = cursor.execute.call_args[0]
+        assert sql.startswith("SELECT `t1`.`id` FROM `runs`")
+        assert params == [0]
+        cursor.fetchmany.assert_called_with(2)
+        cursor.close.assert_called_once()
+
+    def test_parse_numeric_columns(self):
+        import pandas as pd
+
+        from valarpy.metamodel import parse_numeric_columns
+
+        df = pd.DataFrame(dict(a=["1", "2.5"], b=["1", None], c=["1", "x"], d=[1, 2]))
+        parsed = parse_numeric_columns(df)
+        assert parsed["a"].tolist() == [1.0, 2.5]
+        assert parsed["b"].tolist()[0] == 1 and parsed["b"].isna().tolist() == [False, True]
+        assert parsed["c"].tolist() == ["1", "x"]
+        assert parsed["d"].dtype == df["d"].dtype
+        assert df["a"].tolist() == ["1", "2.5"]
+
     def test_description(self, setup):
         from valarpy.model import Features
 
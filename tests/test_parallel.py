@@ -0,0 +1,74 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+import valarpy.parallel
+from valarpy.definitions import BlobType
+from valarpy.metamodel import BlobIntegrityError
+from valarpy.parallel import *
+
+
+class _FakeFetcher(ParallelBlobFetcher):
+    def __init__(self, blobs, **kwargs):
+        super().__init__(**kwargs)
+        self.blobs = blobs
+
+    def plan(self, query, field):
+        return self.split([(k, len(v)) for k, v in self.blobs.items()])
+
+    def _fetch_rows(self, chunk, field, keys):
+        if 13 in chunk.ids:
+            raise OSError("Lost connection")
+        if self.verify:
+            return [(i, self.blobs[i], hashlib.sha1(self.blobs[i]).digest()) for i in chunk.ids]
+        return [(i, self.blobs[i]) for i in chunk.ids]
+
+
+class TestParallel:
+    def test_split(self):
+        fetcher = ParallelBlobFetcher(chunk_bytes=10)
+        chunks = fetcher.split([(1, 4), (2, 4), (3, 4), (4, 20), (5, 0)])
+        assert [c.ids for c in chunks] == [(1, 2), (3,), (4,), (5,)]
+        assert [c.n_bytes for c in chunks] == [8, 4, 20, 0]
+        with pytest.raises(ValueError):
+            ParallelBlobFetcher(max_connections=0)
+
+    def test_verify(self, monkeypatch):
+        monkeypatch.setattr(valarpy.parallel, "_connect", lambda connections: None)
+        blobs = {i: bytes([i]) * 100 for i in range(1, 11)}
+        fetcher = _FakeFetcher(blobs, chunk_bytes=200, verify=True)
+        assert len(fetcher.fetch(None, None, ["id"], len)) == 10
+        assert fetcher.mismatches == []
+        # corrupt a blob after its hash is computed
+        fetcher._fetch_rows = lambda chunk, field, keys: [
+            (i, b"x" if i == 4 else blobs[i], hashlib.sha1(blobs[i]).digest()) for i in chunk.ids
+        ]
+        with pytest.raises(BlobIntegrityError) as e:
+            fetcher.fetch(None, None, ["id"], len)
+        assert e.value.keys == [4]
+        fetcher.raise_on_mismatch = False
+        assert len(fetcher.fetch(None, None, ["id"], len)) == 10
+        assert fetcher.mismatches == [4]
+
+    def test_fetch(self, monkeypatch):
+        monkeypatch.setattr(valarpy.parallel, "_connect", lambda connections: None)
+        blobs = {i: np.arange(i, dtype=">f4").tobytes() for i in range(1, 11)}
+        fetcher = _FakeFetcher(blobs, chunk_bytes=40, memory_budget=80, max_connections=3)
+        arrays = fetcher.fetch(None, None, ["id"], BlobType.float_sfloat)
+        assert sorted(arrays) == list(range(1, 11))
+        assert arrays[7].tolist() == list(range(7))
+        assert arrays[7].dtype == np.dtype("f4") and arrays[7].dtype.isnative
+        assert fetcher.stats.n_rows == 10
+        assert fetcher.stats.n_bytes == 4 * sum(range(1, 11))
+        # custom decoders
+        lengths = fetcher.fetch(None, None, ["id"], len)
+        assert lengths[3] == 12
+        # errors from worker threads are raised
+        blobs[13] = b""
+        with pytest.raises(OSError):
+            fetcher.fetch(None, None, ["id"], len)
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,88 @@
+from unittest import mock
+
+import numpy as np
+import peewee
+import pytest
+
+from valarpy.model import IPlates, IPlateTypes, IRuns, IWells, IWellTreatments
+from valarpy.plates import *
+
+
+class TestPlates:
+    def test_positions(self):
+        rows, columns = well_positions([1, 12, 13, 96], 12)
+        assert rows.tolist() == [0, 0, 1, 7]
+        assert columns.tolist() == [0, 11, 0, 11]
+        rows, columns = well_positions(np.array([5, 5]), np.array([4, 8]))
+        assert rows.tolist() == [1, 0]
+        assert columns.tolist() == [0, 4]
+        assert well_labels([1, 14, 96], 12).tolist() == ["A01", "B02", "H12"]
+
+    def test_layout(self):
+        wells = np.full((2, 2, 3), -1, dtype=WELL_DTYPE)
+        assert wells["variant"].tolist() == [[[-1] * 3] * 2] * 2
+        wells["well_id"][0] = [[10, 11, 12], [13, 14, 15]]
+        wells["group"][0, 0] = 1
+        wells["well_id"][1, 0, :2] = [20, 21]
+        layout = PlateLayout(
+            run_ids=np.array([5, 6]),
+            plate_types=np.array([1, 2]),
+            n_rows=np.array([2, 1]),
+            n_columns=np.array([3, 2]),
+            wells=wells,
+            groups=("control", "treated"),
+            batches=np.full((2, 2, 3, 0), -1),
+            doses=np.full((2, 2, 3, 0), np.nan),
+        )
+        assert layout.shape == (2, 2, 3)
+        assert layout.row_labels == ["A", "B"]
+        assert layout.column_labels == [1, 2, 3]
+        assert layout.for_run(6)["well_id"].tolist() == [[20, 21]]
+        assert layout["well_id"][0, 1, 2] == 15
+        assert layout.group_mask("treated").sum() == 3
+        assert not layout.group_mask("other").any()
+        with pytest.raises(KeyError):
+            layout.for_run(7)
+
+    def test_load(self):
+        runs = [IRuns(id=5, plate=100), IRuns(id=6, plate=101)]
+        plates = [(100, 1, 2, 3), (101, 2, 1, 2)]
+        wells = [
+            (10, 5, 1, None, None, "b"),
+            (11, 5, 2, 3, None, None),
+            (12, 5, 6, None, 7, "a"),
+            (20, 6, 2, None, None, "b"),
+        ]
+        # wells 10 and 20 have no treatments, 11 has one, and 12 has two
+        treatments = [(11, 300, 1.5), (12, 301, None), (12, 302, 2.0)]
+        tables = [IPlates, IPlateTypes, IRuns, IWells, IWellTreatments]
+        with peewee.MySQLDatabase("valar").bind_ctx(tables):
+            with mock.patch.object(IRuns, "fetch_all", return_value=runs), mock.patch.object(
+                peewee.Select, "tuples", side_effect=[plates, wells, treatments]
+            ):
+                layout = load_plate_layouts([5, 6])
+        assert layout.shape == (2, 2, 3)
+        assert layout.plate_types.tolist() == [1, 2]
+        assert layout["well_id"].tolist() == [
+            [[10, 11, -1], [-1, -1, 12]],
+            [[-1, 20, -1], [-1, -1, -1]],
+        ]
+        assert layout.for_run(6)["well_index"].tolist() == [[-1, 2]]
+        assert layout["control_type"][0, 0].tolist() == [-1, 3, -1]
+        assert layout["variant"][0, 1, 2] == 7
+        assert layout.groups == ("a", "b")
+        assert layout.group_mask("b").sum() == 2
+        assert layout["batches"].shape == (2, 2, 3, 2)
+        assert layout["batches"][0, 0, 0].tolist() == [-1, -1]
+        assert layout["batches"][0, 0, 1].tolist() == [300, -1]
+        assert layout["batches"][0, 1, 2].tolist() == [301, 302]
+        assert layout["batches"][1, 0, 1].tolist() == [-1, -1]
+        assert (layout["batches"] >= 0).sum() == 3
+        assert layout["doses"][0, 0, 1, 0] == 1.5
+        assert np.isnan(layout["doses"][0, 1, 2, 0])
+        assert layout["doses"][0, 1, 2, 1] == 2.0
+        assert np.isnan(layout["doses"][0, 0, 1, 1])
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,41 @@
+import peewee
+import pytest
+
+from valarpy.definitions import AnnotationLevel
+from valarpy.model import IAnnotations, IRuns, ISubmissions, IWells
+from valarpy.qc import *
+
+
+class TestQc:
+    def test_levels(self):
+        assert AnnotationLevel.good < AnnotationLevel.fixed < AnnotationLevel.note
+        assert AnnotationLevel.danger >= AnnotationLevel.caution
+        assert max(AnnotationLevel) is AnnotationLevel.to_fix
+        assert AnnotationLevel.of("2:caution") is AnnotationLevel.caution
+        assert AnnotationLevel.of("warning") is AnnotationLevel.warning
+        assert AnnotationLevel.deleted.db_value == "9:deleted"
+        with pytest.raises(ValueError):
+            AnnotationLevel.of("5:terrible")
+        with pytest.raises(TypeError):
+            assert AnnotationLevel.good < 1
+        assert bad_levels() == ["2:caution", "3:warning", "4:danger", "to_fix"]
+        assert bad_levels("4:danger") == ["4:danger", "to_fix"]
+        assert "fixed" in bad_levels(AnnotationLevel.fixed)
+
+    def test_filter(self):
+        with peewee.MySQLDatabase("valar").bind_ctx([IAnnotations, IRuns, ISubmissions, IWells]):
+            sql, params = qc_filter(IRuns.select(IRuns.id), "3:warning").sql()
+            assert "NOT (EXISTS(SELECT 1 FROM `annotations`" in sql
+            assert "`t2`.`submission_id` = `t1`.`submission_id`" in sql
+            assert params == ["3:warning", "4:danger", "to_fix"] * 2
+            sql, params = qc_filter(IWells.select(IWells.id), inherit=False).sql()
+            assert "`t2`.`well_id` = `t1`.`id`" in sql
+            assert "run_id" not in sql
+            sql, _ = qc_filter(IWells.select(IWells.id)).sql()
+            assert sql.count("EXISTS") == 3
+            with pytest.raises(TypeError):
+                qc_filter(IAnnotations.select())
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,45 @@
+from unittest import mock
+
+import peewee
+import pytest
+
+from valarpy.metamodel import ValarLookupError
+from valarpy.model import IRuns, ISubmissions
+from valarpy.resolvers import *
+
+
+class TestResolvers:
+    def test_resolve(self):
+        results = [
+            [(5,), (6,)],
+            [(7, "20190415.113023.Thor", "my run"), (8, "20190416.000000.Thor", None)],
+            [(9, "a8d2e5f13b2c")],
+        ]
+        keys = ["my run", 5, "a8d2e5f13b2c", "6", "nope", "20190416.000000.Thor", 404, 5]
+        with peewee.MySQLDatabase("valar").bind_ctx([IRuns, ISubmissions]):
+            with mock.patch.object(peewee.Select, "tuples", side_effect=results) as tuples:
+                resolution = resolve_runs(keys)
+                assert tuples.call_count == 3
+        assert len(resolution) == 8
+        assert resolution.run_ids.tolist() == [7, 5, 9, 6, -1, 8, -1, 5]
+        assert resolution.matched_by == ("name", "id", "submission", "id", None, "tag", None, "id")
+        assert resolution.unresolved == ["nope", 404]
+        assert not resolution.is_complete
+        with pytest.raises(ValarLookupError):
+            resolution.require()
+
+    def test_chunks(self):
+        with peewee.MySQLDatabase("valar").bind_ctx([IRuns, ISubmissions]):
+            with mock.patch.object(peewee.Select, "tuples", return_value=[]) as tuples:
+                resolution = resolve_runs(list(range(1, 11)) + ["a", "b", "c"], chunk_size=4)
+                # 3 chunks of IDs, then 1 of strings for tags and names and 1 for hashes
+                assert tuples.call_count == 5
+        assert resolution.unresolved == list(range(1, 11)) + ["a", "b", "c"]
+        with pytest.raises(TypeError):
+            resolve_runs([1.5])
+        with pytest.raises(ValueError):
+            resolve_runs([1], chunk_size=0)
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from valarpy.saurons import *
+
+
+class TestSaurons:
+    def test_configs_at(self):
+        index = SauronConfigIndex(
+            [
+                (12, 2, datetime(2019, 6, 1)),
+                (10, 1, datetime(2019, 1, 1)),
+                (11, 2, datetime(2019, 1, 1)),
+                (13, 1, datetime(2020, 1, 1)),
+            ],
+            [(10, "fps", "100"), (13, "fps", "150"), (13, "camera", "basler"), (11, "fps", "x")],
+        )
+        assert len(index) == 4
+        assert index.config_ids.tolist() == [10, 13, 11, 12]
+        assert index.sauron_of(12) == 2
+        found = index.configs_at(
+            [1, 1, 1, 2, 2, 3],
+            [
+                datetime(2018, 1, 1),
+                datetime(2019, 1, 1),
+                datetime(2021, 1, 1),
+                datetime(2019, 5, 31),
+                datetime(2019, 6, 1),
+                datetime(2019, 6, 1),
+            ],
+        )
+        assert found.tolist() == [-1, 10, 13, 11, 12, -1]
+        with pytest.raises(ValueError):
+            index.configs_at([1, 2], [datetime(2019, 1, 1)])
+        df = index.settings_at(
+            [1, 1, 2], [datetime(2019, 2, 1), datetime(2020, 2, 1), datetime(2019, 2, 1)]
+        )
+        assert df.columns.tolist() == ["sauron_id", "datetime", "sauron_config_id", "camera", "fps"]
+        assert df["sauron_config_id"].tolist() == [10, 13, 11]
+        assert df["camera"].tolist()[1] == "basler" and df["camera"].isna().tolist() == [
+            True,
+            False,
+            True,
+        ]
+        # not all numeric
+        assert df["fps"].tolist() == ["100", "150", "x"]
+        table = index.settings_table([13, 10, -1])
+        assert table["fps"].dtype == np.int64 or table["fps"].dtype == np.float64
+        assert table["fps"].tolist()[:2] == [150, 100]
+        assert np.isnan(table["fps"].tolist()[2])
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from valarpy.definitions import SensorSampling
+from valarpy.sensors import *
+
+
+class TestSensors:
+    def test_sensor_times(self):
+        frames = np.array([100, 140, 180, 220, 260])
+        times = sensor_times(4, SensorSampling.every_n_milliseconds, 25, frames)
+        assert times.tolist() == [100, 125, 150, 175]
+        times = sensor_times(3, SensorSampling.every_n_frames, 2, frames)
+        assert times.tolist() == [100, 180, 260]
+        with pytest.raises(ValueError):
+            sensor_times(4, SensorSampling.every_n_frames, 2, frames)
+        with pytest.raises(ValueError):
+            sensor_times(1, SensorSampling.arbitrary, 2, frames)
+
+    def test_resample(self):
+        values = np.array([0.0, 10.0, 20.0, 30.0])
+        times = np.array([0, 10, 20, 30])
+        frames = np.array([0, 4, 6, 15, 40])
+        assert resample_to_frames(values, times, frames, "linear").tolist() == [0, 4, 6, 15, 30]
+        assert resample_to_frames(values, times, frames, "nearest").tolist() == [0, 0, 10, 10, 30]
+        mean = resample_to_frames(values, times, np.array([-5, 5, 8, 25]), "mean")
+        assert mean[0] == 0 and np.isnan(mean[1])
+        assert mean[2] == 15 and mean[3] == 30
+        assert np.isnan(resample_to_frames([], [], frames)).all()
+        assert resample_to_frames([7], [3], frames, "nearest").tolist() == [7] * 5
+        with pytest.raises(ValueError):
+            resample_to_frames(values, times, frames, "cubic")
+        with pytest.raises(ValueError):
+            resample_to_frames(values, times[:2], frames)
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pytest
+
+import valarpy.stimuli
+from valarpy.stimuli import *
+
+
+class TestStimuli:
+    def test_rle_round_trip(self):
+        dense = np.array([0, 0, 0, 255, 255, 10, 0, 0], dtype=np.uint8)
+        rle = RleFrames.from_dense(dense)
+        assert rle.n_runs == 4
+        assert len(rle) == 8
+        assert rle.to_dense().tolist() == dense.tolist()
+        assert np.asarray(rle).tolist() == dense.tolist()
+        assert rle.value_at(np.array([0, 3, 5, 7])).tolist() == [0, 255, 10, 0]
+        assert rle[-1] == 0
+        with pytest.raises(IndexError):
+            rle.value_at(8)
+        assert RleFrames.from_dense([]).to_dense().tolist() == []
+
+    def test_rle_slice(self):
+        dense = np.array([0, 0, 0, 255, 255, 10, 0, 0], dtype=np.uint8)
+        rle = RleFrames.from_dense(dense)
+        for start, stop in [(0, 8), (1, 4), (3, 5), (4, 7), (6, 6), (2, 100)]:
+            assert rle[start:stop].to_dense().tolist() == dense[start:stop].tolist()
+        with pytest.raises(ValueError):
+            rle[::2]
+
+    def test_rle_ops(self):
+        a = RleFrames.from_dense(np.array([1, 1, 2, 2, 3], dtype=np.int64))
+        b = RleFrames.from_dense(np.array([1, 2, 2, 2, 2], dtype=np.int64))
+        assert (a + b).to_dense().tolist() == [2, 3, 4, 4, 5]
+        assert (a * 2).to_dense().tolist() == [2, 2, 4, 4, 6]
+        assert (a > 1).to_dense().tolist() == [False, False, True, True, True]
+        # adjacent equal runs are merged
+        assert (a - a).n_runs == 1
+        with pytest.raises(ValueError):
+            a.combine(RleFrames.from_dense([1]), np.add)
+
+    def test_rle_concatenate(self):
+        x = RleFrames.from_dense(np.array([5, 5, 6], dtype=np.uint8))
+        y = RleFrames.from_dense(np.array([6, 7], dtype=np.uint8))
+        rle = RleFrames.concatenate([(4, y), (1, x)], 8)
+        assert rle.to_dense().tolist() == [0, 5, 5, 6, 6, 7, 0, 0]
+        assert rle.n_runs == 5
+        # overruns are trimmed
+        rle = RleFrames.concatenate([(0, x), (2, y)], 3)
+        assert rle.to_dense().tolist() == [5, 5, 6]
+        # pieces at or beyond the length are dropped
+        z = RleFrames.from_dense(np.full(500, 3, dtype=np.uint8))
+        rle = RleFrames.concatenate([(0, z), (500, z), (1100, z), (1000, x)], 1000)
+        assert rle.starts.tolist() == [0]
+        assert rle.to_dense().tolist() == [3] * 1000
+        rle = RleFrames.concatenate([(600, z), (1100, z)], 1000)
+        assert rle.starts.tolist() == [0, 600]
+        assert rle.to_dense().tolist() == [0] * 600 + [3] * 400
+
+    def test_timeline_beyond_length(self):
+        rle = RleFrames.from_dense(np.array([1, 2, 2, 0], dtype=np.uint8))
+        battery = SimpleNamespace(id=1, length=6)
+        # the third position starts after the end of the battery
+        positions = [(0, 4, b"a"), (4, 4, b"a"), (7, 4, b"a")]
+        loaded = (battery, positions, {b"a": {3: rle}})
+        with mock.patch("valarpy.stimuli._load_battery", return_value=loaded):
+            dense = load_battery_timeline(battery)
+            sparse = load_battery_rle(battery)
+        assert dense.for_stimulus(3).tolist() == [1, 2, 2, 0, 1, 2]
+        assert sparse.for_stimulus(3).to_dense().tolist() == [1, 2, 2, 0, 1, 2]
+
+    def test_timeline_to_dense(self):
+        rle = RleStimulusTimeline(
+            stimuli={
+                4: RleFrames.from_dense(np.array([0, 9, 9], dtype=np.uint8)),
+                2: RleFrames.from_dense(np.array([1, 1, 0], dtype=np.uint8)),
+            },
+            length=3,
+        )
+        dense = rle.to_dense()
+        assert dense.stimulus_ids.tolist() == [2, 4]
+        assert dense.for_stimulus(4).tolist() == [0, 9, 9]
+        assert rle.slice(1, 3).for_stimulus(2).to_dense().tolist() == [1, 0]
+
+    def test_assay_index(self):
+        index = AssayIndex(
+            7, np.array([0, 10, 25]), np.array([10, 20, 30]), np.array([101, 102, 101])
+        )
+        frames = np.array([0, 9, 10, 19, 20, 24, 25, 29, 30, -1])
+        assert index.assays_at(frames).tolist() == [101, 101, 102, 102, -1, -1, 101, 101, -1, -1]
+        assert index.positions_at(frames).tolist() == [0, 0, 1, 1, -1, -1, 2, 2, -1, -1]
+        assert index.assay_at(12) == 102
+        assert index.assay_at(22) is None
+        assert index.assays_between(5, 26).tolist() == [101, 102, 101]
+        assert index.assays_between(20, 25).tolist() == []
+        assert index.assays_between(19, 20).tolist() == [102]
+        timeline = RleStimulusTimeline(
+            stimuli={4: RleFrames.from_dense(np.array([0, 9, 9, 0], dtype=np.uint8))}, length=4
+        )
+        with mock.patch("valarpy.stimuli.load_battery_rle", return_value=timeline) as load:
+            assert index.stimuli_at(1) == {4}
+            assert index.stimuli_at(3) == set()
+            assert load.call_count == 1
+
+    def test_assay_index_missing_battery(self):
+        from valarpy.metamodel import ValarLookupError
+        from valarpy.model import IBatteries
+
+        clear_frames_cache()
+        with mock.patch.object(IBatteries, "fetch", side_effect=ValarLookupError("no 999")):
+            with pytest.raises(ValarLookupError):
+                get_assay_index(999)
+        assert 999 not in valarpy.stimuli._assay_indices
+        index = AssayIndex(5, np.array([0]), np.array([10]), np.array([101]))
+        valarpy.stimuli._assay_indices[5] = index
+        # cached IDs are not fetched again
+        with mock.patch.object(IBatteries, "fetch", side_effect=AssertionError):
+            assert get_assay_index(5) is index
+        clear_frames_cache()
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
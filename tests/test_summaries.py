@@ -0,0 +1,85 @@
+from datetime import datetime
+from unittest import mock
+
+import peewee
+import pytest
+
+from valarpy.model import IAnnotations, IBatches, IExperiments, IRuns, IWells, IWellTreatments
+from valarpy.summaries import *
+
+_TABLES = [IAnnotations, IBatches, IExperiments, IRuns, IWells, IWellTreatments]
+
+
+def _day(day: int) -> datetime:
+    return datetime(2020, 1, day)
+
+
+class TestSummaries:
+    def test_build_and_refresh(self):
+        built = [
+            [(1, 2, _day(1), _day(2), _day(2), 11), (2, 1, _day(3), _day(3), _day(3), 12)],
+            [(1, 192)],
+            [(1, 5, 4)],
+            [(2, 1, 0, 0, 0, 0, 2, 0, _day(4), 40)],
+        ]
+        refreshed = [
+            [(2,)],
+            [],
+            [(2, 2, _day(3), _day(5), _day(5), 13)],
+            [(2, 96)],
+            [],
+            [(2, 1, 0, 0, 0, 0, 2, 0, _day(4), 40)],
+        ]
+        with peewee.MySQLDatabase("valar").bind_ctx(_TABLES):
+            with mock.patch.object(peewee.Select, "tuples", side_effect=built):
+                summaries = Summaries.build("experiment")
+            df = summaries.frame
+            assert df.columns.tolist() == ["experiment_id", *SUMMARY_COLUMNS]
+            assert df["experiment_id"].tolist() == [1, 2]
+            assert df["n_wells"].tolist() == [192, 0]
+            assert df["n_compounds"].tolist() == [4, 0]
+            assert df["n_good"].tolist() == [0, 1]
+            assert df["n_danger"].tolist() == [0, 2]
+            assert summaries.watermarks == {"runs": (_day(3), 12), "annotations": (_day(4), 40)}
+            with mock.patch.object(peewee.Select, "tuples", side_effect=refreshed):
+                assert summaries.refresh() == [2]
+            df = summaries.frame
+            assert df["n_runs"].tolist() == [2, 2]
+            assert df["n_wells"].tolist() == [192, 96]
+            assert df["last_run"].tolist()[1] == _day(5)
+            assert summaries.watermarks["runs"] == (_day(5), 13)
+            with mock.patch.object(peewee.Select, "tuples", return_value=[]):
+                assert summaries.refresh() == []
+        assert len(summaries) == 2
+        with pytest.raises(ValueError):
+            Summaries("plate")
+
+    def test_changed_keys(self):
+        summaries = Summaries("project")
+        summaries.watermarks = {"runs": (_day(3), 12), "annotations": (_day(4), 40)}
+        queries = []
+
+        def tuples(query):
+            queries.append(query.sql())
+            return []
+
+        with peewee.MySQLDatabase("valar").bind_ctx(_TABLES):
+            with mock.patch.object(peewee.Select, "tuples", autospec=True, side_effect=tuples):
+                # nothing was created after the watermarks, so the newest rows are not matched again
+                assert summaries.refresh() == []
+        assert len(queries) == 2
+        (runs, runs_params), (annotations, annotations_params) = queries
+        assert runs.startswith("SELECT DISTINCT `t1`.`project_id` FROM `runs` AS `t2`")
+        assert runs.endswith(
+            "WHERE ((`t2`.`created` > %s) OR ((`t2`.`created` = %s) AND (`t2`.`id` > %s)))"
+        )
+        assert runs_params == [_day(3), _day(3), 12]
+        assert annotations.endswith(
+            "WHERE ((`t3`.`created` > %s) OR ((`t3`.`created` = %s) AND (`t3`.`id` > %s)))"
+        )
+        assert annotations_params == [_day(4), _day(4), 40]
+        assert ">=" not in runs + annotations
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
@@ -0,0 +1,44 @@
+from unittest import mock
+
+import peewee
+import pytest
+
+from valarpy.model import IExperimentTags, IRuns, IRunTags
+from valarpy.tags import *
+
+
+class TestTags:
+    def test_query(self):
+        with peewee.MySQLDatabase("valar").bind_ctx([IRunTags]):
+            sql, params = pivot_query(IRunTags, ["a", "b"], [5, 6]).sql()
+        assert "MAX(CASE WHEN (`t1`.`name` = %s) THEN `t1`.`value` END) AS `tag_0`" in sql
+        assert "GROUP BY `t1`.`run_id`" in sql
+        assert params == ["a", "b", 5, 6, "a", "b"]
+        with pytest.raises(TypeError):
+            pivot_query(IRuns, ["a"])
+
+    def test_pivot(self):
+        rows = [(5, "1.5", "x"), (7, None, "y")]
+        with peewee.MySQLDatabase("valar").bind_ctx([IRunTags, IExperimentTags]):
+            with mock.patch.object(peewee.Select, "tuples", return_value=rows):
+                df = pivot_tags(IRunTags, [7, 6, 5], ["exposure", "camera"])
+                untyped = pivot_tags(IExperimentTags, None, ["exposure", "camera"], typed=False)
+        assert df.columns.tolist() == ["run_id", "exposure", "camera"]
+        assert df["run_id"].tolist() == [7, 6, 5]
+        assert df["exposure"].tolist()[2] == 1.5
+        assert df["camera"].isna().tolist() == [False, True, False]
+        assert untyped.columns.tolist()[0] == "experiment_id"
+        assert untyped["exposure"].tolist()[0] == "1.5"
+
+    def test_names(self):
+        clear_tag_names()
+        with peewee.MySQLDatabase("valar").bind_ctx([IRunTags]):
+            with mock.patch.object(peewee.Select, "tuples", return_value=[("a",), ("b",)]) as m:
+                assert get_tag_names(IRunTags) == ["a", "b"]
+                assert get_tag_names(IRunTags) == ["a", "b"]
+                assert m.call_count == 1
+        clear_tag_names()
+
+
+if __name__ == ["__main__"]:
+    pytest.main()
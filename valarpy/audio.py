@@ -0,0 +1,314 @@
+"""
+Decoding of audio files (``IAudioFiles.data``) into NumPy waveforms.
+WAV windows are read with ranged fetches, so only the bytes needed are transferred.
+FLAC and other formats require the optional ``soundfile`` package (``pip install valarpy[audio]``).
+Requires an open connection (see ``valarpy.opened``).
+"""
+import io
+import math
+import struct
+from collections import OrderedDict
+from dataclasses import dataclass
+from numbers import Integral
+from typing import Optional, Tuple
+
+import numpy as np
+
+from valarpy.blobs import fetch_blob_range
+from valarpy.definitions import AudioFileLike
+from valarpy.metamodel import ValarLookupError
+
+try:
+    import soundfile
+except ImportError:  # pragma: no cover
+    soundfile = None
+
+# enough for the RIFF header of any WAV file we've written
+_HEADER_BYTES = 64 * 1024
+# decoded waveforms, keyed by IAudioFiles.sha1
+_waveform_cache: "OrderedDict[bytes, Waveform]" = OrderedDict()
+_waveform_cache_size = 32
+# envelopes, keyed by IAudioFiles.sha1 and block size
+_envelope_cache: "OrderedDict[Tuple[bytes, int], Envelope]" = OrderedDict()
+_envelope_cache_size = 256
+
+
+@dataclass(frozen=True)
+class Waveform:
+    """
+    Decoded audio samples.
+
+    Attributes:
+        samples: A ``(n_samples, n_channels)`` float32 array in the range [-1, 1]
+        sample_rate: Samples per second
+    """
+
+    samples: np.ndarray
+    sample_rate: int
+
+    @property
+    def n_seconds(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def window(self, start_sec: float, stop_sec: float) -> "Waveform":
+        """
+        Gets the samples between two times, without copying.
+        """
+        i0, i1 = _sample_range(start_sec, stop_sec, self.sample_rate, len(self.samples))
+        return Waveform(self.samples[i0:i1], self.sample_rate)
+
+
+@dataclass(frozen=True)
+class Envelope:
+    """
+    Per-block summaries of a waveform, useful for plotting and for detecting onsets.
+
+    Attributes:
+        minima: A ``(n_blocks, n_channels)`` array of the minimum of each block
+        maxima: A ``(n_blocks, n_channels)`` array of the maximum of each block
+        rms: A ``(n_blocks, n_channels)`` array of the root-mean-square of each block
+        block_size: Samples per block (the last block may be shorter)
+        sample_rate: Samples per second of the waveform
+    """
+
+    minima: np.ndarray
+    maxima: np.ndarray
+    rms: np.ndarray
+    block_size: int
+    sample_rate: int
+
+
+@dataclass(frozen=True)
+class _WavFormat:
+    sample_rate: int
+    n_channels: int
+    bits: int
+    is_float: bool
+    data_offset: int
+    data_length: int
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.n_channels * self.bits // 8
+
+
+def clear_audio_cache() -> None:
+    """
+    Empties the caches of decoded waveforms and envelopes.
+    """
+    _waveform_cache.clear()
+    _envelope_cache.clear()
+
+
+def load_waveform(audio_file: AudioFileLike) -> Waveform:
+    """
+    Downloads and decodes a whole audio file, caching the result by its SHA-1.
+
+    Args:
+        audio_file: An ``IAudioFiles`` instance, ID, or filename
+
+    Returns:
+        A ``Waveform``
+
+    Raises:
+        ValarLookupError: If the audio file does not exist
+        ValueError: If the format is not recognized
+        ImportError: If the file is not WAV and ``soundfile`` is not installed
+    """
+    from valarpy.model import IAudioFiles
+
+    audio_id, sha1 = _fetch_key(audio_file)
+    if sha1 not in _waveform_cache:
+        data = IAudioFiles.select(IAudioFiles.data).where(IAudioFiles.id == audio_id).scalar()
+        _waveform_cache[sha1] = _decode(bytes(data))
+    _waveform_cache.move_to_end(sha1)
+    while len(_waveform_cache) > _waveform_cache_size:
+        _waveform_cache.popitem(last=False)
+    return _waveform_cache[sha1]
+
+
+def load_window(audio_file: AudioFileLike, start_sec: float, stop_sec: float) -> Waveform:
+    """
+    Gets the samples of an audio file between two times.
+    For PCM WAV files, fetches only the header and the requested range of samples.
+    Other formats are fully decoded (and cached) first.
+
+    Args:
+        audio_file: An ``IAudioFiles`` instance, ID, or filename
+        start_sec: Start time in seconds
+        stop_sec: End time in seconds (exclusive)
+
+    Returns:
+        A ``Waveform``
+
+    Raises:
+        ValarLookupError: If the audio file does not exist
+        ValueError: If the format is not recognized
+        ImportError: If the file is not WAV and ``soundfile`` is not installed
+    """
+    from valarpy.model import IAudioFiles
+
+    audio_id, sha1 = _fetch_key(audio_file)
+    if sha1 in _waveform_cache:
+        return _waveform_cache[sha1].window(start_sec, stop_sec)
+    header = fetch_blob_range(IAudioFiles.data, audio_id, 0, _HEADER_BYTES)
+    fmt = _parse_wav_header(header) if header[:4] == b"RIFF" else None
+    if fmt is None:
+        return load_waveform(audio_id).window(start_sec, stop_sec)
+    n_frames = fmt.data_length // fmt.frame_bytes
+    i0, i1 = _sample_range(start_sec, stop_sec, fmt.sample_rate, n_frames)
+    raw = fetch_blob_range(
+        IAudioFiles.data,
+        audio_id,
+        fmt.data_offset + i0 * fmt.frame_bytes,
+        (i1 - i0) * fmt.frame_bytes,
+    )
+    return Waveform(_decode_pcm(raw, fmt), fmt.sample_rate)
+
+
+def load_envelope(audio_file: AudioFileLike, block_size: int = 1024) -> Envelope:
+    """
+    Gets the per-block envelope of an audio file.
+    Envelopes are not stored in the database: the first request downloads and decodes the waveform
+    (see ``load_waveform``) and computes the envelope from it.
+    The most recently used envelopes are cached, even after their waveforms are evicted.
+
+    Args:
+        audio_file: An ``IAudioFiles`` instance, ID, or filename
+        block_size: Number of samples per block
+
+    Returns:
+        An ``Envelope``
+    """
+    _, sha1 = _fetch_key(audio_file)
+    key = (sha1, block_size)
+    if key not in _envelope_cache:
+        wave = load_waveform(audio_file)
+        _envelope_cache[key] = compute_envelope(wave, block_size)
+    _envelope_cache.move_to_end(key)
+    while len(_envelope_cache) > _envelope_cache_size:
+        _envelope_cache.popitem(last=False)
+    return _envelope_cache[key]
+
+
+def compute_envelope(wave: Waveform, block_size: int = 1024) -> Envelope:
+    """
+    Computes the minimum, maximum, and RMS of each block of a waveform.
+
+    Args:
+        wave: The waveform
+        block_size: Number of samples per block
+
+    Returns:
+        An ``Envelope``
+    """
+    samples = wave.samples
+    starts = np.arange(0, len(samples), block_size)
+    if len(starts) == 0:
+        empty = np.empty((0, samples.shape[1]), dtype=samples.dtype)
+        return Envelope(empty, empty, empty, block_size, wave.sample_rate)
+    counts = np.diff(np.append(starts, len(samples)))[:, np.newaxis]
+    squares = np.add.reduceat(samples.astype(np.float64) ** 2, starts, axis=0)
+    return Envelope(
+        minima=np.minimum.reduceat(samples, starts, axis=0),
+        maxima=np.maximum.reduceat(samples, starts, axis=0),
+        rms=np.sqrt(squares / counts).astype(np.float32),
+        block_size=block_size,
+        sample_rate=wave.sample_rate,
+    )
+
+
+def _fetch_key(audio_file: AudioFileLike) -> Tuple[int, bytes]:
+    """
+    Gets the ID and SHA-1 of an audio file without transferring its data.
+    """
+    from valarpy.model import IAudioFiles
+
+    if isinstance(audio_file, IAudioFiles):
+        where = IAudioFiles.id == audio_file.id
+    elif isinstance(audio_file, Integral):
+        where = IAudioFiles.id == int(audio_file)
+    elif isinstance(audio_file, str):
+        where = IAudioFiles.filename == audio_file
+    else:
+        raise TypeError(f"Fetching with unknown type {type(audio_file)} on IAudioFiles")
+    row = IAudioFiles.select(IAudioFiles.id, IAudioFiles.sha1).where(where).tuples().first()
+    if row is None:
+        raise ValarLookupError(f"Could not find {audio_file} in {IAudioFiles}")
+    return row[0], bytes(row[1])
+
+
+def _sample_range(start_sec: float, stop_sec: float, rate: int, n: int) -> Tuple[int, int]:
+    i0 = min(max(int(math.floor(start_sec * rate)), 0), n)
+    i1 = min(max(int(math.ceil(stop_sec * rate)), i0), n)
+    return i0, i1
+
+
+def _decode(data: bytes) -> Waveform:
+    if data[:4] == b"RIFF":
+        fmt = _parse_wav_header(data)
+        if fmt is not None:
+            raw = data[fmt.data_offset : fmt.data_offset + fmt.data_length]
+            return Waveform(_decode_pcm(raw, fmt), fmt.sample_rate)
+    if soundfile is None:
+        raise ImportError("Decoding non-PCM-WAV audio requires soundfile (valarpy[audio])")
+    try:
+        samples, rate = soundfile.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    except RuntimeError as e:
+        raise ValueError(f"Could not decode audio: {e}") from e
+    return Waveform(samples, rate)
+
+
+def _parse_wav_header(header: bytes) -> Optional[_WavFormat]:
+    """
+    Parses RIFF chunks up to the start of the ``data`` chunk.
+    Returns None if ``header`` ends first or the encoding is not PCM or IEEE float.
+    """
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise ValueError("Not a RIFF WAVE file")
+    offset, fmt = 12, None
+    try:
+        while offset + 8 <= len(header):
+            chunk_id = header[offset : offset + 4]
+            size = struct.unpack_from("<I", header, offset + 4)[0]
+            body = offset + 8
+            if chunk_id == b"fmt ":
+                tag, n_channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", header, body)
+                if tag == 0xFFFE and size >= 26:  # WAVE_FORMAT_EXTENSIBLE
+                    tag = struct.unpack_from("<H", header, body + 24)[0]
+                if tag not in {1, 3}:
+                    return None
+                fmt = (rate, n_channels, bits, tag == 3)
+            elif chunk_id == b"data" and fmt is not None:
+                return _WavFormat(*fmt, data_offset=body, data_length=size)
+            offset = body + size + size % 2
+    except struct.error:
+        pass
+    return None
+
+
+def _decode_pcm(raw: bytes, fmt: _WavFormat) -> np.ndarray:
+    n = len(raw) // fmt.frame_bytes
+    raw = raw[: n * fmt.frame_bytes]
+    if fmt.is_float:
+        samples = np.frombuffer(raw, dtype=f"<f{fmt.bits // 8}")
+    elif fmt.bits == 8:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif fmt.bits == 24:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        samples = np.where(ints >= 1 << 23, ints - (1 << 24), ints) / float(1 << 23)
+    else:
+        samples = np.frombuffer(raw, dtype=f"<i{fmt.bits // 8}") / float(1 << (fmt.bits - 1))
+    return samples.astype(np.float32, copy=False).reshape(n, fmt.n_channels)
+
+
+__all__ = [
+    "Waveform",
+    "Envelope",
+    "load_waveform",
+    "load_window",
+    "load_envelope",
+    "compute_envelope",
+    "clear_audio_cache",
+]
@@ -0,0 +1,388 @@
+"""
+Decoding of typed blobs (sensor data, well features, stimulus frames) into NumPy arrays,
+and partial reads of blobs on the server.
+"""
+import io
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import peewee
+
+from valarpy.definitions import BlobType
+from valarpy.metamodel import ValarLookupError
+
+# overrides of BlobType.dtype
+_BLOB_DTYPES: Dict[BlobType, np.dtype] = {}
+
+
+def register_blob_dtype(blob_type: BlobType, dtype: Union[str, np.dtype]) -> None:
+    """
+    Overrides the NumPy dtype used to decode and encode blobs of a ``BlobType``,
+    which otherwise is ``BlobType.dtype``.
+    The dtype's byte order determines the endianness of the raw bytes.
+
+    Args:
+        blob_type: The type of blob
+        dtype: Anything ``np.dtype`` accepts, such as ``">f4"``
+    """
+    _BLOB_DTYPES[blob_type] = np.dtype(dtype)
+
+
+def get_blob_dtype(blob_type: BlobType) -> np.dtype:
+    """
+    Gets the NumPy dtype (including byte order) for a ``BlobType``.
+
+    Args:
+        blob_type: The type of blob
+
+    Returns:
+        The dtype, which is usually big-endian
+
+    Raises:
+        ValueError: If ``blob_type`` has no NumPy dtype and none was registered
+    """
+    if blob_type in _BLOB_DTYPES:
+        return _BLOB_DTYPES[blob_type]
+    return blob_type.dtype
+
+
+def decode_blob(data: bytes, blob_type: BlobType) -> np.ndarray:
+    """
+    Decodes a blob into a 1-D NumPy array **without copying**.
+    The array is a read-only view over ``data`` in the blob's byte order.
+
+    Args:
+        data: The raw bytes, such as ``ISensorData.floats``
+        blob_type: The type of blob, which determines the dtype
+
+    Returns:
+        A read-only 1-D array
+
+    Raises:
+        ValueError: If the type cannot be decoded or the length is not a multiple of the item size
+    """
+    dtype = get_blob_dtype(blob_type)
+    if len(data) % dtype.itemsize != 0:
+        raise ValueError(
+            f"Blob of {len(data)} bytes is not a multiple of {dtype.itemsize} ({blob_type})"
+        )
+    return np.frombuffer(data, dtype=dtype)
+
+
+def encode_blob(values: Union[np.ndarray, Sequence[float]], blob_type: BlobType) -> bytes:
+    """
+    Encodes values into the bytes of a blob, the inverse of ``decode_blob``.
+
+    Args:
+        values: A 1-D array or sequence of numbers
+        blob_type: The type of blob, which determines the dtype and byte order
+
+    Returns:
+        The raw bytes
+
+    Raises:
+        ValueError: If the type cannot be encoded, or the type is an integer type and the values
+                    are not integers or are out of range for it
+    """
+    dtype = get_blob_dtype(blob_type)
+    array = np.asarray(values)
+    if dtype.kind in "iu" and array.size > 0 and array.dtype.kind not in "iub":
+        # casting would silently truncate fractions and wrap values that do not fit
+        with np.errstate(invalid="ignore"):
+            encoded = array.astype(dtype)
+        if not np.array_equal(encoded, array):
+            raise ValueError(f"Values are not integers that fit {blob_type}")
+        return encoded.tobytes()
+    if dtype.kind in "iu" and array.size > 0:
+        info = np.iinfo(dtype)
+        if array.min() < info.min or array.max() > info.max:
+            raise ValueError(f"Values out of range [{info.min}, {info.max}] for {blob_type}")
+    return array.astype(dtype, copy=False).tobytes()
+
+
+def benchmark_codecs(n_items: int = 1_000_000, repeats: int = 5) -> pd.DataFrame:
+    """
+    Times round trips through ``encode_blob`` and ``decode_blob`` for every numeric ``BlobType``.
+    Decoding is timed both as a zero-copy view and with conversion to a native-endian array.
+
+    Args:
+        n_items: Number of elements per blob
+        repeats: Number of times to repeat each operation; the best time is kept
+
+    Returns:
+        A DataFrame with one row per type and throughputs in MB/s
+
+    Raises:
+        AssertionError: If a round trip does not reproduce its input
+    """
+
+    def best(function) -> float:
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - t0)
+        return max(min(times), 1e-9)
+
+    rows = []
+    for blob_type in BlobType:
+        if not blob_type.is_numeric:
+            continue
+        if not blob_type.has_dtype and blob_type not in _BLOB_DTYPES:
+            continue
+        dtype = get_blob_dtype(blob_type)
+        values = (np.arange(n_items) % 127).astype(dtype.newbyteorder("="))
+        data = encode_blob(values, blob_type)
+        assert np.array_equal(decode_blob(data, blob_type), values), f"{blob_type} round trip"
+        megabytes = len(data) / 1e6
+        rows.append(
+            dict(
+                blob_type=blob_type.name,
+                dtype=dtype.str,
+                byte_width=dtype.itemsize,
+                signed=blob_type.is_signed,
+                encode_mb_s=megabytes / best(lambda: encode_blob(values, blob_type)),
+                decode_view_mb_s=megabytes / best(lambda: decode_blob(data, blob_type)),
+                decode_native_mb_s=megabytes
+                / best(lambda: decode_blob(data, blob_type).astype(values.dtype)),
+            )
+        )
+    df = pd.DataFrame(rows)
+    df["blob_type"] = pd.Categorical(df["blob_type"], categories=[t.name for t in BlobType])
+    return df
+
+
+def pad_arrays(arrays: Sequence[np.ndarray], fill_value: Optional[float] = np.nan) -> np.ndarray:
+    """
+    Stacks 1-D arrays of different lengths into a 2-D matrix, padding the ends.
+
+    Args:
+        arrays: The rows
+        fill_value: Value for the padding; the output dtype is widened to hold it if needed
+
+    Returns:
+        A native-endian array of shape ``(len(arrays), max length)``
+    """
+    width = max((len(a) for a in arrays), default=0)
+    dtypes = [a.dtype.newbyteorder("=") for a in arrays]
+    dtype = np.result_type(*dtypes, np.asarray(fill_value)) if len(dtypes) > 0 else np.float64
+    matrix = np.full((len(arrays), width), fill_value, dtype=dtype)
+    for i, array in enumerate(arrays):
+        matrix[i, : len(array)] = array
+    return matrix
+
+
+def fetch_blob_length(field: peewee.Field, row_id: int) -> int:
+    """
+    Gets the length in bytes of a blob without transferring it.
+
+    Args:
+        field: A ``BlobField`` of a model, such as ``IAudioFiles.data``
+        row_id: The ``id`` of the row
+
+    Returns:
+        The number of bytes
+
+    Raises:
+        ValarLookupError: If the row does not exist
+    """
+    model = field.model
+    row = model.select(peewee.fn.LENGTH(field)).where(model.id == row_id).tuples().first()
+    if row is None:
+        raise ValarLookupError(f"Could not find {row_id} in {model}")
+    return int(row[0] or 0)
+
+
+def fetch_blob_range(field: peewee.Field, row_id: int, start: int, length: int) -> bytes:
+    """
+    Fetches a byte range of a blob with ``SUBSTRING``, transferring only that range.
+
+    Args:
+        field: A ``BlobField`` of a model, such as ``IAudioFiles.data``
+        row_id: The ``id`` of the row
+        start: The 0-based offset of the first byte
+        length: The maximum number of bytes; fewer are returned at the end of the blob
+
+    Returns:
+        The bytes
+
+    Raises:
+        ValarLookupError: If the row does not exist
+    """
+    model = field.model
+    row = (
+        model.select(peewee.fn.SUBSTRING(field, start + 1, length))
+        .where(model.id == row_id)
+        .tuples()
+        .first()
+    )
+    if row is None:
+        raise ValarLookupError(f"Could not find {row_id} in {model}")
+    return bytes(row[0] or b"")
+
+
+def read_blob_items(
+    field: peewee.Field, row_id: int, blob_type: BlobType, start: int, stop: int
+) -> np.ndarray:
+    """
+    Reads and decodes only the elements ``start:stop`` of a typed blob,
+    such as a time window of ``ISensorData.floats``.
+
+    Args:
+        field: A ``BlobField`` of a model
+        row_id: The ``id`` of the row
+        blob_type: The type of blob, which determines the dtype
+        start: Index of the first element
+        stop: Index after the last element
+
+    Returns:
+        A read-only 1-D array, which is shorter than requested if the blob ends first
+
+    Raises:
+        ValarLookupError: If the row does not exist
+    """
+    dtype = get_blob_dtype(blob_type)
+    data = fetch_blob_range(field, row_id, start * dtype.itemsize, (stop - start) * dtype.itemsize)
+    return decode_blob(data[: len(data) - len(data) % dtype.itemsize], blob_type)
+
+
+class BlobReader(io.RawIOBase):
+    """
+    A read-only, seekable file-like object over one blob in the database.
+    Fetches fixed-size chunks on demand with ``SUBSTRING``, so only the parts read are transferred.
+    When reads are sequential, the next ``read_ahead`` chunks are fetched in the same query,
+    as far as they fit in the cache alongside the chunks read.
+    Recently used chunks are kept, up to ``max_chunks``.
+
+    Examples:
+        with BlobReader(IStimulusFrames.frames, 22) as reader:
+            reader.seek(100_000)
+            window = reader.read(5000)
+
+    Args:
+        field: A ``BlobField`` of a model, such as ``ISensorData.floats``
+        row_id: The ``id`` of the row
+        chunk_size: Bytes per chunk
+        read_ahead: Number of chunks to prefetch after sequential reads
+        max_chunks: Maximum number of chunks to keep in memory
+
+    Raises:
+        ValarLookupError: If the row does not exist
+    """
+
+    def __init__(
+        self,
+        field: peewee.Field,
+        row_id: int,
+        chunk_size: int = 1024 * 1024,
+        read_ahead: int = 2,
+        max_chunks: int = 8,
+    ):
+        super().__init__()
+        self.field = field
+        self.row_id = row_id
+        self.chunk_size = chunk_size
+        self.read_ahead = read_ahead
+        self.max_chunks = max(max_chunks, read_ahead + 1)
+        self.length = fetch_blob_length(field, row_id)
+        self.n_fetches = 0
+        self.n_bytes_fetched = 0
+        self._position = 0
+        self._last_end = None
+        self._chunks: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.length + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        n = max(min(len(buffer), self.length - self._position), 0)
+        if n == 0:
+            return 0
+        data = self._read(self._position, n)
+        buffer[:n] = data
+        self._last_end = self._position + n
+        self._position += n
+        return n
+
+    def readall(self) -> bytes:
+        return self.read(max(self.length - self._position, 0))
+
+    def _read(self, start: int, n: int) -> bytes:
+        first, last = start // self.chunk_size, (start + n - 1) // self.chunk_size
+        needed = range(first, last + 1)
+        missing = [k for k in needed if k not in self._chunks]
+        if len(missing) > 0 and start == self._last_end:
+            # only read ahead as far as fits in the cache next to the chunks demanded
+            n_ahead = min(self.read_ahead, self.max_chunks - len(needed))
+            n_chunks = -(-self.length // self.chunk_size)
+            ahead = range(last + 1, min(last + 1 + max(n_ahead, 0), n_chunks))
+            missing.extend(k for k in ahead if k not in self._chunks)
+        for lo, hi in self._contiguous(missing):
+            data = fetch_blob_range(
+                self.field, self.row_id, lo * self.chunk_size, (hi - lo + 1) * self.chunk_size
+            )
+            self.n_fetches += 1
+            self.n_bytes_fetched += len(data)
+            for k in range(lo, hi + 1):
+                offset = (k - lo) * self.chunk_size
+                self._chunks[k] = data[offset : offset + self.chunk_size]
+        # the demanded chunks are most recent, so read-ahead chunks are evicted before them
+        for k in needed:
+            self._chunks.move_to_end(k)
+        joined = b"".join(self._chunks[k] for k in needed)
+        while len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+        offset = start - first * self.chunk_size
+        return joined[offset : offset + n]
+
+    @classmethod
+    def _contiguous(cls, indices: List[int]):
+        indices = sorted(indices)
+        i = 0
+        while i < len(indices):
+            j = i
+            while j + 1 < len(indices) and indices[j + 1] == indices[j] + 1:
+                j += 1
+            yield indices[i], indices[j]
+            i = j + 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    print(benchmark_codecs().to_string(index=False))
+
+
+__all__ = [
+    "register_blob_dtype",
+    "get_blob_dtype",
+    "decode_blob",
+    "encode_blob",
+    "benchmark_codecs",
+    "pad_arrays",
+    "fetch_blob_length",
+    "fetch_blob_range",
+    "read_blob_items",
+    "BlobReader",
+]
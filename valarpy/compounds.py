@@ -0,0 +1,214 @@
+"""
+An in-memory index of compounds for resolving many identifiers at once without queries:
+InChIKeys, InChIKey connectivity prefixes, ChEMBL IDs, compound labels, and batch tags.
+Requires an open connection (see ``valarpy.opened``) to build or refresh.
+"""
+import re
+from collections import defaultdict
+from datetime import datetime
+from numbers import Integral
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from valarpy.metamodel import ValarLookupError
+
+_INCHIKEY = re.compile(r"^[A-Z]{14}-[A-Z]{10}-[A-Z]$")
+_CONNECTIVITY = re.compile(r"^[A-Z]{14}$")
+_CHEMBL = re.compile(r"^CHEMBL[0-9]+$")
+
+_compound_index: Optional["CompoundIndex"] = None
+
+
+class CompoundIndex:
+    """
+    Hash maps from compound identifiers to ``ICompounds`` IDs, built from one bulk read
+    of ``compounds``, ``compound_labels``, and ``batches``.
+
+    ``refresh`` adds rows created since the last read.
+    Rows that were modified or deleted are only picked up by building a new index.
+
+    Examples:
+        index = CompoundIndex.build()
+        index.resolve(["CHEMBL112", "caffeine", "RYYVLZVUVIJVGH-UHFFFAOYSA-N", 12])
+
+    Attributes:
+        compound_ids: All compound IDs
+        watermarks: The latest ``created`` value read from each table
+    """
+
+    def __init__(self):
+        self.compound_ids: Set[int] = set()
+        self.watermarks: Dict[str, datetime] = {}
+        self._by_inchikey: Dict[str, int] = {}
+        self._by_connectivity: Dict[str, Set[int]] = defaultdict(set)
+        self._by_chembl: Dict[str, int] = {}
+        self._by_label: Dict[str, Set[int]] = defaultdict(set)
+        self._by_tag: Dict[str, Tuple[int, Optional[int]]] = {}
+
+    @classmethod
+    def build(cls) -> "CompoundIndex":
+        """
+        Builds a new index with three queries.
+        """
+        index = cls()
+        index.refresh()
+        return index
+
+    def refresh(self) -> int:
+        """
+        Reads the compounds, labels, and batches created since the last read (or all of them).
+        Rows created in the same second as a watermark are read again, which is harmless.
+
+        Returns:
+            The number of rows read
+        """
+        from valarpy.model import IBatches, ICompoundLabels, ICompounds
+
+        compounds = self._read_since(
+            ICompounds, ICompounds.id, ICompounds.inchikey, ICompounds.chembl
+        )
+        labels = self._read_since(ICompoundLabels, ICompoundLabels.compound, ICompoundLabels.name)
+        batches = self._read_since(IBatches, IBatches.id, IBatches.tag, IBatches.compound)
+        self.add(compounds, labels, batches)
+        return len(compounds) + len(labels) + len(batches)
+
+    def _read_since(self, model, *fields) -> List[tuple]:
+        table = model._meta.table_name
+        query = model.select(*fields, model.created)
+        if table in self.watermarks:
+            query = query.where(model.created >= self.watermarks[table])
+        rows = list(query.tuples())
+        created = [row[-1] for row in rows if row[-1] is not None]
+        if len(created) > 0:
+            self.watermarks[table] = max(created)
+        return [row[:-1] for row in rows]
+
+    def add(
+        self,
+        compounds: Iterable[Tuple[int, str, Optional[str]]] = (),
+        labels: Iterable[Tuple[int, str]] = (),
+        batches: Iterable[Tuple[int, Optional[str], Optional[int]]] = (),
+    ) -> None:
+        """
+        Adds rows to the index.
+
+        Args:
+            compounds: Tuples of compound ID, inchikey, and ChEMBL ID
+            labels: Tuples of compound ID and label name
+            batches: Tuples of batch ID, tag, and compound ID
+        """
+        for compound_id, inchikey, chembl in compounds:
+            self.compound_ids.add(compound_id)
+            self._by_inchikey[inchikey] = compound_id
+            self._by_connectivity[inchikey[:14]].add(compound_id)
+            if chembl is not None:
+                self._by_chembl[chembl] = compound_id
+        for compound_id, name in labels:
+            self._by_label[name.casefold()].add(compound_id)
+        for batch_id, tag, compound_id in batches:
+            if tag is not None:
+                self._by_tag[tag] = (batch_id, compound_id)
+
+    def connectivity_group(self, inchikey: str) -> Set[int]:
+        """
+        Gets the compounds that share the connectivity (first 14 characters) of an InChIKey.
+
+        Args:
+            inchikey: A full InChIKey or a connectivity prefix
+        """
+        return set(self._by_connectivity.get(inchikey[:14], ()))
+
+    def labeled(self, name: str) -> Set[int]:
+        """
+        Gets the compounds with a label, ignoring case.
+        """
+        return set(self._by_label.get(name.casefold(), ()))
+
+    def batch_of(self, tag: str) -> Optional[int]:
+        """
+        Gets the ID of the batch with a tag, or None.
+        """
+        batch = self._by_tag.get(tag)
+        return None if batch is None else batch[0]
+
+    def get(self, identifier: Union[int, str]) -> Optional[int]:
+        """
+        Resolves a single identifier to a compound ID.
+
+        Integers are compound IDs. Strings are tried as an InChIKey, ChEMBL ID, batch tag, label
+        (ignoring case), and connectivity prefix, in that order.
+        A label or prefix shared by several compounds does not resolve.
+
+        Returns:
+            The compound ID, or None
+        """
+        if isinstance(identifier, Integral):
+            return int(identifier) if identifier in self.compound_ids else None
+        if _INCHIKEY.match(identifier):
+            return self._by_inchikey.get(identifier)
+        if _CHEMBL.match(identifier):
+            return self._by_chembl.get(identifier)
+        if identifier in self._by_tag:
+            return self._by_tag[identifier][1]
+        labeled = self._by_label.get(identifier.casefold(), ())
+        if len(labeled) == 1:
+            return next(iter(labeled))
+        if len(labeled) == 0 and _CONNECTIVITY.match(identifier):
+            group = self._by_connectivity.get(identifier, ())
+            if len(group) == 1:
+                return next(iter(group))
+        return None
+
+    def resolve(self, identifiers: Iterable[Union[int, str]]) -> List[Optional[int]]:
+        """
+        Resolves many identifiers (see ``get``) without querying.
+
+        Returns:
+            The compound IDs in the same order, with None for identifiers that did not resolve
+        """
+        return [self.get(i) for i in identifiers]
+
+    def resolve_all(self, identifiers: Iterable[Union[int, str]]) -> List[int]:
+        """
+        Resolves many identifiers (see ``get``) without querying.
+
+        Returns:
+            The compound IDs in the same order
+
+        Raises:
+            ValarLookupError: If any identifier did not resolve, listing all of them
+        """
+        identifiers = list(identifiers)
+        resolved = self.resolve(identifiers)
+        missing = [i for i, r in zip(identifiers, resolved) if r is None]
+        if len(missing) > 0:
+            raise ValarLookupError(f"Could not resolve compounds {missing}")
+        return resolved
+
+    def __len__(self) -> int:
+        return len(self.compound_ids)
+
+
+def get_compound_index(refresh: bool = False) -> CompoundIndex:
+    """
+    Gets the shared compound index, building it on first use.
+
+    Args:
+        refresh: Add compounds, labels, and batches created since the index was built or refreshed
+    """
+    global _compound_index
+    if _compound_index is None:
+        _compound_index = CompoundIndex.build()
+    elif refresh:
+        _compound_index.refresh()
+    return _compound_index
+
+
+def clear_compound_index() -> None:
+    """
+    Discards the shared compound index.
+    """
+    global _compound_index
+    _compound_index = None
+
+
+__all__ = ["CompoundIndex", "get_compound_index", "clear_compound_index"]
@@ -2,10 +2,14 @@ from __future__ import annotations
 from datetime import datetime as _datetime
 from datetime import date as _date
 import enum as _enum
+import re as _re
 from typing import Optional as _Optional
 from typing import Sequence as _Sequence
+from typing import Tuple as _Tuple
 from typing import Union as _Union
 
+import numpy as _np
+
 
 class _ABC:
     """
@@ -70,13 +74,107 @@ class BlobType(_enum.Enum):
     def is_video(self) -> bool:
         return self.name.startswith("video_")
 
+    @property
+    def is_numeric(self) -> bool:
+        return self.is_integer or self.is_floating_point
+
     @property
     def is_signed(self) -> bool:
-        if not self.is_integer and not self.is_floating_point:
+        if not self.is_numeric:
             # this is a dangerous use, so let's be explicit
             # an alternative is to also define an `is_unsigned`
             raise ValueError(f"Can't determine whether {self.name} is signed or unsigned")
-        return self in {BlobType.sbyte, BlobType.sshort, BlobType.sint, BlobType.slong, BlobType.sfloat, BlobType.sdouble}
+        # the legacy "unsigned" floats are stored as ordinary IEEE 754 floats
+        return self.name.split("_")[1].startswith("s")
+
+    @property
+    def byte_width(self) -> _Optional[int]:
+        """
+        The number of bytes per element, or None for non-numeric types.
+        """
+        return _BLOB_WIDTHS.get(self.name)
+
+    @property
+    def byte_order(self) -> _Optional[str]:
+        """
+        The NumPy byte order character: ``>`` (big-endian) or ``|`` (not applicable, for single bytes).
+        Valar writes multi-byte values in Java ``ByteBuffer`` (big-endian) order.
+        Returns None for non-numeric types.
+        """
+        width = self.byte_width
+        if width is None:
+            return None
+        return "|" if width == 1 else ">"
+
+    @property
+    def has_dtype(self) -> bool:
+        return self.name in _BLOB_DTYPES
+
+    @property
+    def dtype(self) -> _np.dtype:
+        """
+        The NumPy dtype, including the byte order, used to decode and encode blobs of this type.
+
+        Raises:
+            ValueError: If the type is not numeric or has no NumPy equivalent (128-bit types)
+        """
+        if self.name not in _BLOB_DTYPES:
+            raise ValueError(f"No NumPy dtype for {self.name}")
+        return _np.dtype(_BLOB_DTYPES[self.name])
+
+
+# names of BlobType members mapped to their width in bytes
+_BLOB_WIDTHS = {
+    "int_sbyte": 1,
+    "int_ubyte": 1,
+    "int_sshort": 2,
+    "int_ushort": 2,
+    "int_sint": 4,
+    "int_uint": 4,
+    "int_slong": 8,
+    "int_ulong": 8,
+    "int_slonglong": 16,
+    "int_ulonglong": 16,
+    "float_sfloat": 4,
+    "float_ufloat": 4,
+    "float_sdouble": 8,
+    "float_udouble": 8,
+    "float_sdoubledouble": 16,
+    "float_udoubledouble": 16,
+}
+
+# names of BlobType members mapped to NumPy dtypes; 128-bit types have no portable equivalent
+_BLOB_DTYPES = {
+    "int_sbyte": "i1",
+    "int_ubyte": "u1",
+    "int_sshort": ">i2",
+    "int_ushort": ">u2",
+    "int_sint": ">i4",
+    "int_uint": ">u4",
+    "int_slong": ">i8",
+    "int_ulong": ">u8",
+    "float_sfloat": ">f4",
+    "float_ufloat": ">f4",
+    "float_sdouble": ">f8",
+    "float_udouble": ">f8",
+}
+
+
+class SensorSampling(_enum.Enum):
+    """
+    When a sensor records values, from the ``blob_type`` column of ``sensors``.
+    Periodic sensors record every ``ISensors.n_between`` milliseconds or frames.
+    """
+
+    assay_start = _enum.auto()
+    protocol_start = _enum.auto()
+    every_n_milliseconds = _enum.auto()
+    every_n_frames = _enum.auto()
+    arbitrary = _enum.auto()
+
+    @property
+    def is_periodic(self) -> bool:
+        return self in {SensorSampling.every_n_milliseconds, SensorSampling.every_n_frames}
 
 
 class SensorType(_enum.Enum):
@@ -99,21 +197,74 @@ class AnnotationLevel(_enum.Enum):
     fixed = -111
 
     def __lt__(self, other):
-        if not isinstance(other, AnnotationLevel):
-            raise TypeError(f"Cannot compare {other} of type {type(other)}")
-        # it's too weird to put this in the enum values,
-        # but "fixed" isn't actually better than "good"
-        # if we have to make a decision, it's probably between "note" and "caution"
-        # if we put it as 1.5, then it would often get counted by mistake
-        # because 1:note is a good cutoff for "bad from now on"
-        # noinspection PyTypeChecker
-        fixmap = {e: 0.5 if e==AnnotationLevel.fixed else e.value for e in self}
-        return fixmap[self] < fixmap[other]
+        return self.rank < self._rank_of(other)
+
+    def __le__(self, other):
+        return self.rank <= self._rank_of(other)
+
+    def __gt__(self, other):
+        return self.rank > self._rank_of(other)
+
+    def __ge__(self, other):
+        return self.rank >= self._rank_of(other)
+
+    @property
+    def rank(self) -> float:
+        """
+        The position of this level in the ordering from best to worst.
+        """
+        return _ANNOTATION_RANKS[self]
+
+    @property
+    def db_value(self) -> str:
+        """
+        The value of ``annotations.level``, such as ``2:caution``.
+        """
+        return _ANNOTATION_DB_VALUES[self]
 
     @property
     def is_bad(self) -> bool:
         return self in {AnnotationLevel.caution, AnnotationLevel.warning, AnnotationLevel.danger}
 
+    @classmethod
+    def of(cls, value: _Union[AnnotationLevel, str]) -> AnnotationLevel:
+        """
+        Parses a level from a member, its name, or its database value (like ``2:caution``).
+
+        Raises:
+            ValueError: If ``value`` is not a level
+        """
+        if isinstance(value, AnnotationLevel):
+            return value
+        name = value.split(":")[-1]
+        if name in cls.__members__:
+            return cls[name]
+        raise ValueError(f"{value} is not an annotation level")
+
+    @classmethod
+    def _rank_of(cls, other) -> float:
+        if not isinstance(other, AnnotationLevel):
+            raise TypeError(f"Cannot compare {other} of type {type(other)}")
+        return _ANNOTATION_RANKS[other]
+
+
+# it's too weird to put this in the enum values,
+# but "fixed" isn't actually better than "good"
+# if we have to make a decision, it's probably between "note" and "caution"
+# if we put it as 1.5, then it would often get counted by mistake
+# because 1:note is a good cutoff for "bad from now on"
+_ANNOTATION_RANKS = {e: 0.5 if e is AnnotationLevel.fixed else e.value for e in AnnotationLevel}
+_ANNOTATION_DB_VALUES = {
+    AnnotationLevel.good: "0:good",
+    AnnotationLevel.note: "1:note",
+    AnnotationLevel.caution: "2:caution",
+    AnnotationLevel.warning: "3:warning",
+    AnnotationLevel.danger: "4:danger",
+    AnnotationLevel.deleted: "9:deleted",
+    AnnotationLevel.to_fix: "to_fix",
+    AnnotationLevel.fixed: "fixed",
+}
+
 
 class CompoundType(_enum.Enum):
     molecule = _enum.auto()  # inc. ions
@@ -595,7 +746,7 @@ class AudioFile(_TimestampedRow, _ABC):
 
     @property
     def data(self) -> _Optional[bytes]:
-        return getattr(self, "audio_file")
+        return getattr(self, "data")
 
 
 class ExperimentTag(_NameValueRow, _ABC):
@@ -673,14 +824,121 @@ class Sensor(_DescribedRow, _ABC):
         return getattr(self, "blob_type")
 
 
+class FeatureDimensions:
+    """
+    A parsed ``IFeatures.dimensions`` string, which describes the shape of a feature's values
+    for a run with ``t`` frames.
+    The string is a bracketed, comma-separated list of dimensions,
+    each either a fixed size (``2``) or an expression in ``t``: ``t``, ``t-1``, ``t+2``, or ``2t``.
+    At most one dimension can depend on ``t``.
+
+    Examples:
+        FeatureDimensions.parse("[t-1]").shape(1000)  # (999,)
+        FeatureDimensions.parse("[t, 2]").shape(1000)  # (1000, 2)
+    """
+
+    _pattern = _re.compile(r"^(?:(\d+)|(\d*)\s*\*?\s*t\s*(?:([+-])\s*(\d+))?)$")
+
+    def __init__(self, dims: _Sequence[_Tuple[int, int, bool]]):
+        # each dimension is (multiplier, offset, depends on t)
+        self.dims = tuple(dims)
+        if sum(1 for d in self.dims if d[2]) > 1:
+            raise ValueError(f"More than one dimension depends on t in {self}")
+
+    @classmethod
+    def parse(cls, text: str) -> FeatureDimensions:
+        """
+        Parses a dimensions string.
+
+        Raises:
+            ValueError: If the string is not a valid shape expression
+        """
+        inner = text.strip()
+        if inner.startswith("[") and inner.endswith("]"):
+            inner = inner[1:-1]
+        dims = []
+        for part in inner.split(","):
+            match = cls._pattern.match(part.strip().lower())
+            if match is None:
+                raise ValueError(f"Invalid dimensions {text}")
+            fixed, multiplier, sign, offset = match.groups()
+            if fixed is not None:
+                dims.append((0, int(fixed), False))
+            else:
+                offset = int(offset or 0) * (-1 if sign == "-" else 1)
+                dims.append((int(multiplier or 1), offset, True))
+        return cls(dims)
+
+    @property
+    def is_time_dependent(self) -> bool:
+        return any(d[2] for d in self.dims)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.dims)
+
+    def shape(self, n_frames: int) -> _Tuple[int, ...]:
+        """
+        Gets the shape for a run with ``n_frames`` frames.
+        """
+        return tuple(max(m * n_frames + c, 0) if t else c for m, c, t in self.dims)
+
+    def shape_for_items(self, n_items: int) -> _Tuple[int, ...]:
+        """
+        Gets the shape of ``n_items`` values, solving for the time-dependent dimension.
+
+        Raises:
+            ValueError: If no shape has exactly ``n_items`` elements
+        """
+        fixed = 1
+        for m, c, t in self.dims:
+            fixed *= 1 if t else c
+        if not self.is_time_dependent and fixed == n_items:
+            return self.shape(0)
+        if not self.is_time_dependent or fixed == 0 or n_items % fixed != 0:
+            raise ValueError(f"No shape of {self} has {n_items} elements")
+        return tuple(n_items // fixed if t else c for m, c, t in self.dims)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FeatureDimensions) and self.dims == other.dims
+
+    def __hash__(self) -> int:
+        return hash(self.dims)
+
+    def __str__(self) -> str:
+        def _s(m: int, c: int, t: bool) -> str:
+            if not t:
+                return str(c)
+            return (str(m) if m != 1 else "") + "t" + ("" if c == 0 else f"{c:+d}")
+
+        return "[" + ", ".join(_s(*d) for d in self.dims) + "]"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self})"
+
+
 class Feature(_DescribedRow, _ABC):
 
     @property
-    def is_time_dependent(self) -> BlobType:
-        return getattr(self, "is_time_dependent")
+    def dimensions(self) -> str:
+        return getattr(self, "dimensions")
+
+    @property
+    def parsed_dimensions(self) -> FeatureDimensions:
+        return FeatureDimensions.parse(self.dimensions)
+
+    @property
+    def is_time_dependent(self) -> bool:
+        return self.parsed_dimensions.is_time_dependent
 
     def get_dimensionality(self, n_frames: int) -> _Sequence[int]:
-        raise NotImplementedError()
+        """
+        Gets the shape of this feature's values for a run with ``n_frames`` frames.
+
+        Raises:
+            ValueError: If ``dimensions`` is not a valid shape expression
+        """
+        return self.parsed_dimensions.shape(n_frames)
 
     @property
     def blob_type(self) -> BlobType:
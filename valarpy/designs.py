@@ -0,0 +1,243 @@
+"""
+Experimental designs from ``submission_params``, decoded in bulk:
+values are split into tokens and typed by ``param_type``,
+compound (batch) and variant references are resolved with one ``fetch_all_or_none`` per type,
+and the parameters of each submission are broadcast onto the wells of its run.
+Requires an open connection (see ``valarpy.opened``).
+"""
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from valarpy.definitions import RunLike, SubmissionLike
+from valarpy.metamodel import lean_frame
+
+PARAM_TYPES = ("n_fish", "compound", "dose", "variant", "dpf", "group")
+
+# columns of decode_params and load_submission_params
+PARAM_COLUMNS = (
+    "submission_id",
+    "name",
+    "param_type",
+    "position",
+    "value",
+    "number",
+    "batch_id",
+    "compound_id",
+    "variant_id",
+)
+
+_NUMERIC_TYPES = {"n_fish", "dose", "dpf"}
+
+
+def parse_param_value(value: str) -> List[str]:
+    """
+    Splits a ``submission_params.value`` into tokens.
+    A value is either a single token or a bracketed, comma-separated list; quotes are removed.
+
+    Examples:
+        parse_param_value("[b_1, 'b_2']")  # ["b_1", "b_2"]
+        parse_param_value("0.5")  # ["0.5"]
+    """
+    text = value.strip()
+    if text.startswith("[") and text.endswith("]"):
+        tokens = [t.strip().strip("'\"").strip() for t in text[1:-1].split(",")]
+        return [t for t in tokens if len(t) > 0]
+    return [text.strip("'\"")]
+
+
+def decode_params(
+    rows: Iterable[Tuple[int, str, str, str]],
+    batches: Optional[Mapping[str, Tuple[int, Optional[int]]]] = None,
+    variants: Optional[Mapping[str, int]] = None,
+) -> pd.DataFrame:
+    """
+    Decodes submission parameters into one row per token, without querying.
+
+    Args:
+        rows: Tuples of submission ID, name, ``param_type``, and value
+        batches: Maps compound tokens to batch ID and compound ID
+        variants: Maps variant tokens to variant ID
+
+    Returns:
+        A DataFrame with the columns in ``PARAM_COLUMNS``, where ``position`` is the index of the token
+        within its value and ``value`` is the token;
+        ``number`` is set for ``n_fish``, ``dose``, and ``dpf``,
+        and the ID columns are null for references that did not resolve
+    """
+    batches = {} if batches is None else batches
+    variants = {} if variants is None else variants
+    records = [
+        (submission, name, param_type, position, token)
+        for submission, name, param_type, value in rows
+        for position, token in enumerate(parse_param_value(value))
+    ]
+    df = pd.DataFrame.from_records(records, columns=list(PARAM_COLUMNS[:5]))
+    kinds, tokens = df["param_type"].to_numpy(dtype=object), df["value"].to_numpy(dtype=object)
+    numeric = np.isin(kinds, list(_NUMERIC_TYPES))
+    df["number"] = pd.to_numeric(pd.Series(tokens).where(numeric), errors="coerce").astype(float)
+    compound = [batches.get(t) if k == "compound" else None for k, t in zip(kinds, tokens)]
+    df["batch_id"] = pd.array([None if c is None else c[0] for c in compound], dtype="Int64")
+    df["compound_id"] = pd.array([None if c is None else c[1] for c in compound], dtype="Int64")
+    df["variant_id"] = pd.array(
+        [variants.get(t) if k == "variant" else None for k, t in zip(kinds, tokens)], dtype="Int64"
+    )
+    df["param_type"] = pd.Categorical(df["param_type"], categories=list(PARAM_TYPES))
+    return df
+
+
+def load_submission_params(submissions: Iterable[SubmissionLike]) -> pd.DataFrame:
+    """
+    Loads and decodes the parameters of many submissions (see ``decode_params``).
+    Performs one query for the parameters and at most two per referenced table
+    (``IBatches`` and ``IGeneticVariants``), regardless of the number of submissions.
+    Compound tokens are batch IDs, tags, or lookup hashes; variant tokens are variant IDs or names.
+
+    Args:
+        submissions: Submissions as instances, IDs, or lookup hashes
+
+    Returns:
+        A DataFrame with the columns in ``PARAM_COLUMNS``, sorted by submission and name
+
+    Raises:
+        ValarLookupError: If a submission does not exist
+    """
+    from valarpy.model import ISubmissions
+
+    ids = [s.id for s in ISubmissions.fetch_all(submissions)]
+    return _load_params(ids)
+
+
+def design_table(params: pd.DataFrame, wells: pd.DataFrame) -> pd.DataFrame:
+    """
+    Broadcasts decoded submission parameters onto wells, with one column per parameter name.
+    Compound parameters give batch IDs, variant parameters give variant IDs,
+    ``n_fish`` and ``dpf`` give integers, ``dose`` gives floats, and ``group`` gives strings.
+    A parameter with several tokens gives a tuple.
+
+    Args:
+        params: The output of ``decode_params`` or ``load_submission_params``
+        wells: A DataFrame with a ``submission_id`` column and any others
+
+    Returns:
+        ``wells`` with a column added per parameter name, null for wells whose submission lacks it
+    """
+    typed = params["value"].to_numpy(dtype=object).copy()
+    kinds = params["param_type"].astype(str).to_numpy(dtype=object)
+    for kind, column in [
+        ("n_fish", "number"),
+        ("dpf", "number"),
+        ("dose", "number"),
+        ("compound", "batch_id"),
+        ("variant", "variant_id"),
+    ]:
+        mask = kinds == kind
+        typed[mask] = params[column].to_numpy(dtype=object)[mask]
+    typed = pd.Series([None if pd.isna(v) else v for v in typed], index=params.index, dtype=object)
+    grouped = typed.groupby([params["submission_id"], params["name"]], sort=True).agg(
+        lambda values: values.iloc[0] if len(values) == 1 else tuple(values)
+    )
+    wide = grouped.unstack("name") if len(grouped) > 0 else pd.DataFrame()
+    kind_of = dict(zip(params["name"], kinds))
+    design = wells.merge(wide, how="left", left_on="submission_id", right_index=True)
+    for name in wide.columns:
+        design[name] = _typed_column(design[name], kind_of[name])
+    return design
+
+
+def load_well_design(runs: Iterable[RunLike]) -> pd.DataFrame:
+    """
+    Loads a per-well design table for many runs, from their submissions' parameters.
+    Performs one query for the wells, one for the parameters, and at most two per referenced table.
+
+    Examples:
+        design = load_well_design(runs)
+        design.groupby("$...drug")["well_id"].count()
+
+    Args:
+        runs: Runs as instances, IDs, tags, or names
+
+    Returns:
+        A DataFrame with ``well_id``, ``run_id``, ``well_index``, and ``submission_id`` columns,
+        sorted by run and well index, followed by one column per parameter name (see ``design_table``)
+
+    Raises:
+        ValarLookupError: If a run does not exist
+    """
+    from valarpy.model import IRuns, IWells
+
+    runs = IRuns.fetch_all(runs)
+    submission_of = {r.id: r.submission_id for r in runs}
+    rows = (
+        IWells.select(IWells.id, IWells.run, IWells.well_index)
+        .where(IWells.run << list(submission_of))
+        .order_by(IWells.run, IWells.well_index)
+        .tuples()
+    )
+    wells = pd.DataFrame.from_records(list(rows), columns=["well_id", "run_id", "well_index"])
+    wells["submission_id"] = pd.array(
+        [submission_of[r] for r in wells["run_id"].tolist()], dtype="Int64"
+    )
+    params = _load_params([s for s in set(submission_of.values()) if s is not None])
+    return design_table(params, lean_frame(wells, IWells))
+
+
+def _load_params(submission_ids: List[int]) -> pd.DataFrame:
+    from valarpy.model import IBatches, IGeneticVariants, ISubmissionParams
+
+    rows = list(
+        ISubmissionParams.select(
+            ISubmissionParams.submission,
+            ISubmissionParams.name,
+            ISubmissionParams.param_type,
+            ISubmissionParams.value,
+        )
+        .where(ISubmissionParams.submission << submission_ids)
+        .order_by(ISubmissionParams.submission, ISubmissionParams.name)
+        .tuples()
+    )
+    tokens: Dict[str, set] = {"compound": set(), "variant": set()}
+    for _, _, param_type, value in rows:
+        if param_type in tokens:
+            tokens[param_type].update(parse_param_value(value))
+    batches = {
+        token: (batch.id, batch.compound_id)
+        for token, batch in _resolve(IBatches, tokens["compound"]).items()
+    }
+    variants = {
+        token: variant.id
+        for token, variant in _resolve(IGeneticVariants, tokens["variant"]).items()
+    }
+    return decode_params(rows, batches, variants)
+
+
+def _resolve(model, tokens: Iterable[str]) -> Dict[str, object]:
+    tokens = sorted(tokens)
+    if len(tokens) == 0:
+        return {}
+    references: List[Union[int, str]] = [int(t) if t.isdigit() else t for t in tokens]
+    found = model.fetch_all_or_none(references)
+    return {t: row for t, row in zip(tokens, found) if row is not None}
+
+
+def _typed_column(column: pd.Series, kind: str) -> pd.Series:
+    if any(isinstance(v, tuple) for v in column):
+        return column
+    if kind not in {"n_fish", "dpf", "dose", "compound", "variant"}:
+        return column
+    numbers = pd.to_numeric(column, errors="coerce").astype(float)
+    if kind != "dose" and (numbers.dropna() % 1 == 0).all():
+        return numbers.astype("Int64")
+    return numbers
+
+
+__all__ = [
+    "PARAM_TYPES",
+    "PARAM_COLUMNS",
+    "parse_param_value",
+    "decode_params",
+    "load_submission_params",
+    "design_table",
+    "load_well_design",
+]
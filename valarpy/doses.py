@@ -0,0 +1,152 @@
+"""
+Dose-response tables: every treated well with its compound and dose,
+loaded with server-side joins instead of following foreign keys row by row.
+Requires an open connection (see ``valarpy.opened``).
+"""
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+import peewee
+
+from valarpy.definitions import ExperimentLike, RunLike
+from valarpy.metamodel import lean_frame
+
+DOSE_COLUMNS = (
+    "well_id",
+    "run_id",
+    "well_index",
+    "control_type_id",
+    "batch_id",
+    "compound_id",
+    "inchikey",
+    "micromolar_dose",
+)
+
+
+@dataclass(frozen=True)
+class DoseResponseMatrix:
+    """
+    Wells arranged by compound and dose, with the replicates along the last axis.
+
+    Attributes:
+        inchikeys: The compounds, sorted
+        doses: The distinct micromolar doses, sorted
+        well_ids: Array of shape ``(n_compounds, n_doses, max replicates)``; -1 where there are fewer
+        counts: The number of replicate wells for each compound and dose
+    """
+
+    inchikeys: np.ndarray
+    doses: np.ndarray
+    well_ids: np.ndarray
+    counts: np.ndarray
+
+    def for_compound(self, inchikey: str) -> np.ndarray:
+        """
+        Gets the ``(n_doses, max replicates)`` well IDs of one compound.
+
+        Raises:
+            KeyError: If the compound is not in the matrix
+        """
+        i = np.searchsorted(self.inchikeys, inchikey)
+        if i >= len(self.inchikeys) or self.inchikeys[i] != inchikey:
+            raise KeyError(f"{inchikey} is not in the matrix")
+        return self.well_ids[i]
+
+
+def load_dose_responses(
+    experiments: Iterable[ExperimentLike] = (),
+    runs: Iterable[RunLike] = (),
+    include_controls: bool = True,
+) -> pd.DataFrame:
+    """
+    Loads one row per well treatment for whole experiments and/or runs, in a single query
+    that joins ``well_treatments``, ``wells``, ``batches``, and ``compounds``.
+    A well with several treatments has one row per treatment.
+
+    Examples:
+        df = load_dose_responses(experiments=["my experiment"])
+        matrix = pivot_dose_responses(df)
+
+    Args:
+        experiments: Experiments as instances, IDs, or names
+        runs: Runs as instances, IDs, tags, or names
+        include_controls: Include wells that have a control type
+
+    Returns:
+        A DataFrame with the columns in ``DOSE_COLUMNS``, sorted by run and well index,
+        with compact dtypes (see ``valarpy.metamodel.lean_frame``);
+        ``compound_id`` and ``inchikey`` are null for batches without a compound
+
+    Raises:
+        ValarLookupError: If an experiment or run does not exist
+    """
+    from valarpy.model import IBatches, ICompounds, IExperiments, IRuns, IWells, IWellTreatments
+
+    experiment_ids = [e.id for e in IExperiments.fetch_all(experiments)]
+    run_ids = [r.id for r in IRuns.fetch_all(runs)]
+    query = (
+        IWellTreatments.select(
+            IWells.id,
+            IWells.run,
+            IWells.well_index,
+            IWells.control_type,
+            IBatches.id,
+            ICompounds.id,
+            ICompounds.inchikey,
+            IWellTreatments.micromolar_dose,
+        )
+        .join(IWells)
+        .join(IRuns)
+        .switch(IWellTreatments)
+        .join(IBatches)
+        .join(ICompounds, peewee.JOIN.LEFT_OUTER)
+        .where((IRuns.experiment << experiment_ids) | (IRuns.id << run_ids))
+        .order_by(IWells.run, IWells.well_index, IBatches.id)
+    )
+    if not include_controls:
+        query = query.where(IWells.control_type.is_null())
+    df = pd.DataFrame.from_records(list(query.tuples()), columns=list(DOSE_COLUMNS))
+    return lean_frame(df, [IWells, IBatches])
+
+
+def pivot_dose_responses(df: pd.DataFrame, decimals: Optional[int] = 6) -> DoseResponseMatrix:
+    """
+    Pivots the output of ``load_dose_responses`` into a dense ``(compound, dose, replicate)`` array.
+    Rows without a compound or dose are skipped.
+
+    Args:
+        df: A DataFrame with ``inchikey``, ``micromolar_dose``, and ``well_id`` columns
+        decimals: Round doses to this many decimals before grouping them; ``None`` to use them as-is
+
+    Returns:
+        A ``DoseResponseMatrix``; replicates are ordered as in ``df``
+    """
+    df = df[df["inchikey"].notna() & df["micromolar_dose"].notna()]
+    doses = df["micromolar_dose"].to_numpy(dtype=np.float64)
+    if decimals is not None:
+        doses = np.round(doses, decimals)
+    inchikeys, compound_codes = np.unique(df["inchikey"].to_numpy(dtype=str), return_inverse=True)
+    dose_values, dose_codes = np.unique(doses, return_inverse=True)
+    compound_codes, dose_codes = compound_codes.reshape(-1), dose_codes.reshape(-1)
+    cells = compound_codes * len(dose_values) + dose_codes
+    # the replicate number of each row is its position among earlier rows of the same cell
+    order = np.argsort(cells, kind="stable")
+    sorted_cells = cells[order]
+    replicates = np.empty(len(cells), dtype=np.int64)
+    replicates[order] = np.arange(len(cells)) - np.searchsorted(sorted_cells, sorted_cells)
+    counts = np.bincount(cells, minlength=len(inchikeys) * len(dose_values))
+    well_ids = np.full(
+        (len(inchikeys), len(dose_values), int(counts.max(initial=0))), -1, dtype=np.int64
+    )
+    well_ids[compound_codes, dose_codes, replicates] = df["well_id"].to_numpy(dtype=np.int64)
+    return DoseResponseMatrix(
+        inchikeys=inchikeys,
+        doses=dose_values,
+        well_ids=well_ids,
+        counts=counts.reshape(len(inchikeys), len(dose_values)),
+    )
+
+
+__all__ = ["DOSE_COLUMNS", "DoseResponseMatrix", "load_dose_responses", "pivot_dose_responses"]
@@ -0,0 +1,190 @@
+"""
+Bulk loading of well features (such as motion index) as dense NumPy matrices.
+Requires an open connection (see ``valarpy.opened``).
+"""
+import logging
+import os
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple, Union
+
+import numpy as np
+import peewee
+
+from valarpy.blobs import get_blob_dtype
+from valarpy.definitions import Feature, FeatureDimensions, FeatureLike, RunLike
+from valarpy.integrity import Sha1Verifier
+from valarpy.metamodel import stream_tuples
+
+logger = logging.getLogger("valarpy")
+
+
+@dataclass(frozen=True)
+class WellFrameMatrix:
+    """
+    Feature values for many wells, one row per well.
+    Rows are ordered by the runs as they were passed, then by ``well_index``.
+
+    Attributes:
+        values: Array of shape ``(n_wells, n_frames)``, or ``(n_wells, *dims)`` if loaded shaped,
+                where ``dims`` is the feature's shape (such as ``(n_frames, 2)`` for ``[t, 2]``)
+                for the longest well; wells without the feature and runs with fewer frames
+                are padded with NaN
+        run_ids: The run ID of each row
+        well_ids: The well ID of each row
+        well_indices: The ``well_index`` of each row
+    """
+
+    values: np.ndarray
+    run_ids: np.ndarray
+    well_ids: np.ndarray
+    well_indices: np.ndarray
+
+    def for_run(self, run_id: int) -> np.ndarray:
+        """
+        Gets the ``(n_wells, n_frames, ...)`` values of a single run.
+        """
+        return self.values[self.run_ids == run_id]
+
+
+def load_well_matrix(
+    runs: Iterable[RunLike],
+    feature: FeatureLike,
+    dtype: Union[str, np.dtype] = np.float32,
+    mmap_path: Optional[Union[str, os.PathLike]] = None,
+    shaped: bool = True,
+    verify: bool = False,
+) -> WellFrameMatrix:
+    """
+    Loads a feature for every well of ``runs`` into a preallocated matrix.
+    Performs two queries: one for the wells and blob lengths, used to size the matrix,
+    and one streaming query for the blobs themselves,
+    which are decoded with the dtype of ``IFeatures.data_type`` directly into their rows.
+    If ``shaped``, each row has the shape given by ``IFeatures.dimensions`` (see ``FeatureDimensions``);
+    a feature with unparseable dimensions is loaded flat, with a warning.
+    With ``verify``, each blob is checked against ``IWellFeatures.sha1`` on background threads
+    while the stream continues.
+
+    Examples:
+        mx = load_well_matrix(IRuns.select().where(IRuns.experiment == 12), "MI")
+        mx.for_run(5123).shape  # (96, 110000)
+
+    Args:
+        runs: Runs as instances, IDs, tags, or names
+        feature: The feature as an instance, ID, or name, such as ``"MI"``
+        dtype: The dtype of the output matrix
+        mmap_path: If set, write to a ``.npy`` file memory-mapped at this path instead of RAM
+        shaped: Reshape each well's values according to ``IFeatures.dimensions``
+        verify: Check the SHA-1 hash of every blob
+
+    Returns:
+        A ``WellFrameMatrix``
+
+    Raises:
+        ValarLookupError: If a run or the feature does not exist
+        BlobIntegrityError: If ``verify`` is set and a blob does not match its hash
+    """
+    from valarpy.model import IFeatures, IRuns, IWellFeatures, IWells
+
+    feature = IFeatures.fetch(feature)
+    source_dtype = get_blob_dtype(feature.blob_type)
+    run_order = {r.id: i for i, r in enumerate(IRuns.fetch_all(runs))}
+    wells = list(
+        IWells.select(
+            IWells.id,
+            IWells.run,
+            IWells.well_index,
+            peewee.fn.LENGTH(IWellFeatures.floats),
+        )
+        .join(
+            IWellFeatures,
+            peewee.JOIN.LEFT_OUTER,
+            on=((IWellFeatures.well == IWells.id) & (IWellFeatures.type == feature.id)),
+        )
+        .where(IWells.run << list(run_order.keys()))
+        .tuples()
+    )
+    wells.sort(key=lambda w: (run_order[w[1]], w[2]))
+    n_items = max((w[3] or 0 for w in wells), default=0) // source_dtype.itemsize
+    dims = _get_dims(feature) if shaped else None
+    shape = (len(wells),) + _shape_for_items(dims, n_items)
+    if mmap_path is None:
+        values = np.empty(shape, dtype=dtype)
+    else:
+        values = np.lib.format.open_memmap(str(mmap_path), mode="w+", dtype=dtype, shape=shape)
+    values.fill(np.nan if values.dtype.kind == "f" else 0)
+    row_of = {w[0]: i for i, w in enumerate(wells)}
+    query = (
+        IWellFeatures.select(IWellFeatures.well, IWellFeatures.floats, IWellFeatures.sha1)
+        .join(IWells)
+        .where((IWellFeatures.type == feature.id) & (IWells.run << list(run_order.keys())))
+    )
+    with Sha1Verifier() if verify else nullcontext() as verifier:
+        for well_id, data, sha1 in stream_tuples(query):
+            if verifier is not None:
+                verifier.submit(well_id, data, sha1)
+            array = np.frombuffer(data, dtype=source_dtype)
+            if len(array) == 0:
+                continue
+            item_shape = _shape_for_items(dims, len(array))
+            values[row_of[well_id]][tuple(slice(0, n) for n in item_shape)] = array.reshape(
+                item_shape
+            )
+        if verifier is not None:
+            verifier.check()
+    if mmap_path is not None:
+        values.flush()
+    return WellFrameMatrix(
+        values=values,
+        run_ids=np.array([w[1] for w in wells], dtype=np.int64),
+        well_ids=np.array([w[0] for w in wells], dtype=np.int64),
+        well_indices=np.array([w[2] for w in wells], dtype=np.int64),
+    )
+
+
+def reshape_feature(
+    array: np.ndarray, feature: Union[Feature, FeatureDimensions, str]
+) -> np.ndarray:
+    """
+    Reshapes the decoded values of one well according to the feature's dimensions, without copying.
+
+    Examples:
+        reshape_feature(decode_blob(wf.floats, wf.type.blob_type), wf.type)
+
+    Args:
+        array: A 1-D array of the values of one well
+        feature: An ``IFeatures`` instance, parsed dimensions, or a dimensions string like ``"[t, 2]"``
+
+    Returns:
+        A view of ``array`` with the feature's shape
+
+    Raises:
+        ValueError: If the dimensions are invalid or incompatible with the number of values
+    """
+    if isinstance(feature, Feature):
+        dims = feature.parsed_dimensions
+    elif isinstance(feature, str):
+        dims = FeatureDimensions.parse(feature)
+    else:
+        dims = feature
+    return array.reshape(dims.shape_for_items(len(array)))
+
+
+def _get_dims(feature: Feature) -> Optional[FeatureDimensions]:
+    try:
+        return feature.parsed_dimensions
+    except ValueError:
+        logger.warning(f"Loading {feature.name} flat: cannot parse dimensions {feature.dimensions}")
+        return None
+
+
+def _shape_for_items(dims: Optional[FeatureDimensions], n_items: int) -> Tuple[int, ...]:
+    if dims is None:
+        return (n_items,)
+    if n_items == 0:
+        # no data at all: keep the fixed dimensions, with no frames
+        return dims.shape(0)
+    return dims.shape_for_items(n_items)
+
+
+__all__ = ["WellFrameMatrix", "load_well_matrix", "reshape_feature"]
@@ -0,0 +1,233 @@
+"""
+Verification of blobs against their stored SHA-1 hashes.
+Hashing runs on a thread pool (``hashlib`` releases the GIL for large inputs),
+so it overlaps with fetching and decoding.
+
+Run an audit from the command line with ``python -m valarpy.integrity well_features``.
+"""
+import argparse
+import hashlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple, Union
+
+import peewee
+
+from valarpy.metamodel import BlobIntegrityError, ValarTableTypeError
+
+# blob tables, by table name, with the blob column and its hash column
+_SHA1_COLUMNS = {
+    "well_features": ("floats", "sha1"),
+    "sensor_data": ("floats", "floats_sha1"),
+    "stimulus_frames": ("frames", "frames_sha1"),
+    "config_files": ("text", "text_sha1"),
+    "audio_files": ("data", "sha1"),
+}
+
+
+def get_sha1_field(field: peewee.Field) -> peewee.Field:
+    """
+    Gets the field that holds the SHA-1 hash of a blob field.
+
+    Args:
+        field: A blob field, such as ``ISensorData.floats``
+
+    Returns:
+        The hash field, such as ``ISensorData.floats_sha1``
+
+    Raises:
+        ValarTableTypeError: If the field has no hash field
+    """
+    table = field.model._meta.table_name
+    if table not in _SHA1_COLUMNS or _SHA1_COLUMNS[table][0] != field.name:
+        raise ValarTableTypeError(f"{table}.{field.name} has no SHA-1 column")
+    return getattr(field.model, _SHA1_COLUMNS[table][1])
+
+
+def sha1_matches(data: Union[None, bytes, str], expected: Union[None, bytes, str]) -> bool:
+    """
+    Checks whether a blob matches its stored hash, which may be binary or hex.
+    Text is hashed as UTF-8.
+    """
+    if data is None or expected is None:
+        return data is None and expected is None
+    if isinstance(data, str):
+        data = data.encode("utf8")
+    digest = hashlib.sha1(data)
+    if isinstance(expected, str):
+        return digest.hexdigest() == expected.lower()
+    if len(expected) == 40:
+        return digest.hexdigest().encode("ascii") == bytes(expected).lower()
+    return digest.digest() == bytes(expected)
+
+
+class Sha1Verifier:
+    """
+    Hashes blobs on a thread pool while the caller continues reading.
+    Mismatches are collected and reported by ``check``.
+
+    Examples:
+        with Sha1Verifier() as verifier:
+            for row_id, data, sha1 in rows:
+                verifier.submit(row_id, data, sha1)
+                ...
+            verifier.check()
+
+    Args:
+        n_threads: Number of hashing threads
+    """
+
+    def __init__(self, n_threads: int = 2):
+        self._pool = ThreadPoolExecutor(n_threads, thread_name_prefix="valarpy-sha1")
+        self._futures: List[Tuple[Any, Future]] = []
+        self.n_bytes = 0
+
+    def submit(self, key: Any, data: Union[None, bytes, str], expected: Union[None, bytes, str]):
+        """
+        Queues a blob to be hashed.
+
+        Args:
+            key: Identifies the blob in the report, such as a row ID
+            data: The blob
+            expected: The stored hash
+        """
+        self.n_bytes += 0 if data is None else len(data)
+        self._futures.append((key, self._pool.submit(sha1_matches, data, expected)))
+
+    def mismatches(self) -> List[Any]:
+        """
+        Waits for all queued blobs to be hashed.
+
+        Returns:
+            The keys of the blobs that do not match their hashes, in the order submitted
+        """
+        return [key for key, future in self._futures if not future.result()]
+
+    def check(self) -> None:
+        """
+        Waits for all queued blobs to be hashed.
+
+        Raises:
+            BlobIntegrityError: If any blob does not match its hash
+        """
+        mismatches = self.mismatches()
+        if len(mismatches) > 0:
+            raise BlobIntegrityError(f"SHA-1 mismatch for {mismatches}", mismatches)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        self.close()
+
+
+@dataclass(frozen=True)
+class AuditReport:
+    """
+    The result of ``audit_blobs``.
+
+    Attributes:
+        table: The table name
+        n_rows: The number of rows checked
+        n_bytes: The number of blob bytes hashed
+        seconds: The elapsed time
+        mismatched_ids: The IDs of rows whose blobs do not match their hashes
+    """
+
+    table: str
+    n_rows: int
+    n_bytes: int
+    seconds: float
+    mismatched_ids: Tuple[int, ...]
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.n_bytes / 1e6 / max(self.seconds, 1e-9)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.n_rows / max(self.seconds, 1e-9)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.table}: {len(self.mismatched_ids)} mismatches in {self.n_rows} rows; "
+            f"{self.n_bytes / 1e6:.1f} MB in {self.seconds:.1f} s "
+            f"({self.mb_per_second:.1f} MB/s, {self.rows_per_second:.1f} rows/s)"
+        )
+
+
+def audit_blobs(
+    field: peewee.Field, where: Optional[peewee.Expression] = None, **kwargs
+) -> AuditReport:
+    """
+    Checks every blob of a table (or the rows matching ``where``) against its stored hash.
+    Blobs are fetched in parallel with ``valarpy.parallel.ParallelBlobFetcher``
+    and discarded once hashed.
+
+    Examples:
+        report = audit_blobs(ISensorData.floats, ISensorData.run << run_ids, max_connections=8)
+        print(report)
+
+    Args:
+        field: A blob field with a hash field, such as ``ISensorData.floats``
+        where: An optional condition on the table
+        kwargs: Passed to ``ParallelBlobFetcher``, such as ``max_connections``
+
+    Returns:
+        An ``AuditReport``
+
+    Raises:
+        ValarTableTypeError: If the field has no hash field
+    """
+    from valarpy.parallel import ParallelBlobFetcher
+
+    model = field.model
+    get_sha1_field(field)
+    query = model.select()
+    if where is not None:
+        query = query.where(where)
+    fetcher = ParallelBlobFetcher(verify=True, raise_on_mismatch=False, **kwargs)
+    for _ in fetcher.iter_chunks(query, field, [model.id], lambda data: None):
+        pass
+    return AuditReport(
+        table=model._meta.table_name,
+        n_rows=fetcher.stats.n_rows,
+        n_bytes=fetcher.stats.n_bytes,
+        seconds=fetcher.stats.seconds,
+        mismatched_ids=tuple(sorted(fetcher.mismatches)),
+    )
+
+
+def _main(argv: Optional[List[str]] = None) -> int:  # pragma: no cover
+    from valarpy.connection import Valar
+
+    parser = argparse.ArgumentParser(description="Check blobs against their SHA-1 hashes.")
+    parser.add_argument("table", choices=sorted(_SHA1_COLUMNS))
+    parser.add_argument("--config", help="Path to the connection JSON (default: VALARPY_CONFIG)")
+    parser.add_argument("--connections", type=int, default=4, help="Concurrent connections")
+    parser.add_argument("--chunk-mb", type=int, default=32, help="Megabytes per query")
+    args = parser.parse_args(argv)
+    with Valar(args.config):
+        from valarpy import model
+
+        models = {m._meta.table_name: m for m in model.__dict__.values() if hasattr(m, "_meta")}
+        table = models[args.table]
+        report = audit_blobs(
+            getattr(table, _SHA1_COLUMNS[args.table][0]),
+            max_connections=args.connections,
+            chunk_bytes=args.chunk_mb * 1024 * 1024,
+        )
+    print(report)
+    for row_id in report.mismatched_ids:
+        print(f"mismatch: {args.table}.id = {row_id}")
+    return 1 if len(report.mismatched_ids) > 0 else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(_main())
+
+
+__all__ = ["get_sha1_field", "sha1_matches", "Sha1Verifier", "AuditReport", "audit_blobs"]
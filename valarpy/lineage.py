@@ -0,0 +1,267 @@
+"""
+Traversal of lineages stored as self-referencing foreign keys,
+such as ``IBatches.made_from`` and the ``mother`` and ``father`` of ``IGeneticVariants``,
+with one ``WITH RECURSIVE`` query per traversal.
+Requires an open connection (see ``valarpy.opened``) and a database with recursive CTEs
+(MySQL 8 or MariaDB 10.2).
+"""
+from dataclasses import dataclass
+from functools import reduce
+from operator import or_
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import peewee
+
+from valarpy.definitions import BatchLike, GeneticVariantLike
+
+
+@dataclass(frozen=True)
+class Lineage:
+    """
+    The rows reached from some seed rows by following parent links, as an adjacency structure.
+    Includes the seeds themselves.
+
+    Examples:
+        lineage = batch_ancestors(["b_abc123"])
+        networkx.DiGraph(lineage.edges)
+
+    Attributes:
+        seeds: The IDs the traversal started from
+        parents: Maps every row reached to the IDs of its parents (which may not have been reached)
+        reached: Maps each seed to the IDs reached from it, including itself
+        ancestors: Whether the traversal followed links to parents (rather than to children)
+    """
+
+    seeds: Tuple[int, ...]
+    parents: Dict[int, Tuple[int, ...]]
+    reached: Dict[int, Set[int]]
+    ancestors: bool = True
+
+    @property
+    def nodes(self) -> Set[int]:
+        return set(self.parents)
+
+    @property
+    def edges(self) -> List[Tuple[int, int]]:
+        """
+        Pairs of parent ID and child ID, between rows that were reached.
+        """
+        return [
+            (parent, child)
+            for child, parents in self.parents.items()
+            for parent in parents
+            if parent in self.parents
+        ]
+
+    @property
+    def children(self) -> Dict[int, List[int]]:
+        """
+        Maps every row reached to the IDs of its children that were reached.
+        """
+        children = {node: [] for node in self.parents}
+        for parent, child in self.edges:
+            children[parent].append(child)
+        return children
+
+    def of(self, seed: int, include_seed: bool = False) -> Set[int]:
+        """
+        Gets the IDs reached from one seed.
+
+        Raises:
+            KeyError: If ``seed`` was not a seed
+        """
+        reached = self.reached[seed]
+        return set(reached) if include_seed else reached - {seed}
+
+    def common(self, include_seeds: bool = False) -> Set[int]:
+        """
+        Gets the IDs reached from every seed, such as the common ancestors of all of them.
+
+        Args:
+            include_seeds: Count each seed as reached from itself
+        """
+        if len(self.seeds) == 0:
+            return set()
+        return set.intersection(*[self.of(seed, include_seeds) for seed in self.seeds])
+
+    def depths(self, seed: int) -> Dict[int, int]:
+        """
+        Gets the number of generations between a seed and each row reached from it (shortest path).
+        """
+        reached = self.reached[seed]
+        links = self.parents if self.ancestors else self.children
+        depths, frontier = {seed: 0}, [seed]
+        while len(frontier) > 0:
+            following = []
+            for node in frontier:
+                neighbors = links[node]
+                for neighbor in neighbors:
+                    if neighbor in reached and neighbor not in depths:
+                        depths[neighbor] = depths[node] + 1
+                        following.append(neighbor)
+            frontier = following
+        return depths
+
+
+def traverse(
+    model, parent_fields: Sequence[peewee.Field], ids: Iterable[int], ancestors: bool
+) -> Lineage:
+    """
+    Follows self-referencing foreign keys from many rows at once with a single recursive query.
+    Cycles are harmless: rows are deduplicated with ``UNION``.
+
+    Args:
+        model: The table, such as ``IBatches``
+        parent_fields: The foreign keys to the parent rows, such as ``[IBatches.made_from]``
+        ids: The IDs of the seed rows
+        ancestors: Follow links to parents if True, or to children if False
+
+    Returns:
+        A ``Lineage``
+    """
+    seeds = tuple(dict.fromkeys(int(i) for i in ids))
+    if len(seeds) == 0:
+        return Lineage((), {}, {}, ancestors)
+    names = [f.name for f in parent_fields]
+    columns = ["seed", "row_id"] + [f"parent_{i}" for i in range(len(names))]
+    Anchor = model.alias()
+    base = (
+        Anchor.select(Anchor.id, Anchor.id, *[getattr(Anchor, n) for n in names])
+        .where(Anchor.id << list(seeds))
+        .cte("lineage", recursive=True, columns=columns)
+    )
+    Step = model.alias()
+    if ancestors:
+        on = reduce(or_, [Step.id == getattr(base.c, c) for c in columns[2:]])
+    else:
+        on = reduce(or_, [getattr(Step, n) == base.c.row_id for n in names])
+    recursive = Step.select(base.c.seed, Step.id, *[getattr(Step, n) for n in names]).join(
+        base, on=on
+    )
+    query = base.union(recursive).select_from(*[getattr(base.c, c) for c in columns])
+    parents, reached = {}, {seed: set() for seed in seeds}
+    for seed, node, *node_parents in query.tuples():
+        parents[node] = tuple(p for p in node_parents if p is not None)
+        reached[seed].add(node)
+    return Lineage(seeds, parents, reached, ancestors)
+
+
+def batch_ancestors(batches: Iterable[BatchLike]) -> Lineage:
+    """
+    Gets the batches that batches were made from, recursively, in one query.
+
+    Args:
+        batches: Batches as instances, IDs, tags, or lookup hashes
+
+    Returns:
+        A ``Lineage``, where ``lineage.of(batch_id)`` is the set of ancestors of a batch
+
+    Raises:
+        ValarLookupError: If a batch does not exist
+    """
+    from valarpy.model import IBatches
+
+    return traverse(IBatches, [IBatches.made_from], _batch_ids(batches), ancestors=True)
+
+
+def batch_descendants(batches: Iterable[BatchLike]) -> Lineage:
+    """
+    Gets the batches made from batches, recursively, in one query.
+
+    Args:
+        batches: Batches as instances, IDs, tags, or lookup hashes
+
+    Returns:
+        A ``Lineage``, where ``lineage.of(batch_id)`` is the set of descendants of a batch
+
+    Raises:
+        ValarLookupError: If a batch does not exist
+    """
+    from valarpy.model import IBatches
+
+    return traverse(IBatches, [IBatches.made_from], _batch_ids(batches), ancestors=False)
+
+
+def variant_ancestors(variants: Iterable[GeneticVariantLike]) -> Lineage:
+    """
+    Gets the pedigrees of genetic variants (their mothers and fathers, recursively) in one query.
+
+    Examples:
+        pedigree = variant_ancestors(["my line"])
+        pedigree.parents  # maps each variant to its mother and/or father
+
+    Args:
+        variants: Genetic variants as instances, IDs, or names
+
+    Returns:
+        A ``Lineage``, where ``lineage.of(variant_id)`` is the set of ancestors of a variant
+
+    Raises:
+        ValarLookupError: If a variant does not exist
+    """
+    from valarpy.model import IGeneticVariants
+
+    fields = [IGeneticVariants.mother, IGeneticVariants.father]
+    return traverse(IGeneticVariants, fields, _variant_ids(variants), ancestors=True)
+
+
+def variant_descendants(variants: Iterable[GeneticVariantLike]) -> Lineage:
+    """
+    Gets the genetic variants bred from genetic variants, recursively, in one query.
+
+    Args:
+        variants: Genetic variants as instances, IDs, or names
+
+    Returns:
+        A ``Lineage``, where ``lineage.of(variant_id)`` is the set of descendants of a variant
+
+    Raises:
+        ValarLookupError: If a variant does not exist
+    """
+    from valarpy.model import IGeneticVariants
+
+    fields = [IGeneticVariants.mother, IGeneticVariants.father]
+    return traverse(IGeneticVariants, fields, _variant_ids(variants), ancestors=False)
+
+
+def common_ancestors(
+    variants: Iterable[GeneticVariantLike], include_seeds: bool = False
+) -> Set[int]:
+    """
+    Gets the genetic variants that are ancestors of all of some variants, in one query.
+
+    Args:
+        variants: Genetic variants as instances, IDs, or names
+        include_seeds: Count each variant as its own ancestor,
+                       so that a variant among ``variants`` can be a common ancestor of the others
+
+    Returns:
+        The IDs of the common ancestors; empty if ``variants`` is empty
+
+    Raises:
+        ValarLookupError: If a variant does not exist
+    """
+    return variant_ancestors(variants).common(include_seeds)
+
+
+def _batch_ids(batches: Iterable[BatchLike]) -> List[int]:
+    from valarpy.model import IBatches
+
+    return [b.id for b in IBatches.fetch_all(batches)]
+
+
+def _variant_ids(variants: Iterable[GeneticVariantLike]) -> List[int]:
+    from valarpy.model import IGeneticVariants
+
+    return [v.id for v in IGeneticVariants.fetch_all(variants)]
+
+
+__all__ = [
+    "Lineage",
+    "traverse",
+    "batch_ancestors",
+    "batch_descendants",
+    "variant_ancestors",
+    "variant_descendants",
+    "common_ancestors",
+]
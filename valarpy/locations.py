@@ -0,0 +1,193 @@
+"""
+An in-memory tree of storage locations (``ILocations.part_of``), loaded with one query,
+with nested-set numbering so that ancestry and subtree membership need no further queries.
+Requires an open connection (see ``valarpy.opened``) to build the tree or query batches.
+"""
+from numbers import Integral
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import peewee
+
+from valarpy.definitions import BatchLike, LocationLike
+from valarpy.metamodel import ValarLookupError
+
+_location_tree: Optional["LocationTree"] = None
+
+
+class LocationTree:
+    """
+    The hierarchy of locations, numbered by a depth-first (Euler) tour.
+    A location's subtree is the contiguous range ``[enter, exit)`` of the tour,
+    so ``a`` is under ``b`` exactly when ``enter[b] <= enter[a] < exit[b]``.
+
+    Examples:
+        tree = get_location_tree()
+        tree.path_names("box 12")  # ["room 201", "freezer A", "rack 3", "box 12"]
+        tree.batches_under("freezer A")  # a query
+
+    Attributes:
+        names: Maps each location ID to its name
+        parents: Maps each location ID to the ID of the location it is part of, or None
+        depths: Maps each location ID to its number of ancestors
+        enter: Maps each location ID to its position in the tour
+        exit: Maps each location ID to the position after its last descendant
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str, Optional[int]]]):
+        """
+        Numbers a tree.
+
+        Args:
+            rows: Tuples of location ID, name, and ``part_of`` ID
+
+        Raises:
+            ValueError: If some locations are part of each other in a cycle
+        """
+        rows = sorted(rows)
+        self.names: Dict[int, str] = {i: name for i, name, _ in rows}
+        self.parents: Dict[int, Optional[int]] = {
+            i: parent if parent in self.names else None for i, _, parent in rows
+        }
+        children: Dict[Optional[int], List[int]] = {None: []}
+        for i in self.names:
+            children[i] = []
+        for i, parent in self.parents.items():
+            children[parent].append(i)
+        self.depths: Dict[int, int] = {}
+        self.enter: Dict[int, int] = {}
+        self.exit: Dict[int, int] = {}
+        self._tour: List[int] = []
+        self._by_name = {name: i for i, name in self.names.items()}
+        # iterative, so that deep trees cannot exceed the recursion limit
+        stack = [(i, 0, False) for i in reversed(children[None])]
+        while len(stack) > 0:
+            node, depth, done = stack.pop()
+            if done:
+                self.exit[node] = len(self._tour)
+                continue
+            self.depths[node] = depth
+            self.enter[node] = len(self._tour)
+            self._tour.append(node)
+            stack.append((node, depth, True))
+            stack.extend((child, depth + 1, False) for child in reversed(children[node]))
+        cyclic = [i for i in self.names if i not in self.enter]
+        if len(cyclic) > 0:
+            raise ValueError(f"Locations {cyclic} are part of each other in a cycle")
+
+    @classmethod
+    def build(cls) -> "LocationTree":
+        """
+        Builds the tree from one query of ``locations``.
+        """
+        from valarpy.model import ILocations
+
+        return cls(ILocations.select(ILocations.id, ILocations.name, ILocations.part_of).tuples())
+
+    def resolve(self, location: LocationLike) -> int:
+        """
+        Gets the ID of a location from an instance, ID, or name, without querying.
+
+        Raises:
+            ValarLookupError: If the location is not in the tree
+        """
+        if isinstance(location, str):
+            found = self._by_name.get(location)
+        elif isinstance(location, Integral):
+            found = int(location) if location in self.names else None
+        else:
+            found = location.id if location.id in self.names else None
+        if found is None:
+            raise ValarLookupError(f"Location {location} is not in the tree")
+        return found
+
+    def is_under(self, location: LocationLike, ancestor: LocationLike) -> bool:
+        """
+        Returns whether a location is ``ancestor`` or is (transitively) part of it.
+        """
+        node, ancestor = self.resolve(location), self.resolve(ancestor)
+        return self.enter[ancestor] <= self.enter[node] < self.exit[ancestor]
+
+    def path(self, location: LocationLike) -> List[int]:
+        """
+        Gets the IDs of a location's ancestors, starting from the root and ending with the location.
+        """
+        node = self.resolve(location)
+        path = [node]
+        while self.parents[path[-1]] is not None:
+            path.append(self.parents[path[-1]])
+        return path[::-1]
+
+    def path_names(self, location: LocationLike) -> List[str]:
+        """
+        Gets the names of a location's ancestors, starting from the root and ending with the location.
+        """
+        return [self.names[i] for i in self.path(location)]
+
+    def subtree(self, location: LocationLike) -> List[int]:
+        """
+        Gets the IDs of a location and every location (transitively) part of it, in tour order.
+        """
+        node = self.resolve(location)
+        return self._tour[self.enter[node] : self.exit[node]]
+
+    def batches_under(self, location: LocationLike) -> peewee.Select:
+        """
+        Builds a single query for the batches stored anywhere under a location.
+
+        Examples:
+            batch_ids = [b.id for b in tree.batches_under("freezer A")]
+        """
+        from valarpy.model import IBatches
+
+        return IBatches.select().where(IBatches.location << self.subtree(location))
+
+    def batch_paths(self, batches: Iterable[BatchLike]) -> List[Optional[List[str]]]:
+        """
+        Gets the storage paths of many batches, without a query per batch or per level.
+
+        Args:
+            batches: Batches as instances, IDs, tags, or lookup hashes
+
+        Returns:
+            A list of location names from the root, in the same order as ``batches``;
+            None for batches without a location
+
+        Raises:
+            ValarLookupError: If a batch does not exist or its location is not in the tree
+        """
+        from valarpy.model import IBatches
+
+        return [
+            None if b.location_id is None else self.path_names(b.location_id)
+            for b in IBatches.fetch_all(batches)
+        ]
+
+    def __contains__(self, location: Union[int, str]) -> bool:
+        return location in self.names or location in self._by_name
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def get_location_tree(refresh: bool = False) -> LocationTree:
+    """
+    Gets the shared location tree, building it on first use.
+
+    Args:
+        refresh: Rebuild the tree (locations can be moved, so it is not updated incrementally)
+    """
+    global _location_tree
+    if _location_tree is None or refresh:
+        _location_tree = LocationTree.build()
+    return _location_tree
+
+
+def clear_location_tree() -> None:
+    """
+    Discards the shared location tree.
+    """
+    global _location_tree
+    _location_tree = None
+
+
+__all__ = ["LocationTree", "get_location_tree", "clear_location_tree"]
@@ -1,9 +1,23 @@
 from collections import defaultdict
 from numbers import Integral
-from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Union
-
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Type,
+    Union,
+)
+
+import numpy as np
 import pandas as pd
 import peewee
+import pymysql
 from peewee import *
 
 from valarpy.connection import GlobalConnection
@@ -23,6 +37,19 @@ class ValarTableTypeError(TypeError):
     """
 
 
+class BlobIntegrityError(ValueError):
+    """
+    A blob does not match its stored SHA-1 hash.
+
+    Attributes:
+        keys: The keys (such as IDs) of the mismatched rows
+    """
+
+    def __init__(self, message: str, keys: Sequence[Any] = ()):
+        super().__init__(message)
+        self.keys = list(keys)
+
+
 # noinspection PyProtectedMember
 class EnumField(peewee._StringField):  # pragma: no cover
     """
@@ -60,6 +87,33 @@ class UnknownField(object):  # pragma: no cover
         pass
 
 
+def stream_tuples(query: peewee.Query, batch_size: int = 256) -> Iterator[tuple]:
+    """
+    Runs a query with an unbuffered (server-side) cursor and yields its rows as tuples.
+    Unlike iterating over a peewee query, the result set is never held in memory at once,
+    which matters for queries that return large blobs.
+    The connection cannot be used for other queries until the iterator is exhausted or closed.
+
+    Args:
+        query: Any peewee SELECT query
+        batch_size: Number of rows to fetch from the server at a time
+
+    Yields:
+        One tuple per row, with values in the order selected
+    """
+    sql, params = query.sql()
+    cursor = GlobalConnection.peewee_database.connection().cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if len(rows) == 0:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
 class TableDescriptionFrame(pd.DataFrame):
     """
     A Pandas DataFrame subclass that contains the columns::
@@ -77,6 +131,124 @@ class TableDescriptionFrame(pd.DataFrame):
     pass
 
 
+# narrowest first; signed so that differences cannot wrap around
+_INT_DTYPES = ("int8", "int16", "int32", "int64")
+
+
+def _narrowest_int_dtype(values: pd.Series, nullable: bool) -> Union[str, np.dtype]:
+    present = values.dropna()
+    # as Python ints, which compare exactly with the bounds of any integer type
+    low, high = (int(present.min()), int(present.max())) if len(present) > 0 else (0, 0)
+    fits = (d for d in _INT_DTYPES if np.iinfo(d).min <= low and high <= np.iinfo(d).max)
+    dtype = next(fits, None)
+    if dtype is None:
+        # above the int64 maximum, as for BIGINT UNSIGNED columns; otherwise leave the dtype
+        if low < 0 or high > np.iinfo(np.uint64).max:
+            return values.dtype
+        dtype = "uint64"
+    if not nullable:
+        return dtype
+    # pandas' nullable integer dtypes are capitalized: Int8, Int16, ..., UInt64
+    return "UInt64" if dtype == "uint64" else dtype.capitalize()
+
+
+def lean_frame(
+    df: pd.DataFrame,
+    model: Union[None, Type["BaseModel"], Sequence[Type["BaseModel"]]] = None,
+) -> pd.DataFrame:
+    """
+    Converts the columns of a DataFrame to compact dtypes:
+        - ``ENUM`` columns of ``model`` become categoricals, with categories from ``EnumField.choices``
+          followed by any other values present (the choices can lag behind the database)
+        - foreign key columns of ``model`` become nullable integers (such as ``Int32``)
+        - other integer columns are downcast to the narrowest integer type that fits,
+          or to a nullable integer type if they contain nulls
+        - strings and other objects are unchanged
+
+    Columns are matched to fields of ``model`` by field name, column name, or ``_id`` name.
+
+    Args:
+        df: Any DataFrame; it is not modified
+        model: The table the columns come from, if any, or a list of tables (earlier ones take precedence)
+
+    Returns:
+        A new DataFrame
+    """
+    fields = {}
+    models = [] if model is None else [model] if isinstance(model, type) else list(model)
+    for m in reversed(models):
+        for field in m._meta.sorted_fields:
+            fields[field.name] = fields[field.column_name] = field
+            if isinstance(field, ForeignKeyField):
+                fields[field.object_id_name] = field
+    df = df.copy()
+    for name in df.columns:
+        field, column = fields.get(name), df[name]
+        if isinstance(field, EnumField) and field.choices is not None:
+            extra = sorted(set(column.dropna()) - set(field.choices), key=str)
+            df[name] = pd.Categorical(column, categories=[*field.choices, *extra])
+        elif isinstance(field, ForeignKeyField):
+            df[name] = column.astype(_narrowest_int_dtype(column, nullable=True))
+        elif isinstance(column.dtype, np.dtype) and column.dtype.kind in "iu":
+            df[name] = column.astype(_narrowest_int_dtype(column, nullable=False))
+        elif isinstance(field, (IntegerField, AutoField)) and column.dtype.kind in "fiuO":
+            df[name] = column.astype(_narrowest_int_dtype(column, nullable=True))
+    return df
+
+
+def memory_report(df: pd.DataFrame, model: Optional[Type["BaseModel"]] = None) -> pd.DataFrame:
+    """
+    Compares the memory of a DataFrame before and after ``lean_frame``.
+
+    Examples:
+        memory_report(Annotations.frame_where(), Annotations)
+
+    Args:
+        df: The DataFrame
+        model: Passed to ``lean_frame``
+
+    Returns:
+        A DataFrame with one row per column and a final ``total`` row, with columns
+        ``column``, ``dtype``, ``lean_dtype``, ``bytes``, ``lean_bytes``, and ``ratio`` (lean / original)
+    """
+    lean = lean_frame(df, model)
+    before = df.memory_usage(deep=True, index=False)
+    after = lean.memory_usage(deep=True, index=False)
+    report = pd.DataFrame(
+        dict(
+            column=list(df.columns) + ["total"],
+            dtype=[str(t) for t in df.dtypes] + [""],
+            lean_dtype=[str(t) for t in lean.dtypes] + [""],
+            bytes=list(before.values) + [before.sum()],
+            lean_bytes=list(after.values) + [after.sum()],
+        )
+    )
+    report["ratio"] = report["lean_bytes"] / report["bytes"].where(report["bytes"] > 0)
+    return report
+
+
+def parse_numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the string columns of a DataFrame whose non-null values are all numbers to numbers,
+    as for key/value tables such as ``run_tags`` and ``sauron_settings``.
+
+    Args:
+        df: Any DataFrame; it is not modified
+
+    Returns:
+        A new DataFrame
+    """
+    df = df.copy()
+    for name in df.columns:
+        column = df[name]
+        if not pd.api.types.is_string_dtype(column):
+            continue
+        numbers = pd.to_numeric(column, errors="coerce")
+        if numbers.notna().sum() == column.notna().sum():
+            df[name] = numbers
+    return df
+
+
 class BaseModel(Model):
     """
     A table model in Valar through Valarpy and peewee.
@@ -98,6 +270,27 @@ class BaseModel(Model):
         """
         return self.__data__
 
+    def open_blob(self, field: str, **kwargs):
+        """
+        Opens a blob column of this row for chunked, seekable reads,
+        without transferring the whole blob.
+
+        Examples:
+            with sensor_data.open_blob("floats") as reader:
+                reader.seek(4000)
+                data = reader.read(400)
+
+        Args:
+            field: The name of a ``BlobField``, such as ``floats``
+            kwargs: Passed to ``valarpy.blobs.BlobReader``
+
+        Returns:
+            A ``valarpy.blobs.BlobReader``
+        """
+        from valarpy.blobs import BlobReader
+
+        return BlobReader(getattr(self.__class__, field), self.id, **kwargs)
+
     @property
     def sstring(self) -> str:
         """
@@ -165,8 +358,10 @@ class BaseModel(Model):
 
         # noinspection PyTypeChecker
         df = pd.DataFrame.from_dict(cls.__description())
+        if len(df) > 0:
+            df["type"] = df["type"].astype("category")
         return TableDescriptionFrame(
-            _cfirst(df, ["name", "type", "nullable", "choices", "primary", "unique"])
+            _cfirst(lean_frame(df), ["name", "type", "nullable", "choices", "primary", "unique"])
         )
 
     @classmethod
@@ -225,6 +420,34 @@ class BaseModel(Model):
             query = query.where(getattr(cls, name) == value)
         return list(query)
 
+    @classmethod
+    def frame_where(
+        cls, *wheres: Sequence[peewee.Expression], **values: Mapping[str, Any]
+    ) -> pd.DataFrame:
+        """
+        Runs a simple query and returns a DataFrame with compact dtypes (see ``lean_frame``).
+        There is one column per field; foreign keys hold IDs and are named like ``run_id``.
+
+        Examples:
+            Annotations.frame_where(Annotations.run << run_ids)
+
+        Args:
+            wheres: List of Peewee WHERE expressions (like ``Users.id==1``) to be joined by AND
+            values: Explicit values (like ``id=1``), also joined by AND
+
+        Returns:
+            The table rows in a DataFrame
+        """
+        fields = cls._meta.sorted_fields
+        query = cls.select(*fields)
+        for where in wheres:
+            query = query.where(where)
+        for name, value in values.items():
+            query = query.where(getattr(cls, name) == value)
+        names = [f.object_id_name if isinstance(f, ForeignKeyField) else f.name for f in fields]
+        df = pd.DataFrame.from_records(list(query.tuples()), columns=names)
+        return lean_frame(df, cls)
+
     @classmethod
     def fetch_or_none(
         cls, thing: Union[Integral, str, peewee.Model], like: bool = False, regex: bool = False
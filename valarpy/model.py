@@ -3,10 +3,13 @@ from pathlib import PurePath as __PurePath
 from typing import Iterable as __Iterable
 from typing import Union as __Union
 from typing import Optional as _Optional
+from typing import Set as _Set
 
+import numpy as _np
 import peewee
 from peewee import *
 
+from valarpy.blobs import decode_blob as _decode_blob
 from valarpy.definitions import *
 from valarpy.metamodel import BaseModel, EnumField
 
@@ -17,16 +20,28 @@ def _blob_type_from_legacy(legacy) -> BlobType:
         "short": BlobType.int_sshort,
         "int": BlobType.int_sint,
         "long": BlobType.int_slong,
-        "float": BlobType.int_sfloat,
-        "double": BlobType.int_sdouble,
+        "float": BlobType.float_sfloat,
+        "double": BlobType.float_sdouble,
         "unsigned_byte": BlobType.int_ubyte,
         "unsigned_short": BlobType.int_ushort,
         "unsigned_int": BlobType.int_uint,
         "unsigned_long": BlobType.int_ulong,
-        "unsigned_float": BlobType.int_ufloat,
-        "unsigned_double": BlobType.int_udouble,
+        "unsigned_float": BlobType.float_ufloat,
+        "unsigned_double": BlobType.float_udouble,
         "utf8_char": BlobType.str_utf8,
         "utf16_char": BlobType.str_utf16,
+        "string:utf8": BlobType.str_utf8,
+        "image:png": BlobType.img_png,
+        "image:jpg": BlobType.img_jpg,
+        "image:tiff": BlobType.img_tiff,
+        "audio:wav": BlobType.audio_wav,
+        "audio:flac": BlobType.audio_flac,
+        "audio:vorbis": BlobType.audio_other,
+        "audio:aac": BlobType.audio_other,
+        "audio:mp3": BlobType.audio_other,
+        "video:mkv:hevc": BlobType.video_hevc_mkv,
+        "video:mkv:avc": BlobType.video_other_mkv,
+        "video:avi": BlobType.video_other,
         "other": BlobType.blob
     }.get(legacy, BlobType.unknown)
 
@@ -274,6 +289,22 @@ class IGeneticVariants(GeneticVariant, BaseModel):  # pragma: no cover
     name = CharField(unique=True)
     notes = TextField(null=True)
 
+    def ancestors(self) -> _Set[int]:
+        """
+        Gets the IDs of the variants this was bred from, recursively. See ``valarpy.lineage``.
+        """
+        from valarpy.lineage import variant_ancestors
+
+        return variant_ancestors([self]).of(self.id)
+
+    def descendants(self) -> _Set[int]:
+        """
+        Gets the IDs of the variants bred from this, recursively. See ``valarpy.lineage``.
+        """
+        from valarpy.lineage import variant_descendants
+
+        return variant_descendants([self]).of(self.id)
+
     class Meta:
         table_name = "genetic_variants"
 
@@ -347,6 +378,22 @@ class IAudioFiles(AudioFile, BaseModel):  # pragma: no cover
     notes = CharField(null=True)
     sha1 = BlobField(unique=True)  # auto-corrected to BlobField
 
+    def waveform(self):
+        """
+        Decodes the whole file. See ``valarpy.audio.load_waveform``.
+        """
+        from valarpy.audio import load_waveform
+
+        return load_waveform(self)
+
+    def window(self, start_sec: float, stop_sec: float):
+        """
+        Decodes only part of the file. See ``valarpy.audio.load_window``.
+        """
+        from valarpy.audio import load_window
+
+        return load_window(self, start_sec, stop_sec)
+
     class Meta:
         table_name = "audio_files"
 
@@ -435,6 +482,22 @@ class IBatches(Batch, BaseModel):  # pragma: no cover
     tag = CharField(null=True, unique=True)
     well_number = IntegerField(index=True, null=True)
 
+    def ancestors(self) -> _Set[int]:
+        """
+        Gets the IDs of the batches this was made from, recursively. See ``valarpy.lineage``.
+        """
+        from valarpy.lineage import batch_ancestors
+
+        return batch_ancestors([self]).of(self.id)
+
+    def descendants(self) -> _Set[int]:
+        """
+        Gets the IDs of the batches made from this, recursively. See ``valarpy.lineage``.
+        """
+        from valarpy.lineage import batch_descendants
+
+        return batch_descendants([self]).of(self.id)
+
     class Meta:
         table_name = "batches"
         indexes = ((("box_number", "well_number"), True),)
@@ -480,7 +543,7 @@ class ISensors(Sensor, BaseModel):  # pragma: no cover
             "unsigned_long",
             "other",
         ),
-        column_name="blob_type"
+        column_name="data_type"
     )  # auto-corrected to Enum
     description = CharField(null=True)
     n_between = IntegerField(null=True)
@@ -490,6 +553,10 @@ class ISensors(Sensor, BaseModel):  # pragma: no cover
     def blob_type(self) -> BlobType:
         return _blob_type_from_legacy(self._data_type)
 
+    @property
+    def sampling(self) -> _Optional[SensorSampling]:
+        return None if self._blob_type is None else SensorSampling[self._blob_type]
+
     @property
     def sensor_type(self) -> SensorType:
         """
@@ -562,7 +629,7 @@ class IFeatures(Feature, BaseModel):  # pragma: no cover
 
     @property
     def blob_type(self) -> BlobType:
-        return _blob_type_from_legacy(self._data_type)
+        return _blob_type_from_legacy(self.data_type)
 
     class Meta:
         table_name = "features"
@@ -612,6 +679,15 @@ class ISensorData(BaseModel):  # pragma: no cover
     run = ForeignKeyField(column_name="run_id", field="id", model=IRuns)
     sensor = ForeignKeyField(column_name="sensor_id", field="id", model=ISensors)
 
+    def to_array(self) -> _np.ndarray:
+        """
+        Decodes ``floats`` according to the sensor's ``blob_type``, without copying.
+
+        Returns:
+            A read-only 1-D NumPy array
+        """
+        return _decode_blob(self.floats, self.sensor.blob_type)
+
     class Meta:
         table_name = "sensor_data"
 
@@ -0,0 +1,389 @@
+"""
+Parallel fetching of many blobs (well features, sensor data, stimulus frames).
+Blobs are downloaded in chunks over several connections at once
+and decoded on a separate pool of threads while downloads continue.
+Requires an open connection (see ``valarpy.opened``).
+"""
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import peewee
+
+from valarpy.blobs import get_blob_dtype
+from valarpy.connection import GlobalConnection
+from valarpy.definitions import BlobType, FeatureLike, RunLike, SensorLike
+from valarpy.integrity import get_sha1_field, sha1_matches
+from valarpy.metamodel import BlobIntegrityError
+
+logger = logging.getLogger("valarpy")
+
+
+@dataclass(frozen=True)
+class BlobChunk:
+    """
+    A set of rows fetched in one query.
+
+    Attributes:
+        ids: The ``id`` of each row
+        n_bytes: The total size of the blobs
+    """
+
+    ids: Tuple[int, ...]
+    n_bytes: int
+
+
+@dataclass(frozen=True)
+class FetchStats:
+    """
+    Statistics of the last fetch.
+    """
+
+    n_rows: int
+    n_chunks: int
+    n_bytes: int
+    seconds: float
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.n_bytes / 1e6 / max(self.seconds, 1e-9)
+
+
+class ParallelBlobFetcher:
+    """
+    Fetches the blobs of many rows concurrently.
+
+    First, the ``id`` and blob length of every matching row are read in one query.
+    The rows are split into chunks of about ``chunk_bytes``, and each chunk is fetched with one
+    ``id IN (...)`` query by a pool of ``max_connections`` threads,
+    each of which holds its own connection for the duration of the fetch.
+    Fetched chunks are decoded on a pool of ``n_decoders`` threads.
+    New chunks are only requested while the chunks fetched or decoded but not yet consumed
+    take less than ``memory_budget`` bytes, so memory stays bounded however many rows match.
+    If ``verify`` is set, each blob is also checked against its SHA-1 column on the decoding threads.
+
+    Examples:
+        fetcher = ParallelBlobFetcher(max_connections=8)
+        query = IWellFeatures.select().join(IWells).where(IWells.run << run_ids)
+        for arrays in fetcher.iter_chunks(query, IWellFeatures.floats, [IWellFeatures.well]):
+            ...
+
+    Args:
+        max_connections: Maximum number of concurrent queries (and connections)
+        n_decoders: Number of threads that decode blobs
+        chunk_bytes: Approximate number of blob bytes per query
+        memory_budget: Maximum number of bytes fetched but not yet consumed;
+                       a single chunk larger than this is still fetched, alone
+        verify: Check each blob against its stored SHA-1 hash (see ``valarpy.integrity``)
+        raise_on_mismatch: If ``verify``, raise a ``BlobIntegrityError`` on the first mismatched chunk;
+                           otherwise, only record the keys in ``mismatches``
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 4,
+        n_decoders: int = 2,
+        chunk_bytes: int = 32 * 1024 * 1024,
+        memory_budget: int = 512 * 1024 * 1024,
+        verify: bool = False,
+        raise_on_mismatch: bool = True,
+    ):
+        if max_connections < 1 or n_decoders < 1:
+            raise ValueError("Need at least one connection and one decoder")
+        self.max_connections = max_connections
+        self.n_decoders = n_decoders
+        self.chunk_bytes = chunk_bytes
+        self.memory_budget = memory_budget
+        self.verify = verify
+        self.raise_on_mismatch = raise_on_mismatch
+        self.stats: Optional[FetchStats] = None
+        self.mismatches: List[Any] = []
+
+    def plan(self, query: peewee.Select, field: peewee.Field) -> List[BlobChunk]:
+        """
+        Splits the rows matched by ``query`` into chunks, without fetching any blobs.
+
+        Args:
+            query: A SELECT over the model of ``field``, with any joins and conditions
+            field: The blob field
+
+        Returns:
+            The chunks, in order of ``id``
+        """
+        model = field.model
+        rows = query.select(model.id, peewee.fn.LENGTH(field)).order_by(model.id).tuples()
+        return self.split([(row_id, length or 0) for row_id, length in rows])
+
+    def split(self, lengths: Sequence[Tuple[int, int]]) -> List[BlobChunk]:
+        """
+        Splits rows into consecutive chunks of at most ``chunk_bytes`` (but at least one row).
+
+        Args:
+            lengths: Pairs of row ``id`` and blob length
+
+        Returns:
+            The chunks
+        """
+        chunks, ids, n_bytes = [], [], 0
+        for row_id, length in lengths:
+            if len(ids) > 0 and n_bytes + length > self.chunk_bytes:
+                chunks.append(BlobChunk(tuple(ids), n_bytes))
+                ids, n_bytes = [], 0
+            ids.append(row_id)
+            n_bytes += length
+        if len(ids) > 0:
+            chunks.append(BlobChunk(tuple(ids), n_bytes))
+        return chunks
+
+    def fetch(
+        self,
+        query: peewee.Select,
+        field: peewee.Field,
+        keys: Sequence[peewee.Field],
+        decoder: Union[BlobType, Callable[[bytes], Any]],
+    ) -> Dict[Any, Any]:
+        """
+        Fetches and decodes all matching blobs into one dict.
+        See ``iter_chunks`` for the arguments.
+        """
+        results = {}
+        for chunk in self.iter_chunks(query, field, keys, decoder):
+            results.update(chunk)
+        return results
+
+    def iter_chunks(
+        self,
+        query: peewee.Select,
+        field: peewee.Field,
+        keys: Sequence[peewee.Field],
+        decoder: Union[BlobType, Callable[[bytes], Any]],
+    ) -> Iterator[Dict[Any, Any]]:
+        """
+        Fetches and decodes matching blobs, yielding them one chunk at a time as they complete.
+        Chunks are yielded in order of completion, not of ``id``.
+
+        Args:
+            query: A SELECT over the model of ``field``, with any joins and conditions
+            field: The blob field, such as ``IWellFeatures.floats``
+            keys: Fields of the model that identify each blob in the output, such as ``IWellFeatures.well``;
+                  with one field, the output keys are its values; otherwise, tuples
+            decoder: A ``BlobType``, to decode each blob into a native-endian array,
+                     or a function that decodes bytes
+
+        Yields:
+            Dicts mapping keys to decoded blobs
+
+        Raises:
+            BlobIntegrityError: If a blob does not match its hash, with ``raise_on_mismatch``
+            Any exception raised while fetching or decoding, after in-flight queries finish
+        """
+        if isinstance(decoder, BlobType):
+            decoder = _ArrayDecoder(get_blob_dtype(decoder))
+        t0 = time.monotonic()
+        chunks = self.plan(query, field)
+        self.mismatches = []
+        done = queue.Queue()
+        connections = []
+        in_flight, n_bytes_in_flight, i = 0, 0, 0
+        fetchers = ThreadPoolExecutor(
+            self.max_connections,
+            thread_name_prefix="valarpy-fetch",
+            initializer=_connect,
+            initargs=(connections,),
+        )
+        decoders = ThreadPoolExecutor(self.n_decoders, thread_name_prefix="valarpy-decode")
+        futures = []
+        try:
+            while i < len(chunks) or in_flight > 0:
+                while i < len(chunks) and (
+                    in_flight == 0 or n_bytes_in_flight + chunks[i].n_bytes <= self.memory_budget
+                ):
+                    futures.append(
+                        fetchers.submit(
+                            self._fetch_then_decode, chunks[i], field, keys, decoder, decoders, done
+                        )
+                    )
+                    n_bytes_in_flight += chunks[i].n_bytes
+                    in_flight += 1
+                    i += 1
+                chunk, decoded, mismatches, error = done.get()
+                in_flight -= 1
+                if error is not None:
+                    raise error
+                self.mismatches.extend(mismatches)
+                if len(mismatches) > 0 and self.raise_on_mismatch:
+                    raise BlobIntegrityError(f"SHA-1 mismatch for {mismatches}", mismatches)
+                yield decoded
+                n_bytes_in_flight -= chunk.n_bytes
+        finally:
+            for future in futures:
+                future.cancel()
+            fetchers.shutdown(wait=True)
+            decoders.shutdown(wait=True)
+            for connection in connections:
+                connection.close()
+            self.stats = FetchStats(
+                n_rows=sum(len(c.ids) for c in chunks[:i]),
+                n_chunks=i,
+                n_bytes=sum(c.n_bytes for c in chunks[:i]),
+                seconds=time.monotonic() - t0,
+            )
+            logger.debug(
+                f"Fetched {self.stats.n_bytes} bytes at {self.stats.mb_per_second:.1f} MB/s"
+            )
+
+    def _fetch_then_decode(
+        self,
+        chunk: BlobChunk,
+        field: peewee.Field,
+        keys: Sequence[peewee.Field],
+        decoder: Callable[[bytes], Any],
+        decoders: ThreadPoolExecutor,
+        done: queue.Queue,
+    ) -> None:
+        try:
+            rows = self._fetch_rows(chunk, field, keys)
+        except BaseException as e:
+            done.put((chunk, None, [], e))
+            return
+        n_keys = len(keys)
+
+        def decode() -> None:
+            try:
+                decoded, mismatches = {}, []
+                for row in rows:
+                    key = row[0] if n_keys == 1 else tuple(row[:n_keys])
+                    if self.verify and not sha1_matches(row[n_keys], row[n_keys + 1]):
+                        mismatches.append(key)
+                    decoded[key] = decoder(row[n_keys])
+            except BaseException as e:
+                done.put((chunk, None, [], e))
+            else:
+                done.put((chunk, decoded, mismatches, None))
+
+        decoders.submit(decode)
+
+    def _fetch_rows(
+        self, chunk: BlobChunk, field: peewee.Field, keys: Sequence[peewee.Field]
+    ) -> List[tuple]:
+        model = field.model
+        fields = [*keys, field, get_sha1_field(field)] if self.verify else [*keys, field]
+        return list(model.select(*fields).where(model.id << list(chunk.ids)).tuples())
+
+
+class _ArrayDecoder:
+    def __init__(self, dtype: np.dtype):
+        self.dtype = dtype
+
+    def __call__(self, data: bytes) -> np.ndarray:
+        # converting to native byte order copies, which NumPy does without holding the GIL
+        return np.frombuffer(data, dtype=self.dtype).astype(self.dtype.newbyteorder("="))
+
+
+def _connect(connections: List[Any]) -> None:
+    # peewee keeps one connection per thread
+    database = GlobalConnection.peewee_database
+    database.connect(reuse_if_open=True)
+    connections.append(database.connection())
+
+
+def fetch_well_features(
+    runs: Iterable[RunLike], feature: FeatureLike, **kwargs
+) -> Dict[int, np.ndarray]:
+    """
+    Fetches a feature for every well of many runs in parallel.
+
+    Examples:
+        arrays = fetch_well_features(run_ids, "MI", max_connections=8)
+
+    Args:
+        runs: Runs as instances, IDs, tags, or names
+        feature: The feature as an instance, ID, or name
+        kwargs: Passed to ``ParallelBlobFetcher``
+
+    Returns:
+        A dict mapping well IDs to native-endian arrays
+
+    Raises:
+        ValarLookupError: If a run or the feature does not exist
+    """
+    from valarpy.model import IFeatures, IRuns, IWellFeatures, IWells
+
+    feature = IFeatures.fetch(feature)
+    run_ids = [r.id for r in IRuns.fetch_all(runs)]
+    query = (
+        IWellFeatures.select()
+        .join(IWells)
+        .where((IWellFeatures.type == feature.id) & (IWells.run << run_ids))
+    )
+    fetcher = ParallelBlobFetcher(**kwargs)
+    return fetcher.fetch(query, IWellFeatures.floats, [IWellFeatures.well], feature.blob_type)
+
+
+def fetch_sensor_data(
+    runs: Iterable[RunLike], sensor: SensorLike, **kwargs
+) -> Dict[int, np.ndarray]:
+    """
+    Fetches the data of a sensor for many runs in parallel.
+
+    Args:
+        runs: Runs as instances, IDs, tags, or names
+        sensor: The sensor as an instance, ID, or name
+        kwargs: Passed to ``ParallelBlobFetcher``
+
+    Returns:
+        A dict mapping run IDs to native-endian arrays
+
+    Raises:
+        ValarLookupError: If a run or the sensor does not exist
+    """
+    from valarpy.model import IRuns, ISensorData, ISensors
+
+    sensor = ISensors.fetch(sensor)
+    run_ids = [r.id for r in IRuns.fetch_all(runs)]
+    query = ISensorData.select().where(
+        (ISensorData.sensor == sensor.id) & (ISensorData.run << run_ids)
+    )
+    fetcher = ParallelBlobFetcher(**kwargs)
+    return fetcher.fetch(query, ISensorData.floats, [ISensorData.run], sensor.blob_type)
+
+
+def fetch_stimulus_frames(assays: Iterable[Any], **kwargs) -> Dict[Tuple[int, int], np.ndarray]:
+    """
+    Fetches the stimulus frames of many assays in parallel.
+
+    Args:
+        assays: Assays as instances, IDs, or names
+        kwargs: Passed to ``ParallelBlobFetcher``
+
+    Returns:
+        A dict mapping pairs of assay ID and stimulus ID to arrays of ``uint8`` intensities
+
+    Raises:
+        ValarLookupError: If an assay does not exist
+    """
+    from valarpy.model import IAssays, IStimulusFrames
+
+    assay_ids = [a.id for a in IAssays.fetch_all(assays)]
+    query = IStimulusFrames.select().where(IStimulusFrames.assay << assay_ids)
+    fetcher = ParallelBlobFetcher(**kwargs)
+    return fetcher.fetch(
+        query,
+        IStimulusFrames.frames,
+        [IStimulusFrames.assay, IStimulusFrames.stimulus],
+        BlobType.int_ubyte,
+    )
+
+
+__all__ = [
+    "BlobChunk",
+    "FetchStats",
+    "ParallelBlobFetcher",
+    "fetch_well_features",
+    "fetch_sensor_data",
+    "fetch_stimulus_frames",
+]
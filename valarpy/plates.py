@@ -0,0 +1,259 @@
+"""
+Plate layouts: wells of many runs arranged as ``(n_rows, n_columns)`` grids,
+with layers for treatments, genetic variants, control types, and well groups.
+Requires an open connection (see ``valarpy.opened``).
+"""
+import string
+from dataclasses import dataclass
+from typing import Iterable, Sequence, Tuple, Union
+
+import numpy as np
+
+from valarpy.definitions import RunLike
+from valarpy.metamodel import ValarLookupError
+
+# fields of PlateLayout.wells; -1 means none
+WELL_DTYPE = np.dtype(
+    [
+        ("well_id", np.int64),
+        ("well_index", np.int32),
+        ("control_type", np.int32),
+        ("variant", np.int32),
+        ("group", np.int32),
+    ]
+)
+
+
+def well_positions(
+    well_indices: Union[int, Sequence[int], np.ndarray], n_columns: Union[int, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts 1-based, row-major well indices to 0-based rows and columns.
+
+    Examples:
+        well_positions([1, 12, 13], 12)  # ([0, 0, 1], [0, 11, 0])
+
+    Args:
+        well_indices: ``IWells.well_index`` values
+        n_columns: The number of columns of the plate type, either one or per well
+
+    Returns:
+        Arrays of rows and of columns
+    """
+    return np.divmod(np.asarray(well_indices, dtype=np.int64) - 1, n_columns)
+
+
+def well_labels(
+    well_indices: Union[int, Sequence[int], np.ndarray], n_columns: Union[int, np.ndarray]
+) -> np.ndarray:
+    """
+    Converts 1-based, row-major well indices to labels like ``B07``.
+
+    Args:
+        well_indices: ``IWells.well_index`` values
+        n_columns: The number of columns of the plate type, either one or per well
+
+    Returns:
+        An array of strings
+    """
+    rows, columns = well_positions(well_indices, n_columns)
+    letters = np.array(_row_labels(int(rows.max(initial=0)) + 1))
+    return np.char.add(letters[rows], np.char.zfill((columns + 1).astype(str), 2))
+
+
+@dataclass(frozen=True)
+class PlateLayout:
+    """
+    The wells of many runs as a stack of plate grids, with dimensions ``(run, row, column)``.
+    Runs on smaller plate types are padded; padded positions have ``well_id == -1``.
+
+    Examples:
+        layout = load_plate_layouts(run_ids)
+        layout["control_type"][0]  # the control type of every well of the first run
+        layout.for_run(5123)["variant"]
+
+    Attributes:
+        run_ids: The run IDs, in the order passed
+        plate_types: The ``IPlateTypes`` ID of each run
+        n_rows: The number of rows of each run's plate type
+        n_columns: The number of columns of each run's plate type
+        wells: A structured array of shape ``(n_runs, max rows, max columns)`` with dtype ``WELL_DTYPE``
+        groups: The distinct ``well_group`` values; ``wells["group"]`` indexes into them
+        batches: The ``IBatches`` IDs of the treatments, with shape ``(n_runs, rows, columns, max treatments)``;
+                 -1 where there are fewer treatments
+        doses: The micromolar doses of the treatments, aligned with ``batches``; NaN where missing
+    """
+
+    run_ids: np.ndarray
+    plate_types: np.ndarray
+    n_rows: np.ndarray
+    n_columns: np.ndarray
+    wells: np.ndarray
+    groups: Tuple[str, ...]
+    batches: np.ndarray
+    doses: np.ndarray
+
+    dims = ("run", "row", "column")
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.wells.shape
+
+    @property
+    def row_labels(self) -> Sequence[str]:
+        return _row_labels(self.shape[1])
+
+    @property
+    def column_labels(self) -> Sequence[int]:
+        return list(range(1, self.shape[2] + 1))
+
+    def __getitem__(self, layer: str) -> np.ndarray:
+        """
+        Gets a layer by name: a field of ``WELL_DTYPE``, ``batches``, or ``doses``.
+        """
+        if layer in {"batches", "doses"}:
+            return getattr(self, layer)
+        return self.wells[layer]
+
+    def for_run(self, run_id: int) -> np.ndarray:
+        """
+        Gets the ``(rows, columns)`` structured grid of one run, trimmed to its plate type.
+        """
+        i = self._run_position(run_id)
+        return self.wells[i, : self.n_rows[i], : self.n_columns[i]]
+
+    def group_mask(self, group: str) -> np.ndarray:
+        """
+        Gets a boolean ``(run, row, column)`` mask of the wells in a ``well_group``.
+        """
+        if group not in self.groups:
+            return np.zeros(self.shape, dtype=bool)
+        return self.wells["group"] == self.groups.index(group)
+
+    def _run_position(self, run_id: int) -> int:
+        positions = np.flatnonzero(self.run_ids == run_id)
+        if len(positions) == 0:
+            raise ValarLookupError(f"Run {run_id} is not in the layout")
+        return int(positions[0])
+
+
+def load_plate_layouts(runs: Iterable[RunLike]) -> PlateLayout:
+    """
+    Loads the plate layouts of many runs.
+    Performs four queries regardless of the number of runs: the runs, their plate types,
+    their wells, and the wells' treatments.
+
+    Args:
+        runs: Runs as instances, IDs, tags, or names
+
+    Returns:
+        A ``PlateLayout``
+
+    Raises:
+        ValarLookupError: If a run does not exist or its plate has no plate type
+        ValueError: If a well index does not fit in its plate type
+    """
+    from valarpy.model import IPlates, IPlateTypes, IRuns, IWells
+
+    runs = IRuns.fetch_all(runs)
+    run_ids = np.array([r.id for r in runs], dtype=np.int64)
+    plates = {
+        plate_id: (plate_type, n_rows, n_columns)
+        for plate_id, plate_type, n_rows, n_columns in (
+            IPlates.select(IPlates.id, IPlateTypes.id, IPlateTypes.n_rows, IPlateTypes.n_columns)
+            .join(IPlateTypes)
+            .where(IPlates.id << list({r.plate_id for r in runs}))
+            .tuples()
+        )
+    }
+    missing = [r.id for r in runs if r.plate_id not in plates]
+    if len(missing) > 0:
+        raise ValarLookupError(f"Runs {missing} have plates without plate types")
+    specs = np.array([plates[r.plate_id] for r in runs], dtype=np.int64).reshape(len(runs), 3)
+    plate_types, n_rows, n_columns = specs.T.copy()
+    shape = (len(runs), int(n_rows.max(initial=0)), int(n_columns.max(initial=0)))
+    wells = np.full(shape, -1, dtype=WELL_DTYPE)
+    rows = list(
+        IWells.select(
+            IWells.id,
+            IWells.run,
+            IWells.well_index,
+            IWells.control_type,
+            IWells.variant,
+            IWells.well_group,
+        )
+        .where(IWells.run << run_ids.tolist())
+        .tuples()
+    )
+    groups = tuple(sorted({row[5] for row in rows if row[5] is not None}))
+    group_codes = {g: i for i, g in enumerate(groups)}
+    well_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    positions = _run_positions(run_ids, [row[1] for row in rows])
+    well_indices = np.array([row[2] for row in rows], dtype=np.int64)
+    well_rows, well_columns = well_positions(well_indices, n_columns[positions])
+    out_of_bounds = (well_rows >= n_rows[positions]) | (well_indices < 1)
+    if out_of_bounds.any():
+        raise ValueError(f"Wells {well_ids[out_of_bounds].tolist()} do not fit their plate types")
+    at = (positions, well_rows, well_columns)
+    wells["well_id"][at] = well_ids
+    wells["well_index"][at] = well_indices
+    wells["control_type"][at] = [-1 if row[3] is None else row[3] for row in rows]
+    wells["variant"][at] = [-1 if row[4] is None else row[4] for row in rows]
+    wells["group"][at] = [group_codes.get(row[5], -1) for row in rows]
+    batches, doses = _load_treatments(run_ids, well_ids, at, shape)
+    return PlateLayout(
+        run_ids=run_ids,
+        plate_types=plate_types,
+        n_rows=n_rows,
+        n_columns=n_columns,
+        wells=wells,
+        groups=groups,
+        batches=batches,
+        doses=doses,
+    )
+
+
+def _load_treatments(
+    run_ids: np.ndarray,
+    well_ids: np.ndarray,
+    at: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    shape: Tuple[int, int, int],
+) -> Tuple[np.ndarray, np.ndarray]:
+    from valarpy.model import IWells, IWellTreatments
+
+    treatments = list(
+        IWellTreatments.select(
+            IWellTreatments.well, IWellTreatments.batch, IWellTreatments.micromolar_dose
+        )
+        .join(IWells)
+        .where(IWells.run << run_ids.tolist())
+        .order_by(IWellTreatments.well, IWellTreatments.batch)
+        .tuples()
+    )
+    treated = np.array([t[0] for t in treatments], dtype=np.int64)
+    # the position of each treatment among its well's treatments
+    starts = np.searchsorted(treated, treated, side="left")
+    slots = np.arange(len(treated)) - starts
+    n_slots = int(slots.max(initial=-1)) + 1
+    batches = np.full(shape + (n_slots,), -1, dtype=np.int64)
+    doses = np.full(shape + (n_slots,), np.nan, dtype=np.float32)
+    if len(treated) > 0:
+        order = np.argsort(well_ids)
+        found = order[np.searchsorted(well_ids, treated, sorter=order)]
+        where = tuple(a[found] for a in at) + (slots,)
+        batches[where] = [t[1] for t in treatments]
+        doses[where] = [np.nan if t[2] is None else t[2] for t in treatments]
+    return batches, doses
+
+
+def _run_positions(run_ids: np.ndarray, values: Sequence[int]) -> np.ndarray:
+    order = np.argsort(run_ids)
+    return order[np.searchsorted(run_ids, np.asarray(values, dtype=np.int64), sorter=order)]
+
+
+def _row_labels(n: int) -> Sequence[str]:
+    letters = string.ascii_uppercase
+    return [letters[i] if i < 26 else letters[i // 26 - 1] + letters[i % 26] for i in range(n)]
+
+
+__all__ = ["WELL_DTYPE", "PlateLayout", "load_plate_layouts", "well_positions", "well_labels"]
@@ -0,0 +1,133 @@
+"""
+Quality-control filters that exclude runs, wells, or submissions with bad annotations,
+compiled into SQL anti-joins (``NOT EXISTS``) so a QC-filtered selection is a single query.
+
+Annotations apply at three scopes:
+    - submission annotations have a ``submission``, but no ``run`` or ``well``
+    - run annotations have a ``run``, but no ``well``
+    - well annotations have a ``well``
+
+With ``inherit`` (the default), an annotation also applies to everything under its scope:
+a bad submission annotation excludes the submission's runs and wells,
+and a bad run annotation excludes the run's wells.
+Annotations at level ``9:deleted`` never exclude anything.
+"""
+from typing import List, Union
+
+import peewee
+
+from valarpy.definitions import AnnotationLevel
+
+AnnotationLevelLike = Union[AnnotationLevel, str]
+
+
+def bad_levels(threshold: AnnotationLevelLike = AnnotationLevel.caution) -> List[str]:
+    """
+    Gets the values of ``annotations.level`` at or worse than a threshold.
+
+    Args:
+        threshold: A level, its name, or its database value; by default ``2:caution``
+
+    Returns:
+        Database values such as ``["2:caution", "3:warning", "4:danger", "to_fix"]``
+    """
+    threshold = AnnotationLevel.of(threshold)
+    return [
+        level.db_value
+        for level in sorted(AnnotationLevel)
+        if level >= threshold and level is not AnnotationLevel.deleted
+    ]
+
+
+def annotation_filter(
+    model, threshold: AnnotationLevelLike = AnnotationLevel.caution, inherit: bool = True
+) -> peewee.Expression:
+    """
+    Builds a WHERE condition that excludes rows with annotations at or worse than a threshold.
+
+    Examples:
+        query = IWells.select().where(IWells.run << run_ids)
+        query = query.where(annotation_filter(IWells, "2:caution"))
+
+    Args:
+        model: ``IRuns``, ``IWells``, or ``ISubmissions``, which must be in the query's FROM
+        threshold: A level, its name, or its database value
+        inherit: Also exclude rows under a bad submission or run
+
+    Returns:
+        A condition to pass to ``where``
+
+    Raises:
+        TypeError: If ``model`` is not one of the supported tables
+    """
+    from valarpy.model import IAnnotations, IRuns, ISubmissions, IWells
+
+    levels = bad_levels(threshold)
+
+    def bad(*conditions: peewee.Expression) -> peewee.Expression:
+        where = IAnnotations.level << levels
+        for condition in conditions:
+            where &= condition
+        return peewee.fn.EXISTS(IAnnotations.select(peewee.SQL("1")).where(where))
+
+    def on_submission(submission: peewee.Field) -> peewee.Expression:
+        return bad(
+            IAnnotations.submission == submission,
+            IAnnotations.run.is_null(),
+            IAnnotations.well.is_null(),
+        )
+
+    def on_run(run: peewee.Field) -> peewee.Expression:
+        return bad(IAnnotations.run == run, IAnnotations.well.is_null())
+
+    if model is ISubmissions:
+        return ~on_submission(ISubmissions.id)
+    elif model is IRuns:
+        if not inherit:
+            return ~on_run(IRuns.id)
+        return ~(on_run(IRuns.id) | on_submission(IRuns.submission))
+    elif model is IWells:
+        well = bad(IAnnotations.well == IWells.id)
+        if not inherit:
+            return ~well
+        # the well's run is not in the FROM, so find its submission through a join
+        submission = peewee.fn.EXISTS(
+            IAnnotations.select(peewee.SQL("1"))
+            .join(IRuns, on=(IAnnotations.submission == IRuns.submission))
+            .where(
+                (IRuns.id == IWells.run)
+                & (IAnnotations.level << levels)
+                & IAnnotations.run.is_null()
+                & IAnnotations.well.is_null()
+            )
+        )
+        return ~(well | on_run(IWells.run) | submission)
+    raise TypeError(f"Cannot filter {model} by annotations")
+
+
+def qc_filter(
+    query: peewee.Select,
+    threshold: AnnotationLevelLike = AnnotationLevel.caution,
+    inherit: bool = True,
+) -> peewee.Select:
+    """
+    Restricts a query over runs, wells, or submissions to rows without bad annotations.
+
+    Examples:
+        good_runs = list(qc_filter(IRuns.select().where(IRuns.experiment == 12)))
+
+    Args:
+        query: A SELECT whose model is ``IRuns``, ``IWells``, or ``ISubmissions``
+        threshold: A level, its name, or its database value
+        inherit: Also exclude rows under a bad submission or run
+
+    Returns:
+        The query with an added condition
+
+    Raises:
+        TypeError: If the query's model is not one of the supported tables
+    """
+    return query.where(annotation_filter(query.model, threshold, inherit))
+
+
+__all__ = ["bad_levels", "annotation_filter", "qc_filter"]
@@ -0,0 +1,145 @@
+"""
+Resolution of mixed lists of run keys (IDs, tags, names, and submission lookup hashes)
+with a fixed number of set-based queries, rather than one or more queries per key.
+Requires an open connection (see ``valarpy.opened``).
+"""
+from dataclasses import dataclass
+from numbers import Integral
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from valarpy.definitions import Run
+from valarpy.metamodel import ValarLookupError
+
+RunKey = Union[int, str, Run]
+
+# how each key was resolved, in order of precedence
+MATCH_KINDS = ("instance", "id", "tag", "name", "submission")
+
+
+@dataclass(frozen=True)
+class RunResolution:
+    """
+    The runs that a list of keys resolved to, aligned with the keys.
+
+    Attributes:
+        keys: The keys, in the order passed
+        run_ids: The run ID of each key; -1 where it did not resolve
+        matched_by: What each key matched (one of ``MATCH_KINDS``), or None where it did not resolve
+    """
+
+    keys: Tuple[RunKey, ...]
+    run_ids: np.ndarray
+    matched_by: Tuple[Optional[str], ...]
+
+    @property
+    def unresolved(self) -> List[RunKey]:
+        """
+        The keys that did not resolve, in order, with duplicates.
+        """
+        return [k for k, m in zip(self.keys, self.matched_by) if m is None]
+
+    @property
+    def is_complete(self) -> bool:
+        return bool((self.run_ids >= 0).all())
+
+    def require(self) -> np.ndarray:
+        """
+        Gets the run IDs, requiring every key to have resolved.
+
+        Raises:
+            ValarLookupError: If any key did not resolve, listing all of them
+        """
+        if not self.is_complete:
+            raise ValarLookupError(f"Could not resolve runs {self.unresolved}")
+        return self.run_ids
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+def resolve_runs(keys: Iterable[RunKey], chunk_size: int = 5000) -> RunResolution:
+    """
+    Resolves many run keys at once.
+    Integers and all-digit strings are run IDs; other strings are tried as ``IRuns.tag``,
+    then ``IRuns.name``, then the ``lookup_hash`` of the run's submission.
+    Performs at most three queries per ``chunk_size`` distinct keys:
+    one for IDs, one for tags and names, and one joining ``submissions`` for the strings left over.
+
+    Examples:
+        resolution = resolve_runs(["20190415.113023.Thor", 5123, "a8d2e5f13b2c"])
+        resolution.unresolved  # []
+        run_ids = resolution.require()
+
+    Args:
+        keys: Runs as instances, IDs, tags, names, or submission lookup hashes
+        chunk_size: The maximum number of values in each ``IN`` list
+
+    Returns:
+        A ``RunResolution``
+
+    Raises:
+        TypeError: If a key is not an int, str, or ``IRuns``
+        ValueError: If ``chunk_size`` is less than 1
+    """
+    from valarpy.model import IRuns, ISubmissions
+
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size is {chunk_size}")
+    keys = tuple(keys)
+    bad = {type(k).__name__ for k in keys if not isinstance(k, (Integral, str, IRuns))}
+    if len(bad) > 0:
+        raise TypeError(f"Cannot resolve runs from {bad}")
+    found: Dict[Union[int, str], Tuple[int, str]] = {}
+    ids = {_as_id(k) for k in keys if _as_id(k) is not None}
+    strings = {k for k in keys if isinstance(k, str) and _as_id(k) is None}
+    for chunk in _chunks(ids, chunk_size):
+        for (run_id,) in IRuns.select(IRuns.id).where(IRuns.id << chunk).tuples():
+            found[run_id] = (run_id, "id")
+    for chunk in _chunks(strings, chunk_size):
+        query = IRuns.select(IRuns.id, IRuns.tag, IRuns.name).where(
+            (IRuns.tag << chunk) | (IRuns.name << chunk)
+        )
+        names = {}
+        for run_id, tag, name in query.tuples():
+            found[tag] = (run_id, "tag")
+            if name is not None:
+                names[name] = (run_id, "name")
+        for name, match in names.items():
+            found.setdefault(name, match)
+    left = strings - set(found)
+    for chunk in _chunks(left, chunk_size):
+        query = (
+            IRuns.select(IRuns.id, ISubmissions.lookup_hash)
+            .join(ISubmissions)
+            .where(ISubmissions.lookup_hash << chunk)
+        )
+        for run_id, lookup_hash in query.tuples():
+            found[lookup_hash] = (run_id, "submission")
+    run_ids, matched_by = [], []
+    for key in keys:
+        if isinstance(key, IRuns):
+            run_id, kind = key.id, "instance"
+        else:
+            lookup = key if _as_id(key) is None else _as_id(key)
+            run_id, kind = found.get(lookup, (-1, None))
+        run_ids.append(run_id)
+        matched_by.append(kind)
+    return RunResolution(keys, np.array(run_ids, dtype=np.int64), tuple(matched_by))
+
+
+def _as_id(key: RunKey) -> Optional[int]:
+    if isinstance(key, Integral):
+        return int(key)
+    if isinstance(key, str) and key.isdigit():
+        return int(key)
+    return None
+
+
+def _chunks(values: Iterable, size: int) -> Iterable[List]:
+    values = sorted(values)
+    return [values[i : i + size] for i in range(0, len(values), size)]
+
+
+__all__ = ["MATCH_KINDS", "RunKey", "RunResolution", "resolve_runs"]
@@ -0,0 +1,231 @@
+"""
+Point-in-time lookup of Sauron configurations and their settings.
+An index built from one read of ``sauron_configs`` and one of ``sauron_settings``
+finds the configuration in force on many ``(sauron, datetime)`` pairs with binary search.
+Requires an open connection (see ``valarpy.opened``) to build the index or load runs.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from valarpy.definitions import RunLike
+from valarpy.metamodel import lean_frame, parse_numeric_columns
+
+_sauron_index: Optional["SauronConfigIndex"] = None
+
+Times = Union[Sequence[datetime], np.ndarray, pd.Series]
+
+
+class SauronConfigIndex:
+    """
+    The configurations of every Sauron as sorted change times, with the settings of each.
+    A configuration is in force from its ``datetime_changed`` until the next one of its Sauron.
+
+    Examples:
+        index = get_sauron_index()
+        index.settings_at([2, 2], [datetime(2019, 5, 1), datetime(2020, 1, 1)])
+
+    Attributes:
+        config_ids: The configuration IDs, sorted by Sauron and then ``datetime_changed``
+        saurons: The Sauron ID of each configuration
+        changed: The ``datetime_changed`` of each configuration, as ``datetime64[us]``
+        settings: Maps each configuration ID to its settings by name
+    """
+
+    def __init__(
+        self,
+        configs: Iterable[Tuple[int, int, datetime]],
+        settings: Iterable[Tuple[int, str, str]] = (),
+    ):
+        """
+        Indexes rows.
+
+        Args:
+            configs: Tuples of configuration ID, Sauron ID, and ``datetime_changed``
+            settings: Tuples of configuration ID, setting name, and value
+        """
+        configs = list(configs)
+        config_ids = np.array([c[0] for c in configs], dtype=np.int64)
+        saurons = np.array([c[1] for c in configs], dtype=np.int64)
+        changed = np.array([c[2] for c in configs], dtype="datetime64[us]")
+        order = np.lexsort((changed, saurons))
+        self.config_ids = config_ids[order]
+        self.saurons = saurons[order]
+        self.changed = changed[order]
+        distinct, starts, counts = np.unique(self.saurons, return_index=True, return_counts=True)
+        self._bounds: Dict[int, Tuple[int, int]] = {
+            int(s): (int(start), int(start + count))
+            for s, start, count in zip(distinct, starts, counts)
+        }
+        self._sauron_of = dict(zip(self.config_ids.tolist(), self.saurons.tolist()))
+        self.settings: Dict[int, Dict[str, str]] = {}
+        for config_id, name, value in settings:
+            self.settings.setdefault(config_id, {})[name] = value
+
+    @classmethod
+    def build(cls) -> "SauronConfigIndex":
+        """
+        Builds the index with two queries.
+        """
+        from valarpy.model import ISauronConfigs, ISauronSettings
+
+        configs = ISauronConfigs.select(
+            ISauronConfigs.id, ISauronConfigs.sauron, ISauronConfigs.datetime_changed
+        ).tuples()
+        settings = ISauronSettings.select(
+            ISauronSettings.sauron_config, ISauronSettings.name, ISauronSettings.value
+        ).tuples()
+        return cls(configs, settings)
+
+    def sauron_of(self, config_id: int) -> Optional[int]:
+        """
+        Gets the Sauron ID of a configuration, or None if it is not indexed.
+        """
+        return self._sauron_of.get(config_id)
+
+    def configs_at(self, saurons: Union[Sequence[int], np.ndarray], times: Times) -> np.ndarray:
+        """
+        Finds the configuration in force for each ``(sauron, datetime)`` pair.
+        Performs one vectorized binary search per distinct Sauron.
+
+        Args:
+            saurons: Sauron IDs
+            times: Datetimes, aligned with ``saurons``
+
+        Returns:
+            An int64 array of configuration IDs; -1 where the Sauron had no configuration yet
+
+        Raises:
+            ValueError: If ``saurons`` and ``times`` differ in length
+        """
+        saurons = np.asarray(saurons, dtype=np.int64)
+        times = np.asarray(times, dtype="datetime64[us]")
+        if saurons.shape != times.shape:
+            raise ValueError(f"Got {len(saurons)} Saurons but {len(times)} times")
+        found = np.full(len(saurons), -1, dtype=np.int64)
+        for sauron in np.unique(saurons):
+            if int(sauron) not in self._bounds:
+                continue
+            start, stop = self._bounds[int(sauron)]
+            mask = saurons == sauron
+            positions = np.searchsorted(self.changed[start:stop], times[mask], side="right") - 1
+            candidates = self.config_ids[start:stop][np.maximum(positions, 0)]
+            found[mask] = np.where(positions >= 0, candidates, -1)
+        return found
+
+    def settings_table(
+        self, config_ids: Union[Sequence[int], np.ndarray], typed: bool = True
+    ) -> pd.DataFrame:
+        """
+        Builds a wide table of settings, with one column per setting name.
+
+        Args:
+            config_ids: Configuration IDs; -1 or unknown IDs give rows of nulls
+            typed: Convert columns whose values are all numeric to numbers
+
+        Returns:
+            A DataFrame with one row per configuration ID, in order, and columns sorted by name
+        """
+        records = [self.settings.get(int(c), {}) for c in config_ids]
+        names = sorted({name for record in records for name in record})
+        df = pd.DataFrame.from_records(records, columns=names, index=range(len(records)))
+        return parse_numeric_columns(df) if typed else df
+
+    def settings_at(
+        self, saurons: Union[Sequence[int], np.ndarray], times: Times, typed: bool = True
+    ) -> pd.DataFrame:
+        """
+        Gets the settings in force for each ``(sauron, datetime)`` pair.
+
+        Returns:
+            A DataFrame with ``sauron_id``, ``datetime``, and ``sauron_config_id`` columns,
+            followed by one column per setting (see ``settings_table``)
+        """
+        config_ids = self.configs_at(saurons, times)
+        df = pd.DataFrame(
+            {
+                "sauron_id": np.asarray(saurons, dtype=np.int64),
+                "datetime": np.asarray(times, dtype="datetime64[us]"),
+                "sauron_config_id": config_ids,
+            }
+        )
+        return pd.concat([df, self.settings_table(config_ids, typed)], axis=1)
+
+    def __len__(self) -> int:
+        return len(self.config_ids)
+
+
+def get_sauron_index(refresh: bool = False) -> SauronConfigIndex:
+    """
+    Gets the shared Sauron configuration index, building it on first use.
+
+    Args:
+        refresh: Rebuild the index to include new configurations and settings
+    """
+    global _sauron_index
+    if _sauron_index is None or refresh:
+        _sauron_index = SauronConfigIndex.build()
+    return _sauron_index
+
+
+def clear_sauron_index() -> None:
+    """
+    Discards the shared Sauron configuration index.
+    """
+    global _sauron_index
+    _sauron_index = None
+
+
+def load_run_settings(
+    runs: Iterable[RunLike], by_time: bool = False, typed: bool = True
+) -> pd.DataFrame:
+    """
+    Builds a wide table of the Sauron settings of many runs, using the shared index
+    (see ``get_sauron_index``) and one query for the runs.
+
+    Args:
+        runs: Runs as instances, IDs, tags, or names
+        by_time: Use the configuration in force at each run's ``datetime_run``
+                 instead of the run's own ``sauron_config``
+        typed: Convert columns whose values are all numeric to numbers
+
+    Returns:
+        A DataFrame with ``run_id``, ``sauron_id``, ``datetime_run``, and ``sauron_config_id``,
+        followed by one column per setting, in the same order as ``runs``
+
+    Raises:
+        ValarLookupError: If a run does not exist
+    """
+    from valarpy.model import IRuns
+
+    index = get_sauron_index()
+    runs = IRuns.fetch_all(runs)
+    config_ids = np.array([r.sauron_config_id for r in runs], dtype=np.int64)
+    saurons = [index.sauron_of(c) for c in config_ids.tolist()]
+    if None in saurons:
+        # configurations created since the index was built
+        index = get_sauron_index(refresh=True)
+        saurons = [index.sauron_of(c) for c in config_ids.tolist()]
+    times = np.array([r.datetime_run for r in runs], dtype="datetime64[us]")
+    if by_time:
+        config_ids = index.configs_at([-1 if s is None else s for s in saurons], times)
+    df = pd.DataFrame(
+        {
+            "run_id": [r.id for r in runs],
+            "sauron_id": pd.array(saurons, dtype="Int64"),
+            "datetime_run": times,
+            "sauron_config_id": config_ids,
+        }
+    )
+    df = lean_frame(df, IRuns)
+    return pd.concat([df, index.settings_table(config_ids, typed)], axis=1)
+
+
+__all__ = [
+    "SauronConfigIndex",
+    "get_sauron_index",
+    "clear_sauron_index",
+    "load_run_settings",
+]
@@ -0,0 +1,206 @@
+"""
+Bulk loading of sensor data as NumPy arrays, and alignment of sensor data to camera frames.
+Requires an open connection (see ``valarpy.opened``).
+"""
+from contextlib import nullcontext
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+
+from valarpy.blobs import decode_blob, pad_arrays
+from valarpy.definitions import RunLike, SensorLike, SensorSampling
+from valarpy.integrity import Sha1Verifier
+from valarpy.metamodel import ValarLookupError
+
+_RESAMPLING_METHODS = {"nearest", "linear", "mean"}
+
+
+def load_sensor_arrays(
+    runs: Iterable[RunLike],
+    sensor: SensorLike,
+    padded: bool = False,
+    fill_value: Optional[float] = np.nan,
+    verify: bool = False,
+) -> Union[List[np.ndarray], np.ndarray]:
+    """
+    Loads and decodes the ``ISensorData`` of one sensor for many runs in a single query.
+    Blobs are decoded with ``np.frombuffer``, so the ragged output does not copy.
+    With ``verify``, each blob is checked against ``floats_sha1`` on a background thread.
+
+    Examples:
+        millis = load_sensor_arrays(["run_tag_1", 52], "sauronx-microcontroller-millis")
+
+    Args:
+        runs: Runs as instances, IDs, tags, or names
+        sensor: The sensor as an instance, ID, or name
+        padded: Return a 2-D matrix padded with ``fill_value`` instead of a list of arrays
+        fill_value: The padding value if ``padded`` is set
+        verify: Check the SHA-1 hash of every blob
+
+    Returns:
+        Either a list of 1-D arrays in the order of ``runs``,
+        or a ``(n_runs, max length)`` matrix if ``padded``
+
+    Raises:
+        ValarLookupError: If a run or the sensor does not exist, or a run has no data for the sensor
+        BlobIntegrityError: If ``verify`` is set and a blob does not match its hash
+    """
+    from valarpy.model import IRuns, ISensorData, ISensors
+
+    sensor = ISensors.fetch(sensor)
+    runs = IRuns.fetch_all(runs)
+    blob_type = sensor.blob_type
+    fields = [ISensorData.run, ISensorData.floats]
+    if verify:
+        fields.append(ISensorData.floats_sha1)
+    query = ISensorData.select(*fields).where(
+        (ISensorData.sensor == sensor.id) & (ISensorData.run << {r.id for r in runs})
+    )
+    by_run = {}
+    with Sha1Verifier() if verify else nullcontext() as verifier:
+        for row in query:
+            if verifier is not None:
+                verifier.submit(row.run_id, row.floats, row.floats_sha1)
+            by_run[row.run_id] = decode_blob(row.floats, blob_type)
+        if verifier is not None:
+            verifier.check()
+    missing = [r.id for r in runs if r.id not in by_run]
+    if len(missing) > 0:
+        raise ValarLookupError(f"No {sensor.name} data for runs {missing}")
+    arrays = [by_run[r.id] for r in runs]
+    if padded:
+        return pad_arrays(arrays, fill_value=fill_value)
+    return arrays
+
+
+def align_sensor(
+    runs: Iterable[RunLike],
+    sensor: SensorLike,
+    frame_sensor: SensorLike,
+    method: str = "linear",
+    times_sensor: Optional[SensorLike] = None,
+    padded: bool = False,
+) -> Union[List[np.ndarray], np.ndarray]:
+    """
+    Resamples a sensor's values onto the camera frames of many runs.
+    The data for all runs is loaded in one query per sensor.
+
+    Examples:
+        photo = align_sensor(runs, "photometer", "camera-millis", method="mean", padded=True)
+
+    Args:
+        runs: Runs as instances, IDs, tags, or names
+        sensor: The sensor to resample, which must be periodic unless ``times_sensor`` is passed
+        frame_sensor: The sensor of camera frame timestamps in milliseconds
+        method: ``nearest``, ``linear``, or ``mean`` (the mean of the values within each frame)
+        times_sensor: A sensor with the millisecond timestamp of every value of ``sensor``,
+                      required for sensors with ``arbitrary`` sampling
+        padded: Return a 2-D matrix padded with NaN instead of a list of arrays
+
+    Returns:
+        Either a list of float64 arrays with one value per frame, in the order of ``runs``,
+        or a ``(n_runs, max frames)`` matrix if ``padded``
+
+    Raises:
+        ValarLookupError: If a run or sensor does not exist, or a run has no data for a sensor
+        ValueError: If ``sensor`` is not periodic and no ``times_sensor`` was passed
+    """
+    from valarpy.model import IRuns, ISensors
+
+    if method not in _RESAMPLING_METHODS:
+        raise ValueError(f"Method {method} is not one of {_RESAMPLING_METHODS}")
+    runs = IRuns.fetch_all(runs)
+    sensor = ISensors.fetch(sensor)
+    values = load_sensor_arrays(runs, sensor)
+    frames = load_sensor_arrays(runs, frame_sensor)
+    if times_sensor is not None:
+        times = load_sensor_arrays(runs, times_sensor)
+    elif sensor.sampling is not None and sensor.sampling.is_periodic:
+        times = [
+            sensor_times(len(v), sensor.sampling, sensor.n_between, f)
+            for v, f in zip(values, frames)
+        ]
+    else:
+        raise ValueError(f"Sensor {sensor.name} has {sensor.sampling} sampling; pass times_sensor")
+    aligned = [resample_to_frames(v, t, f, method) for v, t, f in zip(values, times, frames)]
+    if padded:
+        return pad_arrays(aligned)
+    return aligned
+
+
+def sensor_times(
+    n_values: int, sampling: SensorSampling, n_between: int, frame_millis: np.ndarray
+) -> np.ndarray:
+    """
+    Gets the millisecond timestamp of each value of a periodic sensor,
+    on the same clock as the camera frame timestamps.
+
+    Args:
+        n_values: The number of values the sensor recorded
+        sampling: ``every_n_milliseconds`` or ``every_n_frames``
+        n_between: The period, from ``ISensors.n_between``
+        frame_millis: The timestamp of every camera frame
+
+    Returns:
+        A float64 array of ``n_values`` timestamps
+
+    Raises:
+        ValueError: If the sensor is not periodic or records past the last frame
+    """
+    frame_millis = np.asarray(frame_millis, dtype=np.float64)
+    steps = np.arange(n_values, dtype=np.int64) * n_between
+    if sampling is SensorSampling.every_n_milliseconds:
+        return frame_millis[0] + steps.astype(np.float64)
+    elif sampling is SensorSampling.every_n_frames:
+        if n_values > 0 and steps[-1] >= len(frame_millis):
+            raise ValueError(f"{n_values} values every {n_between} frames overrun the frames")
+        return frame_millis[steps]
+    raise ValueError(f"{sampling} sampling is not periodic")
+
+
+def resample_to_frames(
+    values: np.ndarray, value_millis: np.ndarray, frame_millis: np.ndarray, method: str = "linear"
+) -> np.ndarray:
+    """
+    Resamples values recorded at increasing timestamps onto frame timestamps.
+
+    Args:
+        values: The sensor values
+        value_millis: The timestamp of each value
+        frame_millis: The timestamp of each frame
+        method: ``nearest`` (the value closest in time), ``linear`` (linear interpolation),
+                or ``mean`` (the mean of the values from one frame up to the next; NaN if none)
+
+    Returns:
+        A float64 array with one value per frame
+
+    Raises:
+        ValueError: If the method is unknown or the lengths of ``values`` and ``value_millis`` differ
+    """
+    values = np.asarray(values, dtype=np.float64)
+    value_millis = np.asarray(value_millis, dtype=np.float64)
+    frame_millis = np.asarray(frame_millis, dtype=np.float64)
+    if len(values) != len(value_millis):
+        raise ValueError(f"{len(values)} values but {len(value_millis)} timestamps")
+    if len(values) == 0:
+        return np.full(len(frame_millis), np.nan)
+    if method == "linear":
+        return np.interp(frame_millis, value_millis, values)
+    elif method == "nearest":
+        if len(values) == 1:
+            return np.full(len(frame_millis), values[0])
+        i = np.clip(np.searchsorted(value_millis, frame_millis), 1, len(values) - 1)
+        closer_left = frame_millis - value_millis[i - 1] <= value_millis[i] - frame_millis
+        return values[i - closer_left]
+    elif method == "mean":
+        bins = np.searchsorted(frame_millis, value_millis, side="right") - 1
+        inside = bins >= 0
+        n = len(frame_millis)
+        sums = np.bincount(bins[inside], weights=values[inside], minlength=n)
+        counts = np.bincount(bins[inside], minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+    raise ValueError(f"Method {method} is not one of {_RESAMPLING_METHODS}")
+
+
+__all__ = ["load_sensor_arrays", "align_sensor", "sensor_times", "resample_to_frames"]
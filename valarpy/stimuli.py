@@ -0,0 +1,502 @@
+"""
+Building stimulus timelines of batteries from assay positions and stimulus frames.
+Requires an open connection (see ``valarpy.opened``).
+"""
+from __future__ import annotations
+
+import operator
+from collections import OrderedDict
+from dataclasses import dataclass
+from numbers import Integral
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from valarpy.definitions import BatteryLike
+from valarpy.metamodel import stream_tuples
+
+# run-length-encoded frames of assays, keyed by IAssays.frames_sha1 and then stimulus ID
+_frames_cache: OrderedDict[bytes, Dict[int, RleFrames]] = OrderedDict()
+_frames_cache_size = 512
+# assay indices, keyed by battery ID
+_assay_indices: Dict[int, AssayIndex] = {}
+
+
+class RleFrames:
+    """
+    A run-length-encoded 1-D array, used for stimulus intensities over frames.
+    Stimulus frames are mostly long runs of a constant value,
+    so this needs memory proportional to the number of transitions rather than frames.
+
+    Supports ``len``, integer indexing, slicing with a step of 1,
+    elementwise arithmetic and comparisons with scalars or other ``RleFrames`` of the same length,
+    and ``np.asarray`` (which expands to a dense array).
+
+    Attributes:
+        starts: Increasing start index of each run, beginning with 0
+        values: The value of each run
+        length: The total number of elements
+    """
+
+    __slots__ = ("starts", "values", "length")
+
+    def __init__(self, starts: np.ndarray, values: np.ndarray, length: int):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.values = np.asarray(values)
+        self.length = int(length)
+
+    @classmethod
+    def from_dense(cls, array: Union[np.ndarray, Iterable[Any]]) -> RleFrames:
+        """
+        Encodes a dense 1-D array.
+        """
+        array = np.asarray(array)
+        if len(array) == 0:
+            return cls(np.empty(0, dtype=np.int64), array[:0].copy(), 0)
+        starts = np.concatenate(([0], np.flatnonzero(array[1:] != array[:-1]) + 1))
+        return cls(starts, array[starts], len(array))
+
+    @classmethod
+    def concatenate(
+        cls, pieces: Iterable[Tuple[int, RleFrames]], length: int, fill_value: Any = 0
+    ) -> RleFrames:
+        """
+        Places pieces at offsets in an array of ``length`` elements, without expanding them.
+
+        Args:
+            pieces: Pairs of (offset, piece); pieces are trimmed where they overlap or overrun ``length``
+            length: The length of the output
+            fill_value: The value between and after pieces
+
+        Returns:
+            A new instance
+        """
+        pieces = sorted(pieces, key=lambda p: p[0])
+        dtype = np.result_type(*[p.values.dtype for _, p in pieces], np.asarray(fill_value))
+        starts: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        cursor = 0
+        for offset, piece in pieces:
+            if offset >= length:
+                continue
+            piece = piece[max(cursor - offset, 0) : max(length - offset, 0)]
+            offset = max(offset, cursor)
+            if len(piece) == 0:
+                continue
+            if offset > cursor:
+                starts.append(np.array([cursor]))
+                values.append(np.array([fill_value], dtype=dtype))
+            starts.append(piece.starts + offset)
+            values.append(piece.values.astype(dtype, copy=False))
+            cursor = offset + len(piece)
+        if cursor < length:
+            starts.append(np.array([cursor]))
+            values.append(np.array([fill_value], dtype=dtype))
+        if len(starts) == 0:
+            return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=dtype), 0)
+        return cls._compact(np.concatenate(starts), np.concatenate(values), length)
+
+    @property
+    def n_runs(self) -> int:
+        """
+        The number of runs (number of transitions plus 1).
+        """
+        return len(self.starts)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.values.dtype
+
+    def to_dense(self) -> np.ndarray:
+        """
+        Expands to a dense 1-D array.
+        """
+        return np.repeat(self.values, np.diff(np.append(self.starts, self.length)))
+
+    def value_at(self, frames: Union[int, np.ndarray]) -> Union[Any, np.ndarray]:
+        """
+        Gets the values at frame indices, which can be an array, using binary search.
+
+        Raises:
+            IndexError: If a frame is out of bounds
+        """
+        frames = np.asarray(frames)
+        if np.any(frames < 0) or np.any(frames >= self.length):
+            raise IndexError(f"Frame out of bounds for length {self.length}")
+        return self.values[np.searchsorted(self.starts, frames, side="right") - 1]
+
+    def map(self, function: Callable[[np.ndarray], np.ndarray]) -> RleFrames:
+        """
+        Applies a vectorized elementwise function to the run values.
+        """
+        return self._compact(self.starts, function(self.values), self.length)
+
+    def combine(self, other: RleFrames, function: Callable[[Any, Any], Any]) -> RleFrames:
+        """
+        Applies a vectorized binary elementwise function to this and another instance.
+
+        Raises:
+            ValueError: If the lengths differ
+        """
+        if self.length != other.length:
+            raise ValueError(f"Lengths {self.length} and {other.length} differ")
+        starts = np.union1d(self.starts, other.starts)
+        mine = self.values[np.searchsorted(self.starts, starts, side="right") - 1]
+        theirs = other.values[np.searchsorted(other.starts, starts, side="right") - 1]
+        return self._compact(starts, function(mine, theirs), self.length)
+
+    def _op(self, other: Any, function: Callable[[Any, Any], Any]) -> RleFrames:
+        if isinstance(other, RleFrames):
+            return self.combine(other, function)
+        return self.map(lambda v: function(v, other))
+
+    def __add__(self, other: Any) -> RleFrames:
+        return self._op(other, operator.add)
+
+    def __sub__(self, other: Any) -> RleFrames:
+        return self._op(other, operator.sub)
+
+    def __mul__(self, other: Any) -> RleFrames:
+        return self._op(other, operator.mul)
+
+    def __truediv__(self, other: Any) -> RleFrames:
+        return self._op(other, operator.truediv)
+
+    def __lt__(self, other: Any) -> RleFrames:
+        return self._op(other, operator.lt)
+
+    def __le__(self, other: Any) -> RleFrames:
+        return self._op(other, operator.le)
+
+    def __gt__(self, other: Any) -> RleFrames:
+        return self._op(other, operator.gt)
+
+    def __ge__(self, other: Any) -> RleFrames:
+        return self._op(other, operator.ge)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[Any, RleFrames]:
+        if not isinstance(item, slice):
+            index = int(item) + self.length if int(item) < 0 else int(item)
+            return self.value_at(index)
+        start, stop, step = item.indices(self.length)
+        if step != 1:
+            raise ValueError(f"Slices with step {step} are not supported")
+        if stop <= start:
+            return RleFrames(np.empty(0, dtype=np.int64), self.values[:0], 0)
+        i0 = np.searchsorted(self.starts, start, side="right") - 1
+        i1 = np.searchsorted(self.starts, stop, side="left")
+        starts = self.starts[i0:i1] - start
+        starts[0] = 0
+        return RleFrames(starts, self.values[i0:i1], stop - start)
+
+    def __array__(self, dtype=None) -> np.ndarray:
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(length={self.length}, n_runs={self.n_runs})"
+
+    @classmethod
+    def _compact(cls, starts: np.ndarray, values: np.ndarray, length: int) -> RleFrames:
+        if len(values) == 0:
+            return cls(starts, values, length)
+        keep = np.concatenate(([True], values[1:] != values[:-1]))
+        return cls(starts[keep], values[keep], length)
+
+
+@dataclass(frozen=True)
+class StimulusTimeline:
+    """
+    The intensity of every stimulus at every frame of a battery.
+
+    Attributes:
+        values: A ``(n_stimuli, battery.length)`` array of ``uint8`` intensities
+        stimulus_ids: The stimulus ID of each row, in increasing order
+    """
+
+    values: np.ndarray
+    stimulus_ids: np.ndarray
+
+    def for_stimulus(self, stimulus_id: int) -> np.ndarray:
+        """
+        Gets the 1-D timeline of a single stimulus.
+        """
+        return self.values[np.searchsorted(self.stimulus_ids, stimulus_id)]
+
+
+@dataclass(frozen=True)
+class RleStimulusTimeline:
+    """
+    A run-length-encoded equivalent of ``StimulusTimeline``.
+
+    Attributes:
+        stimuli: Map from stimulus ID to its timeline over the whole battery
+        length: The battery length in frames
+    """
+
+    stimuli: Mapping[int, RleFrames]
+    length: int
+
+    def for_stimulus(self, stimulus_id: int) -> RleFrames:
+        """
+        Gets the timeline of a single stimulus.
+        """
+        return self.stimuli[stimulus_id]
+
+    def slice(self, start: int, stop: int) -> RleStimulusTimeline:
+        """
+        Gets the timelines restricted to the frames ``start:stop``.
+        """
+        stimuli = {s: r[start:stop] for s, r in self.stimuli.items()}
+        return RleStimulusTimeline(stimuli=stimuli, length=len(range(self.length)[start:stop]))
+
+    def to_dense(self) -> StimulusTimeline:
+        """
+        Expands to a dense ``StimulusTimeline``.
+        """
+        stimulus_ids = np.array(sorted(self.stimuli), dtype=np.int64)
+        values = np.zeros((len(stimulus_ids), self.length), dtype=np.uint8)
+        for i, stimulus_id in enumerate(stimulus_ids):
+            values[i] = self.stimuli[stimulus_id].to_dense()
+        return StimulusTimeline(values=values, stimulus_ids=stimulus_ids)
+
+
+class AssayIndex:
+    """
+    Finds which assay of a battery is active at any frame, by binary search over assay starts.
+    Get instances with ``get_assay_index``.
+
+    Attributes:
+        battery_id: The battery ID
+        starts: The start frame of each assay position, increasing
+        stops: The frame after the last frame of each assay position
+        assay_ids: The assay ID of each position
+    """
+
+    __slots__ = ("battery_id", "starts", "stops", "assay_ids", "_timeline")
+
+    def __init__(
+        self, battery_id: int, starts: np.ndarray, stops: np.ndarray, assay_ids: np.ndarray
+    ):
+        self.battery_id = battery_id
+        self.starts = starts
+        self.stops = stops
+        self.assay_ids = assay_ids
+        self._timeline: Optional[RleStimulusTimeline] = None
+
+    def positions_at(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Gets the index into ``starts`` of the assay active at each frame, or -1 for frames outside any assay.
+        """
+        frames = np.asarray(frames)
+        i = np.searchsorted(self.starts, frames, side="right") - 1
+        found = (i >= 0) & (frames < self.stops[np.maximum(i, 0)])
+        return np.where(found, i, -1)
+
+    def assays_at(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Gets the ID of the assay active at each frame, or -1 for frames outside any assay.
+
+        Examples:
+            index.assays_at(np.arange(0, 1000, 10))
+        """
+        i = self.positions_at(frames)
+        return np.where(i >= 0, self.assay_ids[np.maximum(i, 0)], -1)
+
+    def assay_at(self, frame: int) -> Optional[int]:
+        """
+        Gets the ID of the assay active at a frame, or None.
+        """
+        assay = int(self.assays_at(np.array([frame]))[0])
+        return None if assay < 0 else assay
+
+    def assays_between(self, start: int, stop: int) -> np.ndarray:
+        """
+        Gets the IDs of assays overlapping the frames ``start:stop``, in order.
+        """
+        i0 = max(np.searchsorted(self.starts, start, side="right") - 1, 0)
+        i1 = np.searchsorted(self.starts, stop, side="left")
+        overlaps = self.stops[i0:i1] > start
+        return self.assay_ids[i0:i1][overlaps]
+
+    def stimuli_at(self, frame: int) -> Set[int]:
+        """
+        Gets the IDs of stimuli with a nonzero intensity at a frame.
+        Loads the battery's stimulus frames the first time it is called (see ``load_battery_rle``)
+        and keeps them on the index.
+        """
+        if self._timeline is None:
+            self._timeline = load_battery_rle(self.battery_id)
+        timeline = self._timeline
+        return {s for s, r in timeline.stimuli.items() if frame < r.length and r[frame] != 0}
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(battery={self.battery_id}, n_positions={len(self)})"
+
+
+def get_assay_index(battery: BatteryLike) -> AssayIndex:
+    """
+    Gets the (cached) assay index of a battery.
+    On first use, fetches the battery and builds the index with one query for its positions.
+
+    Args:
+        battery: The battery as an instance, ID, or name
+
+    Returns:
+        An ``AssayIndex``
+
+    Raises:
+        ValarLookupError: If the battery does not exist
+    """
+    from valarpy.model import IAssayPositions, IAssays, IBatteries
+
+    if isinstance(battery, Integral) and int(battery) in _assay_indices:
+        return _assay_indices[int(battery)]
+    battery_id = IBatteries.fetch(battery).id
+    if battery_id not in _assay_indices:
+        rows = np.array(
+            list(
+                IAssayPositions.select(IAssayPositions.start, IAssays.length, IAssays.id)
+                .join(IAssays)
+                .where(IAssayPositions.battery == battery_id)
+                .order_by(IAssayPositions.start)
+                .tuples()
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        _assay_indices[battery_id] = AssayIndex(
+            battery_id, rows[:, 0], rows[:, 0] + rows[:, 1], rows[:, 2]
+        )
+    return _assay_indices[battery_id]
+
+
+def clear_frames_cache() -> None:
+    """
+    Empties the caches of decoded assay frames and assay indices.
+    """
+    _frames_cache.clear()
+    _assay_indices.clear()
+
+
+def load_battery_timeline(battery: BatteryLike) -> StimulusTimeline:
+    """
+    Builds the full stimulus timeline of a battery as a dense array.
+    Needs one query for the assay positions and at most one streaming query for stimulus frames.
+    Assays with identical ``frames_sha1`` are fetched and decoded only once,
+    and decoded assays are cached (run-length-encoded) across calls.
+    See ``load_battery_rle`` for a representation that does not scale with the number of frames.
+
+    Examples:
+        timeline = load_battery_timeline("my_battery")
+        timeline.values.shape  # (n_stimuli, battery.length)
+
+    Args:
+        battery: The battery as an instance, ID, or name
+
+    Returns:
+        A ``StimulusTimeline``
+
+    Raises:
+        ValarLookupError: If the battery does not exist
+    """
+    battery, positions, frames = _load_battery(battery)
+    stimulus_ids = np.array(sorted({s for f in frames.values() for s in f}), dtype=np.int64)
+    row_of = {s: i for i, s in enumerate(stimulus_ids)}
+    values = np.zeros((len(stimulus_ids), battery.length), dtype=np.uint8)
+    for start, length, sha1 in positions:
+        if start >= battery.length:
+            continue
+        for stimulus_id, rle in frames[sha1].items():
+            piece = rle[: max(min(length, battery.length - start), 0)]
+            values[row_of[stimulus_id], start : start + len(piece)] = piece.to_dense()
+    return StimulusTimeline(values=values, stimulus_ids=stimulus_ids)
+
+
+def load_battery_rle(battery: BatteryLike) -> RleStimulusTimeline:
+    """
+    Builds the full stimulus timeline of a battery as run-length encodings,
+    never expanding frames to a dense array.
+    Uses the same queries and cache as ``load_battery_timeline``.
+
+    Args:
+        battery: The battery as an instance, ID, or name
+
+    Returns:
+        A ``RleStimulusTimeline``
+
+    Raises:
+        ValarLookupError: If the battery does not exist
+    """
+    battery, positions, frames = _load_battery(battery)
+    pieces: Dict[int, List[Tuple[int, RleFrames]]] = {s: [] for f in frames.values() for s in f}
+    for start, length, sha1 in positions:
+        for stimulus_id, rle in frames[sha1].items():
+            pieces[stimulus_id].append((start, rle[:length]))
+    stimuli = {
+        s: RleFrames.concatenate(p, battery.length, fill_value=np.uint8(0))
+        for s, p in pieces.items()
+    }
+    return RleStimulusTimeline(stimuli=stimuli, length=battery.length)
+
+
+def _load_battery(battery: BatteryLike):
+    from valarpy.model import IAssayPositions, IAssays, IBatteries
+
+    battery = IBatteries.fetch(battery)
+    rows = list(
+        IAssayPositions.select(
+            IAssayPositions.assay, IAssayPositions.start, IAssays.length, IAssays.frames_sha1
+        )
+        .join(IAssays)
+        .where(IAssayPositions.battery == battery.id)
+        .order_by(IAssayPositions.start)
+        .tuples()
+    )
+    positions = [(start, length, bytes(sha1)) for _, start, length, sha1 in rows]
+    assays = {bytes(sha1): assay for assay, _, _, sha1 in rows}
+    return battery, positions, _load_assay_frames(assays)
+
+
+def _load_assay_frames(assays: Mapping[bytes, int]) -> Dict[bytes, Dict[int, RleFrames]]:
+    """
+    Gets encoded frames per stimulus for one representative assay of each ``frames_sha1``.
+    """
+    from valarpy.model import IStimulusFrames
+
+    missing = {assay: sha1 for sha1, assay in assays.items() if sha1 not in _frames_cache}
+    loaded = {sha1: {} for sha1 in missing.values()}
+    if len(missing) > 0:
+        query = IStimulusFrames.select(
+            IStimulusFrames.assay, IStimulusFrames.stimulus, IStimulusFrames.frames
+        ).where(IStimulusFrames.assay << list(missing.keys()))
+        for assay, stimulus, data in stream_tuples(query):
+            loaded[missing[assay]][stimulus] = RleFrames.from_dense(
+                np.frombuffer(data, dtype=np.uint8)
+            )
+    for sha1, by_stimulus in loaded.items():
+        _frames_cache[sha1] = by_stimulus
+    results = {}
+    for sha1 in assays:
+        results[sha1] = _frames_cache[sha1]
+        _frames_cache.move_to_end(sha1)
+    while len(_frames_cache) > _frames_cache_size:
+        _frames_cache.popitem(last=False)
+    return results
+
+
+__all__ = [
+    "RleFrames",
+    "StimulusTimeline",
+    "RleStimulusTimeline",
+    "AssayIndex",
+    "get_assay_index",
+    "load_battery_timeline",
+    "load_battery_rle",
+    "clear_frames_cache",
+]
@@ -0,0 +1,278 @@
+"""
+Summaries of all experiments or projects at once: counts of runs, wells, batches, and compounds,
+run date ranges, and annotation tallies by level, each computed on the server with a ``GROUP BY``.
+Summaries are cached and can be refreshed for only the experiments or projects that changed.
+Requires an open connection (see ``valarpy.opened``).
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import peewee
+
+from valarpy.definitions import AnnotationLevel
+from valarpy.metamodel import lean_frame
+
+SUMMARY_LEVELS = ("experiment", "project")
+
+# levels tallied as n_<name> columns, best first
+_TALLIED = [level for level in sorted(AnnotationLevel) if level is not AnnotationLevel.deleted]
+
+SUMMARY_COLUMNS = (
+    "n_runs",
+    "first_run",
+    "last_run",
+    "n_wells",
+    "n_batches",
+    "n_compounds",
+    *[f"n_{level.name}" for level in _TALLIED],
+)
+
+_summaries: Dict[str, "Summaries"] = {}
+
+
+class Summaries:
+    """
+    A table of summaries of every experiment or project, with one row per experiment or project
+    that has a run, computed with four ``GROUP BY`` queries (runs, wells, treatments, annotations).
+
+    ``refresh`` recomputes only the rows with runs or annotations created since the last read.
+    Runs or annotations that were modified or deleted are only picked up by building a new table.
+
+    Examples:
+        df = experiment_summaries()
+        df.sort_values("last_run").tail(10)
+
+    Attributes:
+        level: ``experiment`` or ``project``
+        frame: A DataFrame with an ``experiment_id`` or ``project_id`` column,
+               followed by the columns in ``SUMMARY_COLUMNS``; annotation tallies count run and
+               submission annotations (including well annotations with a run), excluding ``9:deleted``
+        watermarks: The latest ``created`` value and the largest ``id`` read from ``runs``
+                    and from ``annotations``; rows created later, or at the same time
+                    with a larger ``id``, are new
+    """
+
+    def __init__(self, level: str):
+        if level not in SUMMARY_LEVELS:
+            raise ValueError(f"Level {level} is not one of {SUMMARY_LEVELS}")
+        self.level = level
+        self.frame = _empty_frame(self.key_column)
+        self.watermarks: Dict[str, Tuple[datetime, int]] = {}
+
+    @property
+    def key_column(self) -> str:
+        return f"{self.level}_id"
+
+    @classmethod
+    def build(cls, level: str) -> "Summaries":
+        """
+        Summarizes every experiment or project.
+
+        Raises:
+            ValueError: If ``level`` is not in ``SUMMARY_LEVELS``
+        """
+        summaries = cls(level)
+        summaries.refresh()
+        return summaries
+
+    def refresh(self) -> List[int]:
+        """
+        Recomputes the rows of experiments or projects with runs or annotations created
+        since the last read (or all of them the first time).
+
+        Returns:
+            The IDs of the experiments or projects recomputed; empty if nothing changed
+        """
+        if len(self.watermarks) == 0:
+            changed = None
+        else:
+            changed = self._changed_keys()
+            if len(changed) == 0:
+                return []
+        watermarks = dict(self.watermarks)
+        updated = self._summarize(changed)
+        for table in ["runs", "annotations"]:
+            created, ids = updated[f"_{table}_created"].dropna(), updated[f"_{table}_id"].dropna()
+            if len(created) > 0:
+                latest = (created.max().to_pydatetime(), int(ids.max()))
+                previous = watermarks.get(table, latest)
+                watermarks[table] = (max(latest[0], previous[0]), max(latest[1], previous[1]))
+        updated = updated.drop(
+            columns=["_runs_created", "_runs_id", "_annotations_created", "_annotations_id"]
+        )
+        recomputed = updated[self.key_column].tolist()
+        if changed is not None:
+            kept = self.frame[~self.frame[self.key_column].isin(updated[self.key_column])]
+            updated = pd.concat([kept, updated], ignore_index=True)
+        self.frame = updated.sort_values(self.key_column, ignore_index=True)
+        self.watermarks = watermarks
+        return recomputed
+
+    def _changed_keys(self) -> List[int]:
+        from valarpy.model import IAnnotations, IRuns
+
+        keys = set()
+        if "runs" in self.watermarks:
+            query = self._grouped().where(_created_after(IRuns, *self.watermarks["runs"]))
+            keys.update(k for (k,) in query.select(self._key()).distinct().tuples())
+        if "annotations" in self.watermarks:
+            query = (
+                self._grouped()
+                .join(IAnnotations, on=_annotation_join())
+                .where(_created_after(IAnnotations, *self.watermarks["annotations"]))
+            )
+            keys.update(k for (k,) in query.select(self._key()).distinct().tuples())
+        return sorted(keys)
+
+    def _summarize(self, keys: Optional[Sequence[int]]) -> pd.DataFrame:
+        from valarpy.model import IAnnotations, IBatches, IRuns, IWells, IWellTreatments
+
+        runs = self._query(
+            keys,
+            peewee.fn.COUNT(IRuns.id),
+            peewee.fn.MIN(IRuns.datetime_run),
+            peewee.fn.MAX(IRuns.datetime_run),
+            peewee.fn.MAX(IRuns.created),
+            peewee.fn.MAX(IRuns.id),
+        )
+        wells = self._query(keys, peewee.fn.COUNT(IWells.id)).join(
+            IWells, on=(IWells.run == IRuns.id)
+        )
+        treatments = (
+            self._query(
+                keys,
+                peewee.fn.COUNT(IWellTreatments.batch.distinct()),
+                peewee.fn.COUNT(IBatches.compound.distinct()),
+            )
+            .join(IWells, on=(IWells.run == IRuns.id))
+            .join(IWellTreatments, on=(IWellTreatments.well == IWells.id))
+            .join(IBatches, on=(IWellTreatments.batch == IBatches.id))
+        )
+        tallies = [
+            peewee.fn.SUM(peewee.Case(None, [(IAnnotations.level == level.db_value, 1)], 0))
+            for level in _TALLIED
+        ]
+        annotations = self._query(
+            keys, *tallies, peewee.fn.MAX(IAnnotations.created), peewee.fn.MAX(IAnnotations.id)
+        ).join(IAnnotations, on=_annotation_join())
+        frames = [
+            _frame(runs, ["n_runs", "first_run", "last_run", "_runs_created", "_runs_id"]),
+            _frame(wells, ["n_wells"]),
+            _frame(treatments, ["n_batches", "n_compounds"]),
+            _frame(
+                annotations,
+                [f"n_{level.name}" for level in _TALLIED]
+                + ["_annotations_created", "_annotations_id"],
+            ),
+        ]
+        df = frames[0]
+        for frame in frames[1:]:
+            df = df.join(frame, how="left")
+        counts = [c for c in SUMMARY_COLUMNS if c.startswith("n_")]
+        df[counts] = df[counts].fillna(0).astype("int64")
+        df = df.rename_axis(self.key_column).reset_index()
+        return lean_frame(df)
+
+    def _key(self) -> peewee.Field:
+        from valarpy.model import IExperiments, IRuns
+
+        return IRuns.experiment if self.level == "experiment" else IExperiments.project
+
+    def _grouped(self) -> peewee.Select:
+        from valarpy.model import IExperiments, IRuns
+
+        query = IRuns.select()
+        if self.level == "project":
+            query = query.join(IExperiments, on=(IRuns.experiment == IExperiments.id)).switch(IRuns)
+        return query
+
+    def _query(self, keys: Optional[Sequence[int]], *columns) -> peewee.Select:
+        key = self._key()
+        query = self._grouped().select(key, *columns).group_by(key)
+        if keys is not None:
+            query = query.where(key << list(keys))
+        return query
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+
+def get_summaries(level: str, refresh: bool = False) -> Summaries:
+    """
+    Gets the shared summaries of experiments or projects, building them on first use.
+
+    Args:
+        level: ``experiment`` or ``project``
+        refresh: Recompute the rows with runs or annotations created since they were computed
+
+    Raises:
+        ValueError: If ``level`` is not in ``SUMMARY_LEVELS``
+    """
+    if level not in _summaries:
+        _summaries[level] = Summaries.build(level)
+    elif refresh:
+        _summaries[level].refresh()
+    return _summaries[level]
+
+
+def experiment_summaries(refresh: bool = False) -> pd.DataFrame:
+    """
+    Gets a summary of every experiment with a run (see ``Summaries``).
+
+    Args:
+        refresh: Recompute the rows with runs or annotations created since they were computed
+    """
+    return get_summaries("experiment", refresh).frame
+
+
+def project_summaries(refresh: bool = False) -> pd.DataFrame:
+    """
+    Gets a summary of every project with a run (see ``Summaries``).
+    Distinct batches and compounds are counted across the whole project.
+
+    Args:
+        refresh: Recompute the rows with runs or annotations created since they were computed
+    """
+    return get_summaries("project", refresh).frame
+
+
+def clear_summaries() -> None:
+    """
+    Discards the shared summaries.
+    """
+    _summaries.clear()
+
+
+def _annotation_join() -> peewee.Expression:
+    from valarpy.model import IAnnotations, IRuns
+
+    # run annotations, and submission annotations through the run's submission
+    return (IAnnotations.run == IRuns.id) | (
+        IAnnotations.run.is_null() & (IAnnotations.submission == IRuns.submission)
+    )
+
+
+def _created_after(model, created: datetime, max_id: int) -> peewee.Expression:
+    # rows created in the same second as the watermark are told apart by their IDs
+    return (model.created > created) | ((model.created == created) & (model.id > max_id))
+
+
+def _frame(query: peewee.Select, columns: List[str]) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(list(query.tuples()), columns=["key"] + columns)
+    return df.set_index("key")
+
+
+def _empty_frame(key_column: str) -> pd.DataFrame:
+    return pd.DataFrame(columns=[key_column, *SUMMARY_COLUMNS])
+
+
+__all__ = [
+    "SUMMARY_LEVELS",
+    "SUMMARY_COLUMNS",
+    "Summaries",
+    "get_summaries",
+    "experiment_summaries",
+    "project_summaries",
+    "clear_summaries",
+]
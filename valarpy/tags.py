@@ -0,0 +1,171 @@
+"""
+Wide tables of run and experiment tags, pivoted on the server with one conditional-aggregation
+query (``MAX(CASE WHEN name = ... THEN value END)`` per tag name), and a cached catalog of tag names.
+Requires an open connection (see ``valarpy.opened``).
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+import peewee
+
+from valarpy.definitions import ExperimentLike, RunLike
+from valarpy.metamodel import parse_numeric_columns
+
+_tag_names: Dict[str, List[str]] = {}
+
+
+def get_tag_names(model, refresh: bool = False) -> List[str]:
+    """
+    Gets the distinct tag names of a tag table, caching them on first use.
+
+    Args:
+        model: ``IRunTags`` or ``IExperimentTags``
+        refresh: Query the names again, to include names added since they were cached
+
+    Returns:
+        The names, sorted
+
+    Raises:
+        TypeError: If ``model`` is not a tag table
+    """
+    _owner_field(model)
+    table = model._meta.table_name
+    if table not in _tag_names or refresh:
+        query = model.select(model.name).distinct().order_by(model.name)
+        _tag_names[table] = [name for (name,) in query.tuples()]
+    return list(_tag_names[table])
+
+
+def clear_tag_names() -> None:
+    """
+    Discards the cached tag names of all tag tables.
+    """
+    _tag_names.clear()
+
+
+def pivot_query(model, names: Sequence[str], ids: Optional[Sequence[int]] = None) -> peewee.Select:
+    """
+    Builds a query with one row per run or experiment and one column per tag name.
+    Each tag column is named ``tag_<i>``, in the order of ``names``; it is null where the tag is absent.
+
+    Args:
+        model: ``IRunTags`` or ``IExperimentTags``
+        names: The tag names
+        ids: Restrict to these run or experiment IDs; all of them if None
+
+    Raises:
+        TypeError: If ``model`` is not a tag table
+    """
+    owner = _owner_field(model)
+    columns = [
+        peewee.fn.MAX(peewee.Case(None, [(model.name == name, model.value)])).alias(f"tag_{i}")
+        for i, name in enumerate(names)
+    ]
+    query = model.select(owner, *columns).group_by(owner).order_by(owner)
+    if ids is not None:
+        query = query.where(owner << list(ids))
+    if len(names) > 0:
+        # lets the (owner, name) index skip rows of other tags
+        query = query.where(model.name << list(names))
+    return query
+
+
+def pivot_tags(
+    model,
+    ids: Optional[Iterable[int]] = None,
+    names: Optional[Iterable[str]] = None,
+    typed: bool = True,
+) -> pd.DataFrame:
+    """
+    Loads tags as a wide table, with one query (plus one for the tag names if they are not cached).
+
+    Args:
+        model: ``IRunTags`` or ``IExperimentTags``
+        ids: Run or experiment IDs; if None, every run or experiment with a tag
+        names: The tag names to include; if None, all of them (see ``get_tag_names``)
+        typed: Convert tag columns whose values are all numeric to numbers
+
+    Returns:
+        A DataFrame with a ``run_id`` or ``experiment_id`` column followed by one column per tag name.
+        If ``ids`` is given, it has one row per ID, in order, even if the ID has no tags;
+        otherwise rows are sorted by ID.
+
+    Raises:
+        TypeError: If ``model`` is not a tag table
+    """
+    owner = _owner_field(model)
+    names = get_tag_names(model) if names is None else list(dict.fromkeys(names))
+    ids = None if ids is None else list(ids)
+    rows = list(pivot_query(model, names, ids).tuples())
+    key = owner.object_id_name
+    df = pd.DataFrame.from_records(rows, columns=[key] + names)
+    if ids is not None:
+        df = df.set_index(key).reindex(pd.Index(ids, name=key)).reset_index()
+    return parse_numeric_columns(df) if typed else df
+
+
+def load_run_tags(
+    runs: Optional[Iterable[RunLike]] = None,
+    names: Optional[Iterable[str]] = None,
+    typed: bool = True,
+) -> pd.DataFrame:
+    """
+    Loads the tags of runs as a wide table (see ``pivot_tags``).
+
+    Examples:
+        df = load_run_tags(runs, names=["sauronx_version", "camera_exposure"])
+
+    Args:
+        runs: Runs as instances, IDs, tags, or names; every run with a tag if None
+        names: The tag names; all of them if None
+        typed: Convert tag columns whose values are all numeric to numbers
+
+    Raises:
+        ValarLookupError: If a run does not exist
+    """
+    from valarpy.model import IRuns, IRunTags
+
+    ids = None if runs is None else [r.id for r in IRuns.fetch_all(runs)]
+    return pivot_tags(IRunTags, ids, names, typed)
+
+
+def load_experiment_tags(
+    experiments: Optional[Iterable[ExperimentLike]] = None,
+    names: Optional[Iterable[str]] = None,
+    typed: bool = True,
+) -> pd.DataFrame:
+    """
+    Loads the tags of experiments as a wide table (see ``pivot_tags``).
+
+    Args:
+        experiments: Experiments as instances, IDs, or names; every experiment with a tag if None
+        names: The tag names; all of them if None
+        typed: Convert tag columns whose values are all numeric to numbers
+
+    Raises:
+        ValarLookupError: If an experiment does not exist
+    """
+    from valarpy.model import IExperiments, IExperimentTags
+
+    ids = None if experiments is None else [e.id for e in IExperiments.fetch_all(experiments)]
+    return pivot_tags(IExperimentTags, ids, names, typed)
+
+
+def _owner_field(model) -> peewee.ForeignKeyField:
+    from valarpy.model import IExperimentTags, IRunTags
+
+    if model is IRunTags:
+        return IRunTags.run
+    elif model is IExperimentTags:
+        return IExperimentTags.experiment
+    raise TypeError(f"{model} is not a tag table")
+
+
+__all__ = [
+    "get_tag_names",
+    "clear_tag_names",
+    "pivot_query",
+    "pivot_tags",
+    "load_run_tags",
+    "load_experiment_tags",
+]